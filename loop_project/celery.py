@@ -1,6 +1,7 @@
 import os
 
 from celery import Celery
+from celery.signals import celeryd_init
 from decouple import config
 
 # Set the default Django settings module for the 'celery' program.
@@ -18,6 +19,13 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
 
+@celeryd_init.connect
+def keep_worker_connections(**kwargs):
+    """Workers keep their database connection across tasks; web processes keep DB_CONN_MAX_AGE"""
+    from django.conf import settings
+    settings.DATABASES['default']['CONN_MAX_AGE'] = settings.DB_WORKER_CONN_MAX_AGE
+
+
 # @app.task(bind=True, ignore_result=True)
 # def debug_task(self):
 #     print(f'Request: {self.request!r}')
\ No newline at end of file
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
 from decouple import config
 
@@ -87,9 +88,29 @@ DATABASES = {
         'PASSWORD': 'password_psql',
         'HOST': 'localhost',
         'PORT': '5432',
+        # Seconds a web process keeps a connection open across requests (0 = close after
+        # each one). Celery workers use DB_WORKER_CONN_MAX_AGE instead
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', cast=int, default=0),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Persistent connections stand in for a pool in Celery workers (Django's pool needs
+# psycopg 3): each worker process keeps one connection, and its prepared statements,
+# across tasks for this many seconds. Applied by loop_project/celery.py at worker start
+DB_WORKER_CONN_MAX_AGE = config('DB_WORKER_CONN_MAX_AGE', cast=int, default=600)
+
+# PREPARE the per-store report queries once per connection (see store_monitor/db.py).
+# Turn off behind poolers that do not keep prepared statements across transactions.
+DB_PREPARED_STATEMENTS = config('DB_PREPARED_STATEMENTS', cast=bool, default=True)
+
+# TimescaleDB layout of store_monitor_storestatus, applied by manage.py setup_timescale
+# (migration 0013 sets up the defaults):
+# time span of each hypertable chunk, and the age after which chunks are compressed (0 = never).
+# Chunks younger than the compression age take late polls and upserts without decompression.
+TIMESCALE_CHUNK_INTERVAL = timedelta(hours=config('TIMESCALE_CHUNK_INTERVAL_HOURS', cast=int, default=24))
+TIMESCALE_COMPRESS_AFTER = timedelta(days=config('TIMESCALE_COMPRESS_AFTER_DAYS', cast=int, default=14))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -141,4 +162,130 @@ CELERY_BROKER_URL = config('CELERY_BROKER_REDIS_URL', default='redis://localhost
 # CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_REDIS_URL', 'redis://localhost:6379')
 # this allows you to schedule items in the Django admin.
 
-CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers.DatabaseScheduler'
\ No newline at end of file
+CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers.DatabaseScheduler'
+
+# Queues: interactive reports, bulk/backfill reports, ingestion and everything else, so
+# each can get its own workers (see README) and a long report never blocks the others.
+# Report tasks are sent with an explicit queue and priority (store_monitor/report_control.py).
+CELERY_TASK_DEFAULT_QUEUE = 'light'
+CELERY_TASK_ROUTES = {
+    'store_monitor.tasks.generate_store_report_task': {'queue': 'reports'},
+    'store_monitor.tasks.generate_report_shard_task': {'queue': 'reports'},
+    'store_monitor.tasks.merge_report_shards_task': {'queue': 'reports'},
+    'store_monitor.tasks.report_shards_failed_task': {'queue': 'reports'},
+    'store_monitor.tasks.flush_status_buffer_task': {'queue': 'ingest'},
+    'store_monitor.tasks.refresh_status_rollup_task': {'queue': 'ingest'},
+    'store_monitor.tasks.rebuild_activity_priors_task': {'queue': 'ingest'},
+    'store_monitor.tasks.prewarm_latest_report_task': {'queue': 'ingest'},
+}
+# Message priorities 0 (first) to 9 on the Redis broker; workers take one task at a
+# time so a waiting high-priority report is not stuck behind prefetched ones
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'priority_steps': list(range(10)),
+    'sep': ':',
+    'queue_order_strategy': 'priority',
+}
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Reports running at once per queue (0 = no cap). Capped reports wait in the queue,
+# retrying every REPORT_SLOT_RETRY_SECONDS; a slot held by a crashed worker frees
+# itself after REPORT_SLOT_TTL seconds.
+REPORT_MAX_CONCURRENT = config('REPORT_MAX_CONCURRENT', cast=int, default=0)
+REPORT_MAX_CONCURRENT_BULK = config('REPORT_MAX_CONCURRENT_BULK', cast=int, default=1)
+REPORT_SLOT_TTL = config('REPORT_SLOT_TTL_SECONDS', cast=int, default=3600)
+REPORT_SLOT_RETRY_SECONDS = config('REPORT_SLOT_RETRY_SECONDS', cast=int, default=10)
+
+# Report engine used by generate_store_report_task:
+#   per_store   - original implementation, several queries per store
+#   bulk        - set-based, constant number of grouped queries for the whole fleet
+#   vectorized  - like bulk, but computes uptime with NumPy array operations (needs numpy)
+#   incremental - reuses the previous run's whole 2-hour buckets (REPORT_INCREMENTAL_MAX_DELTA)
+#   intervals   - sums poll-to-poll state durations within business hours in SQL (PostgreSQL 14+)
+REPORT_ENGINE = config('REPORT_ENGINE', default='per_store')
+
+# Sharded report generation: when REPORT_SHARD_SIZE > 0 the fleet is split into keyset
+# ranges of that many stores, computed in parallel by a Celery chord and merged at the end.
+# REPORT_SHARD_CONCURRENCY caps the number of shards (0 = no cap); size it to the number
+# of worker processes so each one gets a single shard.
+REPORT_SHARD_SIZE = config('REPORT_SHARD_SIZE', cast=int, default=0)
+REPORT_SHARD_CONCURRENCY = config('REPORT_SHARD_CONCURRENCY', cast=int, default=0)
+
+# Hourly rollup of StoreStatus (store_monitor_storestatushourly). With REPORT_BUCKET_SOURCE
+# set to 'rollup' the bulk engine reads day/week counts from it instead of raw polls.
+REPORT_BUCKET_SOURCE = config('REPORT_BUCKET_SOURCE', default='raw')
+# Polls older than the rollup watermark by up to this much are still picked up.
+ROLLUP_LATE_DATA_WINDOW = timedelta(minutes=config('ROLLUP_LATE_DATA_WINDOW_MINUTES', cast=int, default=120))
+ROLLUP_REFRESH_INTERVAL = config('ROLLUP_REFRESH_INTERVAL_SECONDS', cast=int, default=300)
+
+# POST /api/status/batch appends polls to a Redis list; a beat task drains it in COPY batches.
+REDIS_URL = config('REDIS_URL', default=CELERY_BROKER_URL)
+STATUS_FLUSH_INTERVAL = config('STATUS_FLUSH_INTERVAL_SECONDS', cast=float, default=5)
+STATUS_FLUSH_BATCH_SIZE = config('STATUS_FLUSH_BATCH_SIZE', cast=int, default=50000)
+STATUS_FLUSH_MAX_BATCHES = config('STATUS_FLUSH_MAX_BATCHES', cast=int, default=20)
+
+# Flushed polls also update per-store rolling counters in Redis read by GET /api/stores/<id>/uptime.
+# Cached store calendars (timezone + business hours) are reloaded from the DB after this many seconds.
+REALTIME_COUNTERS_ENABLED = config('REALTIME_COUNTERS_ENABLED', cast=bool, default=True)
+REALTIME_CALENDAR_TTL = config('REALTIME_CALENDAR_TTL_SECONDS', cast=int, default=3600)
+
+# GET /api/stores/<id>/uptime?start=&end=&granularity= window limits and client cache lifetime
+UPTIME_WINDOW_DEFAULT = timedelta(days=7)
+UPTIME_WINDOW_MAX = timedelta(days=config('UPTIME_WINDOW_MAX_DAYS', cast=int, default=366))
+UPTIME_CACHE_MAX_AGE = config('UPTIME_CACHE_MAX_AGE_SECONDS', cast=int, default=60)
+
+CELERY_BEAT_SCHEDULE = {
+    'refresh-status-rollup': {
+        'task': 'store_monitor.tasks.refresh_status_rollup_task',
+        'schedule': ROLLUP_REFRESH_INTERVAL,
+    },
+    'flush-status-buffer': {
+        'task': 'store_monitor.tasks.flush_status_buffer_task',
+        'schedule': STATUS_FLUSH_INTERVAL,
+    },
+}
+
+# Pre-warmed "latest" report: every REPORT_PREWARM_INTERVAL seconds (0 = off) beat refreshes
+# the rollup and queues a report at the current time. trigger_report requests within
+# REPORT_PREWARM_TOLERANCE of a completed one get it back immediately; pre-warmed reports
+# are deleted after REPORT_PREWARM_RETENTION.
+REPORT_PREWARM_INTERVAL = config('REPORT_PREWARM_INTERVAL_SECONDS', cast=int, default=0)
+REPORT_PREWARM_TOLERANCE = timedelta(seconds=config('REPORT_PREWARM_TOLERANCE_SECONDS', cast=int, default=300))
+REPORT_PREWARM_RETENTION = timedelta(hours=config('REPORT_PREWARM_RETENTION_HOURS', cast=int, default=6))
+if REPORT_PREWARM_INTERVAL:
+    CELERY_BEAT_SCHEDULE['prewarm-latest-report'] = {
+        'task': 'store_monitor.tasks.prewarm_latest_report_task',
+        'schedule': REPORT_PREWARM_INTERVAL,
+    }
+
+# Last-hour fallback for stores without recent polls: read the precomputed
+# StoreActivityPrior table instead of scanning the store's full poll history.
+REPORT_USE_ACTIVITY_PRIORS = config('REPORT_USE_ACTIVITY_PRIORS', cast=bool, default=True)
+
+# Streaming reports: the set-based engines process this many stores per keyset page
+# (0 = whole scope at once). Rows are written in buffered chunks, optionally gzipped.
+REPORT_STREAM_PAGE_SIZE = config('REPORT_STREAM_PAGE_SIZE', cast=int, default=0)
+REPORT_GZIP = config('REPORT_GZIP', cast=bool, default=False)
+REPORT_GZIP_LEVEL = config('REPORT_GZIP_LEVEL', cast=int, default=6)
+
+# Default report file format when trigger_report has no `format`: csv, csv.gz or parquet
+# (parquet needs pyarrow). REPORT_GZIP=True keeps selecting csv.gz.
+REPORT_FORMAT = config('REPORT_FORMAT', default='csv.gz' if REPORT_GZIP else 'csv')
+REPORT_PARQUET_ROW_GROUP_ROWS = config('REPORT_PARQUET_ROW_GROUP_ROWS', cast=int, default=65536)
+
+# How often (seconds) a running report saves stores_processed for GET /api/get_report
+REPORT_PROGRESS_INTERVAL = config('REPORT_PROGRESS_INTERVAL_SECONDS', cast=float, default=2)
+
+# GET /api/get_report/<id>/events (SSE) and ?wait= long-polls are closed after this many
+# seconds; SSE streams send a keepalive comment when idle this long
+REPORT_EVENTS_TIMEOUT = config('REPORT_EVENTS_TIMEOUT_SECONDS', cast=int, default=300)
+REPORT_EVENTS_KEEPALIVE = config('REPORT_EVENTS_KEEPALIVE_SECONDS', cast=int, default=15)
+
+# Intervals engine: a poll's status holds until the next poll, but for at most this long
+REPORT_INTERVAL_MAX_GAP = timedelta(minutes=config('REPORT_INTERVAL_MAX_GAP_MINUTES', cast=int, default=120))
+
+# Incremental engine: reuse the previous run's bucket counts only if it is at most this old
+REPORT_INCREMENTAL_MAX_DELTA = timedelta(hours=config('REPORT_INCREMENTAL_MAX_DELTA_HOURS', cast=int, default=24))
+
+# Single-flight lock held in Redis while a report for a given cache key is being generated,
+# renewed with the report's heartbeat (progress saves, slot retries)
+REPORT_LOCK_TTL = config('REPORT_LOCK_TTL_SECONDS', cast=int, default=600)
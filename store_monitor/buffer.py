@@ -0,0 +1,85 @@
+import io
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+
+from store_monitor.ingest import copy_polls
+from store_monitor.realtime import record_polls
+from store_monitor.redis_client import get_redis
+from store_monitor.rollup import refresh_hourly_rollup
+
+STATUS_BUFFER_KEY = 'store_monitor:status_buffer'
+FLUSH_LOCK_KEY = 'store_monitor:status_buffer:flush_lock'
+PUSH_CHUNK = 10000
+# Longest one batch may take before another flusher may take over
+FLUSH_LOCK_TTL = 300
+
+# Drop a committed batch from the head of the buffer, only while still holding the
+# flush lock (a flusher that lost it leaves the lines for the one that took over)
+TRIM_BATCH_SCRIPT = """
+if redis.call('get', KEYS[2]) ~= ARGV[1] then
+    return 0
+end
+redis.call('ltrim', KEYS[1], ARGV[2], -1)
+redis.call('expire', KEYS[2], ARGV[3])
+return 1
+"""
+
+RELEASE_FLUSH_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def buffer_polls(lines):
+    """Append 'store_id,timestamp_utc,status' lines to the Redis ingest buffer"""
+    if not lines:
+        return
+    client = get_redis()
+    with client.pipeline(transaction=False) as pipe:
+        for start in range(0, len(lines), PUSH_CHUNK):
+            pipe.rpush(STATUS_BUFFER_KEY, *lines[start:start + PUSH_CHUNK])
+        pipe.execute()
+
+
+def flush_status_buffer(batch_size=None, max_batches=None):
+    """
+    Drain the Redis buffer into store_monitor_storestatus in COPY batches and refresh
+    the hourly rollup for the hours touched, then update the realtime uptime counters.
+    Returns the number of polls written.
+
+    One flusher runs at a time (a Redis lock). Each batch is read from the head of the
+    buffer and only trimmed off after its transaction commits, so a worker killed in
+    between leaves the lines for the next flush; the merge is idempotent, so a batch that
+    did commit before the kill is merely written again.
+    """
+    batch_size = batch_size or settings.STATUS_FLUSH_BATCH_SIZE
+    max_batches = max_batches or settings.STATUS_FLUSH_MAX_BATCHES
+    client = get_redis()
+    token = str(uuid.uuid4())
+    if not client.set(FLUSH_LOCK_KEY, token, nx=True, ex=FLUSH_LOCK_TTL):
+        # Another flush is draining the buffer
+        return 0
+    flushed = 0
+
+    try:
+        for _ in range(max_batches):
+            lines = client.lrange(STATUS_BUFFER_KEY, 0, batch_size - 1)
+            if not lines:
+                break
+            with transaction.atomic():
+                _, dirty_hours = copy_polls(io.BytesIO(b'\n'.join(lines) + b'\n'))
+                refresh_hourly_rollup(hours=dirty_hours)
+            if not client.eval(TRIM_BATCH_SCRIPT, 2, STATUS_BUFFER_KEY, FLUSH_LOCK_KEY, token, len(lines), FLUSH_LOCK_TTL):
+                # The lock expired mid-batch and another flusher owns the buffer now
+                break
+            record_polls(lines)
+            flushed += len(lines)
+            if len(lines) < batch_size:
+                break
+    finally:
+        client.eval(RELEASE_FLUSH_LOCK_SCRIPT, 1, FLUSH_LOCK_KEY, token)
+    return flushed
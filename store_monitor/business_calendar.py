@@ -0,0 +1,81 @@
+"""
+Business hours compiled into sorted UTC open intervals.
+
+A store's 7 local (open, close) slots plus its timezone are expanded once per UTC week
+into epoch-second intervals: each weekday's slot is localised on its own date (so DST
+transitions are handled by the timezone), overnight slots close on the next day, and
+overlapping spans are merged. Overlap with any bucket or window is then a bisect and
+a few subtractions, with no timezone conversion.
+"""
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+
+WEEK = timedelta(days=7)
+
+
+class BusinessCalendar:
+    __slots__ = ('starts', 'ends')
+
+    def __init__(self, starts, ends):
+        self.starts = starts
+        self.ends = ends
+
+    @classmethod
+    def compile(cls, business_hours, local_tz, start_utc, end_utc):
+        """Open intervals of business_hours (7 local slots, Monday first) within [start_utc, end_utc)"""
+        start_ts = start_utc.timestamp()
+        end_ts = end_utc.timestamp()
+        # Start a day early so an overnight slot opened the previous evening is included
+        day = start_utc.astimezone(local_tz).date() - timedelta(days=1)
+        last_day = end_utc.astimezone(local_tz).date()
+
+        intervals = []
+        while day <= last_day:
+            open_local, close_local = business_hours[day.weekday()]
+            close_day = day + timedelta(days=1) if close_local <= open_local else day
+            opens = local_tz.localize(datetime.combine(day, open_local)).timestamp()
+            closes = local_tz.localize(datetime.combine(close_day, close_local)).timestamp()
+            opens, closes = max(opens, start_ts), min(closes, end_ts)
+            if opens < closes:
+                intervals.append((opens, closes))
+            day += timedelta(days=1)
+
+        starts = []
+        ends = []
+        for opens, closes in sorted(intervals):
+            if ends and opens <= ends[-1]:
+                ends[-1] = max(ends[-1], closes)
+            else:
+                starts.append(opens)
+                ends.append(closes)
+        return cls(starts, ends)
+
+    @classmethod
+    def concat(cls, calendars):
+        """Join calendars covering consecutive, non-overlapping ranges"""
+        starts = []
+        ends = []
+        for calendar in calendars:
+            starts.extend(calendar.starts)
+            ends.extend(calendar.ends)
+        return cls(starts, ends)
+
+    def overlap_seconds(self, start_ts, end_ts):
+        starts = self.starts
+        ends = self.ends
+        total = 0
+        index = bisect_right(ends, start_ts)
+        while index < len(starts) and starts[index] < end_ts:
+            total += min(ends[index], end_ts) - max(starts[index], start_ts)
+            index += 1
+        return total
+
+    def overlap_minutes(self, start_utc, end_utc):
+        return self.overlap_seconds(start_utc.timestamp(), end_utc.timestamp()) / 60
+
+    def intervals(self):
+        """(open, close) UTC datetimes, mostly for debugging"""
+        return [
+            (datetime.fromtimestamp(start, tz=timezone.utc), datetime.fromtimestamp(end, tz=timezone.utc))
+            for start, end in zip(self.starts, self.ends)
+        ]
@@ -0,0 +1,124 @@
+"""
+Columnar report output (REPORT_FORMAT=parquet) and Arrow IPC streaming.
+
+Report rows are collected into typed column batches (UUID store ids, float32 minutes
+and hours) and written as Parquet row groups of REPORT_PARQUET_ROW_GROUP_ROWS rows,
+so files are a fraction of the CSV size and load into pandas/duckdb without parsing.
+Finished reports (Parquet or CSV) can also be streamed as Arrow record batches.
+Requires pyarrow (>= 18 for the UUID type), which is only imported when used.
+"""
+import csv
+import gzip
+import io
+import os
+import uuid
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from django.conf import settings
+
+from store_monitor.report_writer import REPORT_COLUMNS
+
+# Parquet/Arrow field for each report column (names carry the unit instead of the CSV's "(in ...)")
+REPORT_FIELDS = {
+    'store_id': pa.field('store_id', pa.uuid()),
+    'uptime_last_hour': pa.field('uptime_last_hour_minutes', pa.float32()),
+    'uptime_last_day': pa.field('uptime_last_day_hours', pa.float32()),
+    'uptime_last_week': pa.field('uptime_last_week_hours', pa.float32()),
+    'downtime_last_hour': pa.field('downtime_last_hour_minutes', pa.float32()),
+    'downtime_last_day': pa.field('downtime_last_day_hours', pa.float32()),
+    'downtime_last_week': pa.field('downtime_last_week_hours', pa.float32()),
+}
+
+
+def report_schema(columns):
+    return pa.schema([REPORT_FIELDS[name] for name in columns])
+
+
+def _as_uuid(value):
+    return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+
+
+def _record_batch(values, schema):
+    return pa.record_batch(
+        [
+            pa.array([_as_uuid(v) for v in column] if field.name == 'store_id' else column, type=field.type)
+            for field, column in zip(schema, values)
+        ],
+        schema=schema,
+    )
+
+
+def iter_record_batches(rows, schema, batch_rows):
+    """Report rows (as written to the CSV) as record batches of up to batch_rows rows"""
+    values = [[] for _ in schema]
+    for row in rows:
+        for column, value in zip(values, row):
+            column.append(value)
+        if len(values[0]) >= batch_rows:
+            yield _record_batch(values, schema)
+            values = [[] for _ in schema]
+    if values[0]:
+        yield _record_batch(values, schema)
+
+
+def write_parquet(full_path, rows, columns):
+    """Write report rows as Parquet, one row group per REPORT_PARQUET_ROW_GROUP_ROWS rows"""
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    schema = report_schema(columns)
+    with pq.ParquetWriter(full_path, schema, compression='zstd') as writer:
+        for batch in iter_record_batches(rows, schema, settings.REPORT_PARQUET_ROW_GROUP_ROWS):
+            writer.write_batch(batch)
+
+
+def merge_parquet(full_path, part_paths, columns):
+    """Copy the row groups of shard files, in order, into one Parquet file"""
+    with pq.ParquetWriter(full_path, report_schema(columns), compression='zstd') as writer:
+        for part_path in part_paths:
+            part = pq.ParquetFile(part_path)
+            for index in range(part.num_row_groups):
+                writer.write_table(part.read_row_group(index))
+
+
+def _csv_columns(full_path, report_format):
+    """Report columns of a CSV report, from its header row"""
+    opener = gzip.open if report_format == 'csv.gz' else open
+    with opener(full_path, 'rt', newline='') as handle:
+        header = next(csv.reader(handle))
+    by_header = {csv_header: name for name, (csv_header, _, _) in REPORT_COLUMNS.items()}
+    return [by_header[csv_header] for csv_header in header]
+
+
+def _iter_csv_batches(full_path, schema):
+    # Converted batch by batch (gzip is detected from the extension)
+    reader = pa_csv.open_csv(
+        full_path,
+        read_options=pa_csv.ReadOptions(column_names=schema.names, skip_rows=1),
+        convert_options=pa_csv.ConvertOptions(column_types={
+            field.name: pa.string() if field.name == 'store_id' else field.type for field in schema
+        }),
+    )
+    for batch in reader:
+        store_ids = [uuid.UUID(store_id) for store_id in batch.column(0).to_pylist()]
+        yield pa.record_batch([pa.array(store_ids, type=pa.uuid()), *batch.columns[1:]], schema=schema)
+
+
+def iter_arrow_stream(full_path, report_format):
+    """A finished report as Arrow IPC stream bytes, one chunk per record batch"""
+    if report_format == 'parquet':
+        parquet = pq.ParquetFile(full_path)
+        schema = parquet.schema_arrow
+        batches = parquet.iter_batches()
+    else:
+        schema = report_schema(_csv_columns(full_path, report_format))
+        batches = _iter_csv_batches(full_path, schema)
+
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
@@ -0,0 +1,71 @@
+"""
+Server-side prepared statements for the per-store hot queries.
+
+The per_store engine runs the same few parametrised statements for every store, and
+PostgreSQL parses and plans each one again every time. execute_prepared() PREPAREs a
+statement once per database connection (named after a hash of its SQL) and EXECUTEs
+it afterwards, so with persistent connections (DB_CONN_MAX_AGE) a Celery worker pays
+the planning cost once per process instead of once per store.
+
+Statements are tracked per DB-API connection object, so a reconnect prepares them again.
+Disable DB_PREPARED_STATEMENTS behind a transaction-mode pooler such as PgBouncer < 1.21,
+which does not keep prepared statements across transactions.
+"""
+import hashlib
+import re
+import weakref
+
+from django.conf import settings
+
+# DB-API connection -> names of the statements prepared on it
+_prepared = weakref.WeakKeyDictionary()
+# Statement name -> original SQL, for classifying EXECUTEs in the report instrumentation
+PREPARED_SQL = {}
+
+_PLACEHOLDER = re.compile(r'%%|%s')
+_EXECUTE = re.compile(r'\s*EXECUTE\s+(\w+)', re.IGNORECASE)
+
+
+def statement_name(sql):
+    return 'sm_' + hashlib.sha1(sql.encode()).hexdigest()[:16]
+
+
+def _to_positional(sql):
+    """Rewrite %s placeholders as $1, $2, ... for PREPARE"""
+    position = 0
+
+    def replace(match):
+        nonlocal position
+        if match.group() == '%%':
+            return '%'
+        position += 1
+        return f'${position}'
+
+    return _PLACEHOLDER.sub(replace, sql)
+
+
+def execute_prepared(cursor, sql, params):
+    """cursor.execute(sql, params), through a prepared statement when enabled"""
+    if not settings.DB_PREPARED_STATEMENTS:
+        cursor.execute(sql, params)
+        return
+
+    name = statement_name(sql)
+    raw_connection = cursor.db.connection
+    prepared = _prepared.setdefault(raw_connection, set())
+    if name not in prepared:
+        cursor.execute(f'PREPARE {name} AS {_to_positional(sql.strip().rstrip(";"))}')
+        prepared.add(name)
+        PREPARED_SQL[name] = sql
+    if params:
+        cursor.execute(f"EXECUTE {name}({', '.join(['%s'] * len(params))})", params)
+    else:
+        cursor.execute(f'EXECUTE {name}')
+
+
+def prepared_sql(sql):
+    """The statement behind an EXECUTE issued by execute_prepared, or sql itself"""
+    match = _EXECUTE.match(sql)
+    if match:
+        return PREPARED_SQL.get(match.group(1), sql)
+    return sql
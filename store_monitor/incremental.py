@@ -0,0 +1,274 @@
+"""
+Sliding-window incremental report engine (REPORT_ENGINE=incremental).
+
+Keeps the per-store, per-bucket poll counts of the last run in a state file. The next
+run reuses every whole 2-hour bucket still inside the week window, drops the buckets
+that slid out, and only queries raw polls for the newly elapsed buckets plus the
+partial buckets at the start of the day/week windows. It falls back to a full
+computation when there is no usable state.
+
+The counts are held in flat arrays (a row of buckets per store), a few bytes per bucket
+for the whole fleet. Late polls for reused buckets are detected through the hourly
+rollup, so the report task refreshes it before every incremental run, whatever
+REPORT_BUCKET_SOURCE is; polls loaded through ingest_status or the status API also
+refresh the hours they touch. A run falls back while the rollup lags the polls it would
+reuse.
+"""
+import gzip
+import json
+import logging
+import os
+import sys
+from array import array
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connection as conn
+from django.utils import timezone as django_timezone
+
+from store_monitor.models import AggregateWatermark, Store
+from store_monitor.report_engine import (
+    _fetch_bucket_counts,
+    _iter_bucket_count_rows,
+    _iter_bucket_metrics,
+    _last_hour_probabilities,
+)
+from store_monitor.rollup import ROLLUP_WATERMARK
+from store_monitor.utils import BUCKET_SIZE, StoreMetadataIndex, floor_bucket
+
+logger = logging.getLogger(__name__)
+
+# Poll counts per bucket fit comfortably in 32 bits
+COUNT_TYPECODE = 'i'
+
+LATE_DATA_QUERY = """
+    SELECT EXISTS (
+        SELECT 1
+        FROM store_monitor_storestatushourly
+        WHERE updated_at > %s AND hour_utc >= %s AND hour_utc < %s
+    );
+"""
+
+NEWEST_POLL_BEFORE_QUERY = "SELECT MAX(timestamp_utc) FROM store_monitor_storestatus WHERE timestamp_utc < %s"
+
+
+def _offset(grid_start, bucket):
+    return (bucket - grid_start) // BUCKET_SIZE
+
+
+class BucketGrid:
+    """
+    (count_active, count_inactive) per store and 2-hour bucket from grid_start, in two
+    flat arrays of n_buckets per store row. Buckets without polls hold zeros.
+    """
+
+    def __init__(self, grid_start, n_buckets, store_ids, active=None, inactive=None):
+        self.grid_start = grid_start
+        self.n_buckets = n_buckets
+        self.store_ids = [str(store_id) for store_id in store_ids]
+        self.rows = {store_id: row for row, store_id in enumerate(self.store_ids)}
+        size = len(self.store_ids) * n_buckets
+        self.active = active if active is not None else array(COUNT_TYPECODE, [0]) * size
+        self.inactive = inactive if inactive is not None else array(COUNT_TYPECODE, [0]) * size
+
+    @classmethod
+    def spanning(cls, start_utc, end_utc, store_ids):
+        """An empty grid from the bucket holding start_utc to the one holding end_utc"""
+        grid_start = floor_bucket(start_utc)
+        return cls(grid_start, _offset(grid_start, floor_bucket(end_utc)) + 1, store_ids)
+
+    @property
+    def grid_end(self):
+        return self.grid_start + self.n_buckets * BUCKET_SIZE
+
+    def fill(self, rows):
+        """Set counts from (store_id, bucket, count_active, count_inactive) rows; rows outside the grid are skipped"""
+        for store_id, bucket, count_active, count_inactive in rows:
+            row = self.rows.get(str(store_id))
+            offset = _offset(self.grid_start, bucket)
+            if row is None or not 0 <= offset < self.n_buckets:
+                continue
+            self.active[row * self.n_buckets + offset] = count_active
+            self.inactive[row * self.n_buckets + offset] = count_inactive
+
+    def copy_from(self, other, start_bucket, end_bucket):
+        """Copy other's counts in [start_bucket, end_bucket) for the stores both grids hold"""
+        start = max(start_bucket, self.grid_start, other.grid_start)
+        end = min(end_bucket, self.grid_end, other.grid_end)
+        if start >= end:
+            return
+        length = _offset(start, end)
+        target_offset = _offset(self.grid_start, start)
+        source_offset = _offset(other.grid_start, start)
+        for store_id, row in self.rows.items():
+            other_row = other.rows.get(store_id)
+            if other_row is None:
+                continue
+            target = row * self.n_buckets + target_offset
+            source = other_row * other.n_buckets + source_offset
+            self.active[target:target + length] = other.active[source:source + length]
+            self.inactive[target:target + length] = other.inactive[source:source + length]
+
+    def buckets(self, store_id, after=None):
+        """{bucket: (count_active, count_inactive)} of a store's polled buckets, only those after `after` if given"""
+        row = self.rows.get(str(store_id))
+        if row is None:
+            return {}
+        first = 0 if after is None else max(_offset(self.grid_start, after) + 1, 0)
+        base = row * self.n_buckets
+        counts = {}
+        for offset in range(first, self.n_buckets):
+            count_active, count_inactive = self.active[base + offset], self.inactive[base + offset]
+            if count_active or count_inactive:
+                counts[self.grid_start + offset * BUCKET_SIZE] = (count_active, count_inactive)
+        return counts
+
+
+class WindowCounts:
+    """
+    {store_id: {bucket: counts}} lookups for a window, built per store on demand: whole
+    buckets after the window's first bucket, plus the first bucket counted only from
+    window_start (as the full queries do).
+    """
+
+    def __init__(self, grid, head_counts, window_start):
+        self.grid = grid
+        self.head_counts = head_counts
+        self.first_bucket = floor_bucket(window_start)
+
+    def get(self, store_id, default=None):
+        window = self.grid.buckets(store_id, after=self.first_bucket)
+        head = self.head_counts.get(store_id, {}).get(self.first_bucket)
+        if head:
+            window[self.first_bucket] = head
+        return window
+
+
+def state_path():
+    return os.path.join(settings.MEDIA_ROOT, 'reports', 'state', 'incremental_state.bin.gz')
+
+
+def _state_format():
+    return {'typecode': COUNT_TYPECODE, 'itemsize': array(COUNT_TYPECODE).itemsize, 'byteorder': sys.byteorder}
+
+
+def load_state():
+    path = state_path()
+    if not os.path.exists(path):
+        return None
+    with gzip.open(path, 'rb') as f:
+        header = json.loads(f.readline())
+        if header['format'] != _state_format():
+            return None
+        size = len(header['store_ids']) * header['n_buckets']
+        active, inactive = array(COUNT_TYPECODE), array(COUNT_TYPECODE)
+        active.fromfile(f, size)
+        inactive.fromfile(f, size)
+    return {
+        'now_utc': datetime.fromisoformat(header['now_utc']),
+        'written_at': datetime.fromisoformat(header['written_at']),
+        'grid': BucketGrid(
+            datetime.fromisoformat(header['grid_start']), header['n_buckets'], header['store_ids'], active, inactive,
+        ),
+    }
+
+
+def save_state(now_utc, written_at, grid):
+    """A JSON header line followed by the raw count arrays"""
+    path = state_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    header = {
+        'now_utc': now_utc.isoformat(),
+        'written_at': written_at.isoformat(),
+        'grid_start': grid.grid_start.isoformat(),
+        'n_buckets': grid.n_buckets,
+        'store_ids': grid.store_ids,
+        'format': _state_format(),
+    }
+    # Write then rename, so a concurrent reader never sees a half-written state
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with gzip.open(tmp_path, 'wb') as f:
+        f.write(json.dumps(header, separators=(',', ':')).encode() + b'\n')
+        grid.active.tofile(f)
+        grid.inactive.tofile(f)
+    os.replace(tmp_path, path)
+
+
+def _state_is_usable(state, now_utc, store_ids):
+    """Why state cannot be reused, or None when it can"""
+    if state is None:
+        return "no previous state"
+    delta = now_utc - state['now_utc']
+    if delta < timedelta(0):
+        return "report time is before the previous run"
+    if delta > settings.REPORT_INCREMENTAL_MAX_DELTA:
+        return f"{delta} since the previous run exceeds REPORT_INCREMENTAL_MAX_DELTA"
+    known = state['grid'].rows
+    if any(str(store_id) not in known for store_id in store_ids):
+        return "stores were added since the previous run"
+
+    tail_start = floor_bucket(state['now_utc'])
+    with conn.cursor() as cursor:
+        # Late polls only show up in the rollup once it has folded them in
+        cursor.execute(NEWEST_POLL_BEFORE_QUERY, [tail_start])
+        newest_poll = cursor.fetchone()[0]
+        rollup_watermark = (
+            AggregateWatermark.objects.filter(name=ROLLUP_WATERMARK).values_list('watermark', flat=True).first()
+        )
+        if newest_poll and (rollup_watermark is None or rollup_watermark < newest_poll):
+            return "the hourly rollup is behind the polls, so late data cannot be ruled out"
+
+        # Late polls for buckets we would reuse show up as rollup rows updated after the last run
+        cursor.execute(LATE_DATA_QUERY, [
+            state['written_at'],
+            floor_bucket(now_utc - timedelta(days=7)),
+            tail_start,
+        ])
+        if cursor.fetchone()[0]:
+            return "late data arrived for already aggregated buckets"
+    return None
+
+
+def compute_incremental_metrics(now_utc, scope):
+    written_at = django_timezone.now()
+    day_start_utc = now_utc - timedelta(days=1)
+    week_start_utc = now_utc - timedelta(days=7)
+    store_ids = list(scope.filter_stores(Store.objects.order_by('id')).values_list('id', flat=True))
+    metadata = StoreMetadataIndex.load(scope)
+
+    # The saved state always covers the whole fleet and the whole week, so subsets only read it
+    is_full_fleet = scope.is_full_fleet
+    state = load_state() if is_full_fleet else None
+    reason = _state_is_usable(state, now_utc, store_ids)
+
+    full_counts = BucketGrid.spanning(week_start_utc, now_utc, store_ids)
+    if reason is None:
+        # Reuse whole buckets from the previous run and re-read everything from its last
+        # (partial) bucket onwards
+        tail_start = floor_bucket(state['now_utc'])
+        full_counts.copy_from(state['grid'], full_counts.grid_start + BUCKET_SIZE, tail_start)
+        full_counts.fill(_iter_bucket_count_rows(tail_start, now_utc, scope))
+    else:
+        logger.info("Incremental report falling back to a full computation: %s", reason)
+        full_counts.fill(_iter_bucket_count_rows(week_start_utc, now_utc, scope))
+    # Release the previous run's arrays before the rows are produced
+    state = None
+
+    # Partial first buckets of the day and week windows
+    day_counts = week_counts = probabilities = None
+    if scope.wants('day'):
+        day_head = _fetch_bucket_counts(day_start_utc, floor_bucket(day_start_utc) + BUCKET_SIZE, scope)
+        day_counts = WindowCounts(full_counts, day_head, day_start_utc)
+    if scope.wants('week'):
+        week_head = _fetch_bucket_counts(week_start_utc, floor_bucket(week_start_utc) + BUCKET_SIZE, scope)
+        week_counts = WindowCounts(full_counts, week_head, week_start_utc)
+
+    if scope.wants('hour'):
+        with conn.cursor() as cursor:
+            probabilities = _last_hour_probabilities(cursor, now_utc, store_ids, metadata, scope)
+
+    if is_full_fleet:
+        # The partial first and last buckets are saved too, but the next run never reuses them
+        save_state(now_utc, written_at, full_counts)
+
+    return _iter_bucket_metrics(now_utc, store_ids, metadata, probabilities, day_counts, week_counts)
@@ -0,0 +1,72 @@
+from django.db import connection as conn
+
+# Session-local staging table; rows vanish at the end of each batch's transaction
+CREATE_STAGING_QUERY = """
+    CREATE TEMP TABLE IF NOT EXISTS store_status_staging (
+        store_id text,
+        timestamp_utc text,
+        status text
+    ) ON COMMIT DELETE ROWS;
+"""
+
+COPY_STAGING_QUERY = "COPY store_status_staging (store_id, timestamp_utc, status) FROM STDIN WITH (FORMAT csv)"
+
+INSERT_STORES_QUERY = """
+    INSERT INTO store_monitor_store (id)
+    SELECT DISTINCT store_id::uuid FROM store_status_staging
+    ON CONFLICT (id) DO NOTHING;
+"""
+
+# DISTINCT ON keeps a single row per key, ON CONFLICT DO UPDATE rejects duplicates within one statement
+MERGE_STATUS_QUERY = """
+    INSERT INTO store_monitor_storestatus (store_id, timestamp_utc, status)
+    SELECT DISTINCT ON (store_id, timestamp_utc) store_id, timestamp_utc, status
+    FROM (
+        SELECT
+            store_id::uuid AS store_id,
+            timestamp_utc::timestamptz AS timestamp_utc,
+            lower(trim(status)) AS status
+        FROM store_status_staging
+    ) AS parsed
+    ORDER BY store_id, timestamp_utc
+    ON CONFLICT (store_id, timestamp_utc) DO UPDATE
+    SET status = EXCLUDED.status
+    WHERE store_monitor_storestatus.status IS DISTINCT FROM EXCLUDED.status;
+"""
+
+# Every hour the batch touches gets a new ingestion version (see IngestedHour)
+BUMP_INGESTED_HOURS_QUERY = """
+    INSERT INTO store_monitor_ingestedhour (hour_utc, version, updated_at)
+    SELECT DISTINCT date_trunc('hour', timestamp_utc::timestamptz), 1, now()
+    FROM store_status_staging
+    ON CONFLICT (hour_utc) DO UPDATE
+    SET version = store_monitor_ingestedhour.version + 1, updated_at = EXCLUDED.updated_at;
+"""
+
+DIRTY_HOURS_QUERY = """
+    SELECT DISTINCT date_trunc('hour', timestamp_utc::timestamptz)
+    FROM store_status_staging;
+"""
+
+
+def copy_polls(csv_file):
+    """
+    Load headerless (store_id, timestamp_utc, status) CSV data from a file-like object
+    into store_monitor_storestatus: COPY into a staging table, create missing Store rows
+    in bulk, then merge with ON CONFLICT on (store_id, timestamp_utc).
+
+    Must run inside a transaction. Bumps the ingestion version of the UTC hours touched
+    and returns (rows merged, those hours) so the caller can refresh the hourly rollup
+    for just those hours.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(CREATE_STAGING_QUERY)
+        cursor.copy_expert(COPY_STAGING_QUERY, csv_file)
+        cursor.execute(INSERT_STORES_QUERY)
+        cursor.execute(MERGE_STATUS_QUERY)
+        merged = cursor.rowcount
+        cursor.execute(BUMP_INGESTED_HOURS_QUERY)
+        cursor.execute(DIRTY_HOURS_QUERY)
+        dirty_hours = [row[0] for row in cursor.fetchall()]
+        cursor.execute("TRUNCATE store_status_staging")
+    return merged, dirty_hours
@@ -0,0 +1,239 @@
+"""
+Progress and timing instrumentation for report runs, plus the Prometheus counters
+behind /api/metrics.
+
+A ReportInstrumentation wraps one report (or shard) run. While active it times every
+SQL statement on the Django connection (through an execute wrapper, classified by the
+tables it touches), attributes StoreMetadataIndex loads to their own phase, and splits
+the remaining time between producing rows (compute) and writing them (csv_write).
+Finished runs add their timings to counters kept in a Redis hash.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import redis
+from django.conf import settings
+from django.db import connection as conn
+from django.db.models import F
+from django.utils import timezone
+
+from store_monitor.db import prepared_sql
+from store_monitor.models import StoreReport
+from store_monitor.redis_client import get_redis
+from store_monitor.report_cache import refresh_report_lock
+from store_monitor.report_control import CANCELLED_STATUSES, ReportCancelled, refresh_report_slot
+from store_monitor.report_events import publish_report_event
+
+logger = logging.getLogger(__name__)
+
+METRICS_KEY = 'store_monitor:metrics'
+
+# First matching table wins
+QUERY_TYPES = (
+    ('store_monitor_storestatushourly', 'rollup'),
+    ('store_monitor_storeactivityprior', 'activity_priors'),
+    ('store_monitor_storestatus', 'status_polls'),
+    ('store_monitor_storereport', 'report_bookkeeping'),
+)
+
+_current = ContextVar('report_instrumentation', default=None)
+
+
+def classify_query(sql):
+    sql = prepared_sql(sql)
+    for table, query_type in QUERY_TYPES:
+        if table in sql:
+            return query_type
+    return 'other'
+
+
+@contextmanager
+def timed_phase(name):
+    """Attribute the enclosed time (and its SQL) to a phase of the active run, if any"""
+    instrumentation = _current.get()
+    if instrumentation is None:
+        yield
+        return
+    with instrumentation.phase(name):
+        yield
+
+
+class ReportInstrumentation:
+    def __init__(self, report_id=None):
+        self.report_id = report_id
+        self.phases = {}
+        self.sql_seconds = {}
+        self.sql_queries = {}
+        self.stores_processed = 0
+        self._sql_clock = 0
+        self._active_phase = None
+        self._started = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        self._token = _current.set(self)
+        self._wrapper = conn.execute_wrapper(self._time_query)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+        _current.reset(self._token)
+        self.phases['total'] = time.perf_counter() - self._started
+        return False
+
+    def _time_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            # Queries run inside a phase (e.g. metadata_load) are part of that phase
+            if self._active_phase is None:
+                elapsed = time.perf_counter() - started
+                query_type = classify_query(sql)
+                self.sql_seconds[query_type] = self.sql_seconds.get(query_type, 0) + elapsed
+                self.sql_queries[query_type] = self.sql_queries.get(query_type, 0) + 1
+                self._sql_clock += elapsed
+
+    @contextmanager
+    def phase(self, name):
+        previous = self._active_phase
+        self._active_phase = name
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - started)
+            self._active_phase = previous
+
+    def add_phase(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0) + seconds
+
+    def iter_rows(self, rows):
+        """
+        Pass report rows through, splitting the engine's time to produce them into SQL,
+        phases and Python compute, timing how long the consumer (the CSV writer) holds
+        each one, and saving stores_processed every REPORT_PROGRESS_INTERVAL seconds.
+        Raises ReportCancelled at a save once the report has been cancelled.
+        """
+        compute = consume = 0
+        saved_at = time.perf_counter()
+        saved_count = 0
+        rows = iter(rows)
+        while True:
+            started = time.perf_counter()
+            sql_before = self._sql_clock
+            phases_before = sum(self.phases.values())
+            try:
+                row = next(rows)
+            except StopIteration:
+                break
+            produced = time.perf_counter()
+            compute += (
+                produced - started
+                - (self._sql_clock - sql_before)
+                - (sum(self.phases.values()) - phases_before)
+            )
+            yield row
+            now = time.perf_counter()
+            consume += now - produced
+            self.stores_processed += 1
+            if self.report_id and now - saved_at >= settings.REPORT_PROGRESS_INTERVAL:
+                self._save_progress(self.stores_processed - saved_count)
+                saved_count = self.stores_processed
+                saved_at = now
+        if self.report_id:
+            self._save_progress(self.stores_processed - saved_count)
+
+        self.add_phase('compute', max(compute, 0))
+        self.add_phase('csv_write', consume)
+
+    def _save_progress(self, increment):
+        if increment:
+            # F() keeps concurrent shards from overwriting each other's progress
+            reports = StoreReport.objects.filter(id=self.report_id)
+            reports.update(stores_processed=F('stores_processed') + increment, heartbeat_at=timezone.now())
+            # Read back the fleet-wide count, which includes the other shards' progress,
+            # and the status, which is how a DELETE /api/report/<id> reaches this run
+            progress = reports.values('stores_processed', 'stores_total', 'status', 'priority', 'cache_key').first()
+            if progress:
+                if progress.pop('status') in CANCELLED_STATUSES:
+                    raise ReportCancelled(self.report_id)
+                # A long run keeps its slot and its single-flight lock
+                refresh_report_slot(self.report_id, progress.pop('priority'))
+                refresh_report_lock(self.report_id, progress.pop('cache_key'))
+                publish_report_event(self.report_id, 'progress', **progress)
+
+    def as_dict(self):
+        return {
+            **{name: round(seconds, 4) for name, seconds in self.phases.items()},
+            'sql_total': round(self._sql_clock, 4),
+            'sql': {query_type: round(seconds, 4) for query_type, seconds in self.sql_seconds.items()},
+            'sql_queries': dict(self.sql_queries),
+            'stores': self.stores_processed,
+        }
+
+
+def merge_timings(timings_list):
+    """Sum timing dicts from several shards (nested sql dicts are summed per key)"""
+    merged = {}
+    for timings in timings_list:
+        for name, value in timings.items():
+            if isinstance(value, dict):
+                target = merged.setdefault(name, {})
+                for key, item in value.items():
+                    target[key] = round(target.get(key, 0) + item, 4)
+            else:
+                merged[name] = round(merged.get(name, 0) + value, 4)
+    return merged
+
+
+def record_report_metrics(timings, status):
+    """Add a finished run's timings to the Prometheus counters in Redis (best effort, like the events)"""
+    try:
+        _record_report_metrics(timings, status)
+    except redis.RedisError:
+        logger.warning("Could not record metrics for a %s report", status, exc_info=True)
+
+
+def _record_report_metrics(timings, status):
+    with get_redis().pipeline(transaction=False) as pipe:
+        pipe.hincrby(METRICS_KEY, f'store_report_runs_total{{status="{status}"}}', 1)
+        pipe.hincrby(METRICS_KEY, 'store_report_stores_processed_total', timings.get('stores', 0))
+        for name, value in timings.items():
+            if name == 'sql':
+                for query_type, seconds in value.items():
+                    pipe.hincrbyfloat(METRICS_KEY, f'store_report_sql_seconds_total{{type="{query_type}"}}', seconds)
+            elif name == 'sql_queries':
+                for query_type, count in value.items():
+                    pipe.hincrby(METRICS_KEY, f'store_report_sql_queries_total{{type="{query_type}"}}', count)
+            elif name not in ('stores', 'sql_total'):
+                pipe.hincrbyfloat(METRICS_KEY, f'store_report_phase_seconds_total{{phase="{name}"}}', value)
+        pipe.execute()
+
+
+METRIC_HELP = {
+    'store_report_runs_total': ('counter', 'Finished report runs by outcome'),
+    'store_report_stores_processed_total': ('counter', 'Stores written to reports'),
+    'store_report_phase_seconds_total': ('counter', 'Seconds spent per report phase'),
+    'store_report_sql_seconds_total': ('counter', 'Seconds spent in report SQL per query type'),
+    'store_report_sql_queries_total': ('counter', 'Report SQL statements per query type'),
+}
+
+
+def render_prometheus_metrics():
+    """Prometheus text exposition of the counters in Redis"""
+    samples = {}
+    for key, value in get_redis().hgetall(METRICS_KEY).items():
+        key = key.decode()
+        samples.setdefault(key.split('{')[0], []).append((key, value.decode()))
+
+    lines = []
+    for name, (metric_type, help_text) in METRIC_HELP.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for key, value in sorted(samples.get(name, [])):
+            lines.append(f"{key} {value}")
+    return "\n".join(lines) + "\n"
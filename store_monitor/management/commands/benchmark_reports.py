@@ -0,0 +1,253 @@
+import json
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from store_monitor.instrumentation import ReportInstrumentation
+from store_monitor.models import Store
+from store_monitor.report_cache import get_data_watermark
+from store_monitor.report_engine import ENGINES, REPORT_WINDOWS, StoreScope
+from store_monitor.report_writer import REPORT_FORMATS, report_columns, write_report
+from store_monitor.tasks import iter_report_rows
+from store_monitor.utils import (
+    StoreMetadataIndex,
+    calculate_uptime_last_day,
+    calculate_uptime_last_hour,
+    calculate_uptime_last_week,
+    calculate_uptime_windows,
+    ensure_utc,
+)
+
+UPTIME_FUNCTIONS = {
+    'calculate_uptime_last_hour': calculate_uptime_last_hour,
+    'calculate_uptime_last_day': calculate_uptime_last_day,
+    'calculate_uptime_last_week': calculate_uptime_last_week,
+    'calculate_uptime_windows': calculate_uptime_windows,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def maxrss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if platform.system() == 'Darwin' else rss / 1024
+
+
+class QueryCounter:
+    """Execute wrapper counting statements (connection.queries is capped at 9000 entries)"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(fn, trace_memory=False):
+    """
+    Run fn() and return (result, wall seconds, query count, tracemalloc peak in MB or None).
+    tracemalloc slows allocation-heavy code down noticeably, so it is opt-in.
+    """
+    if trace_memory:
+        tracemalloc.start()
+    queries = QueryCounter()
+    try:
+        with connection.execute_wrapper(queries):
+            started = time.perf_counter()
+            result = fn()
+            wall = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024) if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return result, wall, queries.count, peak
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark report generation and the calculate_uptime_* functions on the first "
+        "N stores (by id) for several N, writing wall time, query counts and memory to JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales', default='1000,10000,50000',
+            help="Comma-separated store counts (default: 1000,10000,50000). Scales above the fleet size are skipped",
+        )
+        parser.add_argument(
+            '--engines', default='per_store,bulk',
+            help=f"Comma-separated report engines to time, from {', '.join(ENGINES)} (default: per_store,bulk)",
+        )
+        parser.add_argument(
+            '--sample', type=int, default=100,
+            help="Stores timed individually with each calculate_uptime_* function (default: 100)",
+        )
+        parser.add_argument(
+            '--now', default=None,
+            help="Report time (YYYY-MM-DD HH:MM:SS UTC). Defaults to the newest poll",
+        )
+        parser.add_argument(
+            '--output', default=None,
+            help="Result file (default: benchmarks/<timestamp>_<commit>.json under BASE_DIR)",
+        )
+        parser.add_argument(
+            '--trace-memory', action='store_true',
+            help="Record the Python heap peak with tracemalloc (slows the runs down)",
+        )
+        parser.add_argument(
+            '--format', default='csv', choices=REPORT_FORMATS,
+            help="Report file format written by the report runs (default: csv)",
+        )
+        parser.add_argument(
+            '--windows', default=','.join(REPORT_WINDOWS),
+            help="Comma-separated windows the report runs compute (default: hour,day,week)",
+        )
+        parser.add_argument('--compare', default=None, help="Earlier result file to print relative changes against")
+
+    def handle(self, *args, **options):
+        if options['now']:
+            now_utc = ensure_utc(datetime.strptime(options['now'], "%Y-%m-%d %H:%M:%S"))
+        else:
+            now_utc = get_data_watermark()
+            if now_utc is None:
+                raise CommandError("No polls found; run gen_synthetic_data first")
+        engines = [engine for engine in options['engines'].split(',') if engine]
+        unknown = set(engines) - set(ENGINES)
+        if unknown:
+            raise CommandError(f"Unknown engines: {', '.join(sorted(unknown))}")
+        windows = [window for window in options['windows'].split(',') if window]
+        if not windows or set(windows) - set(REPORT_WINDOWS):
+            raise CommandError(f"--windows must be among {', '.join(REPORT_WINDOWS)}")
+
+        fleet_size = Store.objects.count()
+        scales = sorted({int(scale) for scale in options['scales'].split(',')})
+        commit = git_commit()
+        results = []
+
+        for scale in scales:
+            if scale > fleet_size:
+                self.stdout.write(self.style.WARNING(f"Skipping scale {scale}: only {fleet_size} stores"))
+                continue
+            # The first `scale` stores in id order, as a keyset range every engine understands
+            upper = Store.objects.order_by('id').values_list('id', flat=True)[scale:scale + 1].first()
+            scope = StoreScope(id_lt=upper, windows=windows)
+
+            for engine in engines:
+                results.append(self._bench_report(
+                    scale, engine, now_utc, scope, options['format'], options['trace_memory'],
+                ))
+            results.extend(self._bench_functions(scale, now_utc, scope, options['sample'], options['trace_memory']))
+
+        payload = {
+            'git_commit': commit,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'now_utc': now_utc.isoformat(),
+            'fleet_size': fleet_size,
+            'python': platform.python_version(),
+            'maxrss_mb': round(maxrss_mb(), 1),
+            'results': results,
+        }
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'benchmarks', f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}_{commit or 'nogit'}.json",
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(payload, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {output}"))
+
+        if options['compare']:
+            self._compare(options['compare'], results)
+
+    def _bench_report(self, scale, engine, now_utc, scope, report_format, trace_memory):
+        """Time the report task's work (rows + file write) for one scope, without Celery"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, f'report.{report_format}')
+
+            def run():
+                with ReportInstrumentation() as instrumentation:
+                    rows = instrumentation.iter_rows(iter_report_rows(now_utc, engine, scope))
+                    write_report(path, report_format, rows, report_columns(scope.windows))
+                return instrumentation.as_dict()
+
+            timings, wall, queries, peak_mb = measure(run, trace_memory)
+            file_mb = os.path.getsize(path) / (1024 * 1024)
+
+        result = {
+            'target': f'report:{engine}',
+            'scale': scale,
+            'wall_seconds': round(wall, 4),
+            'queries': queries,
+            'peak_tracemalloc_mb': round(peak_mb, 2) if peak_mb is not None else None,
+            'maxrss_mb': round(maxrss_mb(), 1),
+            'format': report_format,
+            'windows': scope.windows,
+            'file_mb': round(file_mb, 3),
+            'timings': timings,
+        }
+        self._print(result)
+        return result
+
+    def _bench_functions(self, scale, now_utc, scope, sample, trace_memory):
+        store_ids = list(scope.filter_stores(Store.objects.order_by('id')).values_list('id', flat=True)[:sample])
+        metadata = StoreMetadataIndex.load(scope)
+        results = []
+        for name, fn in UPTIME_FUNCTIONS.items():
+            def run():
+                for store_id in store_ids:
+                    fn(store_id, now_utc, metadata.timezone(store_id), metadata)
+
+            _, wall, queries, peak_mb = measure(run, trace_memory)
+            result = {
+                'target': name,
+                'scale': scale,
+                'stores': len(store_ids),
+                'wall_seconds': round(wall, 4),
+                'ms_per_store': round(wall / len(store_ids) * 1000, 3) if store_ids else None,
+                'queries': queries,
+                'peak_tracemalloc_mb': round(peak_mb, 2) if peak_mb is not None else None,
+            }
+            self._print(result)
+            results.append(result)
+        return results
+
+    def _print(self, result):
+        peak = result['peak_tracemalloc_mb']
+        self.stdout.write(
+            f"{result['target']:<32} scale={result['scale']:<7} wall={result['wall_seconds']:.3f}s  "
+            f"queries={result['queries']:<7}" + (f" peak={peak:.1f}MB" if peak is not None else "")
+        )
+
+    def _compare(self, path, results):
+        with open(path) as f:
+            baseline = {(r['target'], r['scale']): r for r in json.load(f)['results']}
+        self.stdout.write(f"\nCompared with {path}:")
+        for result in results:
+            before = baseline.get((result['target'], result['scale']))
+            if not before or not before['wall_seconds']:
+                continue
+            change = result['wall_seconds'] / before['wall_seconds'] - 1
+            style = self.style.ERROR if change > 0.1 else self.style.SUCCESS if change < -0.1 else str
+            self.stdout.write(style(
+                f"{result['target']:<32} scale={result['scale']:<7} "
+                f"{before['wall_seconds']:.3f}s -> {result['wall_seconds']:.3f}s ({change:+.1%}), "
+                f"queries {before['queries']} -> {result['queries']}"
+            ))
@@ -0,0 +1,149 @@
+import io
+import random
+import time
+import uuid
+from datetime import datetime, time as dt_time, timedelta, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from store_monitor.ingest import copy_polls
+from store_monitor.models import Store, StoreBusinessHour, StoreTimezone
+from store_monitor.rollup import refresh_hourly_rollup
+
+# DST and non-DST zones, so local/UTC conversions are exercised across transitions
+TIMEZONES = [
+    'America/Chicago',
+    'America/New_York',
+    'America/Denver',
+    'America/Los_Angeles',
+    'America/Phoenix',
+    'America/Anchorage',
+    'Pacific/Honolulu',
+    'Europe/London',
+]
+
+# (weight, per-day (start, end) or None for "no rows", i.e. open 24/7)
+BUSINESS_HOUR_PROFILES = [
+    (30, None),
+    (30, (dt_time(9, 0), dt_time(17, 0))),
+    (20, (dt_time(10, 0), dt_time(22, 0))),
+    (10, (dt_time(22, 0), dt_time(2, 0))),   # overnight
+    (10, (dt_time(18, 0), dt_time(4, 30))),  # overnight, ends on a half hour
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic stores, timezones, business hours and status polls for "
+        "benchmarking. Polls are loaded with COPY through the ingest_status pipeline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stores', type=int, default=1000, help="Number of stores to create (default: 1000)")
+        parser.add_argument('--days', type=int, default=8, help="Days of poll history per store (default: 8)")
+        parser.add_argument(
+            '--poll-interval', type=int, default=60,
+            help="Average minutes between a store's polls (default: 60)",
+        )
+        parser.add_argument(
+            '--end', default=None,
+            help="UTC timestamp (YYYY-MM-DD HH:MM:SS) of the newest polls. Defaults to now",
+        )
+        parser.add_argument('--seed', type=int, default=None, help="Random seed, for reproducible data sets")
+        parser.add_argument(
+            '--batch-stores', type=int, default=500,
+            help="Stores whose polls are loaded per COPY batch (default: 500)",
+        )
+        parser.add_argument(
+            '--skip-rollup', action='store_true',
+            help="Do not refresh the hourly rollup after loading",
+        )
+
+    def handle(self, *args, **options):
+        if options['stores'] <= 0 or options['days'] <= 0 or options['poll_interval'] <= 0:
+            raise CommandError("--stores, --days and --poll-interval must be positive")
+        rng = random.Random(options['seed'])
+        end_utc = (
+            datetime.strptime(options['end'], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+            if options['end'] else datetime.now(timezone.utc)
+        )
+        start_utc = end_utc - timedelta(days=options['days'])
+
+        started = time.monotonic()
+        total_polls = 0
+        store_ids = [uuid.UUID(int=rng.getrandbits(128), version=4) for _ in range(options['stores'])]
+        for offset in range(0, len(store_ids), options['batch_stores']):
+            batch = store_ids[offset:offset + options['batch_stores']]
+            with transaction.atomic():
+                self._create_stores(batch, rng)
+                buffer = io.StringIO()
+                for store_id in batch:
+                    total_polls += self._write_polls(buffer, store_id, start_utc, end_utc, options['poll_interval'], rng)
+                buffer.seek(0)
+                copy_polls(buffer)
+
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"{offset + len(batch)}/{len(store_ids)} stores  polls={total_polls}  "
+                f"{total_polls / elapsed if elapsed else 0:,.0f} polls/s"
+            )
+
+        if not options['skip_rollup']:
+            self.stdout.write("Refreshing hourly rollup...")
+            refresh_hourly_rollup()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(store_ids)} stores and {total_polls} polls "
+            f"from {start_utc:%Y-%m-%d %H:%M} to {end_utc:%Y-%m-%d %H:%M} UTC "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
+
+    def _create_stores(self, store_ids, rng):
+        Store.objects.bulk_create([Store(id=store_id) for store_id in store_ids], ignore_conflicts=True)
+        timezones = []
+        business_hours = []
+        weights = [weight for weight, _ in BUSINESS_HOUR_PROFILES]
+        profiles = [profile for _, profile in BUSINESS_HOUR_PROFILES]
+        for store_id in store_ids:
+            # Like the real data set, some stores have no timezone row and use the default
+            if rng.random() < 0.9:
+                timezones.append(StoreTimezone(store_id=store_id, timezone_str=rng.choice(TIMEZONES)))
+            profile = rng.choices(profiles, weights)[0]
+            if profile is None:
+                continue
+            # Some stores leave one day without a row, which means open 00:00-23:59 on that
+            # day (a row cannot express a closed day: end <= start wraps past midnight)
+            default_hours_day = rng.randrange(7) if rng.random() < 0.3 else None
+            for day in range(7):
+                if day == default_hours_day:
+                    continue
+                start_local, end_local = profile
+                business_hours.append(StoreBusinessHour(
+                    store_id=store_id,
+                    day_of_week=day,
+                    start_time_local=start_local,
+                    end_time_local=end_local,
+                ))
+        StoreTimezone.objects.bulk_create(timezones, ignore_conflicts=True)
+        StoreBusinessHour.objects.bulk_create(business_hours, ignore_conflicts=True)
+
+    def _write_polls(self, buffer, store_id, start_utc, end_utc, poll_interval, rng):
+        """
+        Polls at jittered intervals with outages: a two-state Markov chain whose
+        failure rate differs per store, so stores range from flaky to near-perfect.
+        """
+        fail_rate = rng.choice((0.002, 0.01, 0.03, 0.1))
+        recover_rate = rng.uniform(0.2, 0.6)
+        active = True
+        count = 0
+        ts = start_utc + timedelta(minutes=rng.uniform(0, poll_interval))
+        while ts < end_utc:
+            if active and rng.random() < fail_rate:
+                active = False
+            elif not active and rng.random() < recover_rate:
+                active = True
+            buffer.write(f"{store_id},{ts.isoformat()},{'active' if active else 'inactive'}\n")
+            count += 1
+            ts += timedelta(minutes=poll_interval * rng.uniform(0.75, 1.25))
+        return count
@@ -0,0 +1,100 @@
+import io
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from store_monitor.ingest import copy_polls
+from store_monitor.rollup import refresh_hourly_rollup
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a store status CSV (store_id, timestamp_utc, status) into "
+        "store_monitor_storestatus with COPY, in resumable byte-offset batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path')
+        parser.add_argument(
+            '--batch-mb', type=int, default=64,
+            help="Approximate size of each COPY batch in megabytes (default: 64)",
+        )
+        parser.add_argument(
+            '--offset', type=int, default=None,
+            help="Byte offset to start from. Defaults to the offset saved in --state-file, or 0",
+        )
+        parser.add_argument(
+            '--state-file', default=None,
+            help="File recording the byte offset of the last committed batch (default: <csv_path>.offset)",
+        )
+        parser.add_argument(
+            '--skip-rollup', action='store_true',
+            help="Do not refresh the hourly rollup for the ingested hours after each batch",
+        )
+
+    def handle(self, *args, **options):
+        csv_path = options['csv_path']
+        if not os.path.exists(csv_path):
+            raise CommandError(f"File not found: {csv_path}")
+
+        state_file = options['state_file'] or f"{csv_path}.offset"
+        offset = options['offset']
+        if offset is None:
+            offset = self._read_offset(state_file)
+        batch_bytes = options['batch_mb'] * 1024 * 1024
+        file_size = os.path.getsize(csv_path)
+
+        total_rows = 0
+        started = time.monotonic()
+        with open(csv_path, 'rb') as source:
+            source.seek(offset)
+            if offset == 0:
+                first_line = source.readline()
+                if not first_line.lower().startswith(b'store_id'):
+                    source.seek(0)
+                offset = source.tell()
+
+            while True:
+                chunk = source.read(batch_bytes)
+                if not chunk:
+                    break
+                # Cut the batch at the last complete line; the remainder starts the next batch
+                if not chunk.endswith(b'\n'):
+                    tail = source.readline()
+                    chunk += tail
+                rows = chunk.count(b'\n') + (0 if chunk.endswith(b'\n') else 1)
+
+                with transaction.atomic():
+                    merged, dirty_hours = copy_polls(io.BytesIO(chunk))
+                    if not options['skip_rollup']:
+                        refresh_hourly_rollup(hours=dirty_hours)
+
+                offset += len(chunk)
+                total_rows += rows
+                self._write_offset(state_file, offset)
+
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"{offset / file_size:6.1%}  offset={offset}  rows={total_rows}  "
+                    f"merged={merged}  {total_rows / elapsed if elapsed else 0:,.0f} rows/s"
+                )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Ingested {total_rows} rows in {elapsed:.1f}s "
+            f"({total_rows / elapsed if elapsed else 0:,.0f} rows/s)"
+        ))
+
+    def _read_offset(self, state_file):
+        if not os.path.exists(state_file):
+            return 0
+        with open(state_file) as f:
+            return int(f.read().strip() or 0)
+
+    def _write_offset(self, state_file, offset):
+        tmp_path = f"{state_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(offset))
+        os.replace(tmp_path, state_file)
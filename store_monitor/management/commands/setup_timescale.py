@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from store_monitor.timescale import (
+    compress_old_chunks,
+    is_hypertable,
+    setup_timescale,
+    storage_stats,
+    timescale_available,
+)
+
+
+def _mb(size):
+    return f"{size / (1024 * 1024):,.1f} MB" if size is not None else "-"
+
+
+class Command(BaseCommand):
+    help = (
+        "Make store_monitor_storestatus a TimescaleDB hypertable with a (store_id, timestamp_utc DESC) "
+        "index and native compression, or retune the chunk interval and compression policy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-interval-hours', type=int, default=None,
+            help="Time span of new chunks (default: TIMESCALE_CHUNK_INTERVAL_HOURS)",
+        )
+        parser.add_argument(
+            '--compress-after-days', type=int, default=None,
+            help="Compress chunks older than this many days, 0 = no policy (default: TIMESCALE_COMPRESS_AFTER_DAYS)",
+        )
+        parser.add_argument(
+            '--compress-now', action='store_true',
+            help="Compress the chunks past the compression age now instead of on the policy's next run",
+        )
+
+    def handle(self, *args, **options):
+        chunk_interval = settings.TIMESCALE_CHUNK_INTERVAL
+        if options['chunk_interval_hours'] is not None:
+            chunk_interval = timedelta(hours=options['chunk_interval_hours'])
+        compress_after = settings.TIMESCALE_COMPRESS_AFTER
+        if options['compress_after_days'] is not None:
+            compress_after = timedelta(days=options['compress_after_days'])
+        if chunk_interval <= timedelta(0):
+            raise CommandError("--chunk-interval-hours must be positive")
+        if options['compress_now'] and not compress_after:
+            raise CommandError("--compress-now needs a compression age")
+
+        with connection.cursor() as cursor:
+            if not timescale_available(cursor):
+                raise CommandError("The timescaledb extension is not available on this database server")
+
+        with transaction.atomic():
+            steps = setup_timescale(connection, chunk_interval, compress_after or None)
+        if steps is None:
+            raise CommandError("Could not create the timescaledb extension (see the log)")
+        self.stdout.write(f"Applied: {', '.join(steps)}")
+
+        if options['compress_now']:
+            compressed = compress_old_chunks(connection, compress_after)
+            self.stdout.write(f"Compressed {compressed} chunks older than {compress_after}")
+
+        with connection.cursor() as cursor:
+            if not is_hypertable(cursor):
+                return
+        stats = storage_stats(connection)
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['chunks'] or 0} chunks ({stats['compressed_chunks'] or 0} compressed), "
+            f"{_mb(stats['total_bytes'])} on disk; compressed chunks "
+            f"{_mb(stats['before_compression_bytes'])} -> {_mb(stats['after_compression_bytes'])}"
+        ))
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store_monitor', '0006_storereport'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AggregateWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('watermark', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StoreStatusHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour_utc', models.DateTimeField()),
+                ('count_active', models.IntegerField(default=0)),
+                ('count_inactive', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_status', to='store_monitor.store')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hour_utc'], name='store_monit_hour_ut_20fbd6_idx')],
+                'constraints': [models.UniqueConstraint(fields=('store', 'hour_utc'), name='store_hour_unique')],
+            },
+        ),
+    ]
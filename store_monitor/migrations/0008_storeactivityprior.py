@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store_monitor', '0007_storestatushourly_aggregatewatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoreActivityPrior',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day_of_week', models.IntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('hour', models.IntegerField()),
+                ('count_active', models.IntegerField(default=0)),
+                ('count_inactive', models.IntegerField(default=0)),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_priors', to='store_monitor.store')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('store', 'day_of_week', 'hour'), name='store_dow_hour_unique')],
+            },
+        ),
+    ]
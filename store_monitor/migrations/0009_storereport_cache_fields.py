@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store_monitor', '0008_storeactivityprior'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storereport',
+            name='cache_key',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='storereport',
+            name='data_watermark',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='storereport',
+            name='requested_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
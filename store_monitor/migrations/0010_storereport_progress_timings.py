@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store_monitor', '0009_storereport_cache_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storereport',
+            name='stores_processed',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='storereport',
+            name='stores_total',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='storereport',
+            name='timings',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
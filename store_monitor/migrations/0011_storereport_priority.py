@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store_monitor', '0010_storereport_progress_timings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storereport',
+            name='priority',
+            field=models.CharField(default='normal', max_length=10),
+        ),
+    ]
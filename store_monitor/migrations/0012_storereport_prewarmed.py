@@ -0,0 +1,22 @@
+# Generated by Django 5.2.3 on 2026-10-18 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store_monitor', '0011_storereport_priority'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storereport',
+            name='prewarmed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='storereport',
+            index=models.Index(fields=['prewarmed', 'requested_at'], name='storereport_prewarm_idx'),
+        ),
+    ]
@@ -0,0 +1,92 @@
+from django.db import migrations, transaction
+
+# A frozen copy of the layout in store_monitor/timescale.py at the time of this migration,
+# with its default settings. Retune with `manage.py setup_timescale`, not by editing this.
+TABLE = 'store_monitor_storestatus'
+CHUNK_INTERVAL = '24 hours'
+COMPRESS_AFTER = '14 days'
+
+DROP_ID_PRIMARY_KEY = f"""
+    DO $$
+    DECLARE
+        pk_name text;
+    BEGIN
+        SELECT c.conname INTO pk_name
+        FROM pg_constraint c
+        WHERE c.conrelid = '{TABLE}'::regclass
+          AND c.contype = 'p'
+          AND NOT EXISTS (
+              SELECT 1 FROM pg_attribute a
+              WHERE a.attrelid = c.conrelid AND a.attnum = ANY(c.conkey) AND a.attname = 'timestamp_utc'
+          );
+        IF pk_name IS NOT NULL THEN
+            EXECUTE format('ALTER TABLE {TABLE} DROP CONSTRAINT %I', pk_name);
+        END IF;
+    END
+    $$;
+"""
+
+CREATE_HYPERTABLE = f"""
+    SELECT create_hypertable(
+        '{TABLE}', 'timestamp_utc',
+        chunk_time_interval => INTERVAL '{CHUNK_INTERVAL}',
+        migrate_data => TRUE, create_default_indexes => FALSE, if_not_exists => TRUE
+    );
+"""
+
+CREATE_STORE_TIME_INDEX = f"""
+    CREATE INDEX IF NOT EXISTS storestatus_store_time_idx
+    ON {TABLE} (store_id, timestamp_utc DESC) INCLUDE (status);
+    DROP INDEX IF EXISTS store_monit_store_i_68b46f_idx;
+"""
+
+ENABLE_COMPRESSION = f"""
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM timescaledb_information.hypertables
+            WHERE hypertable_name = '{TABLE}' AND compression_enabled
+        ) THEN
+            ALTER TABLE {TABLE} SET (
+                timescaledb.compress,
+                timescaledb.compress_segmentby = 'store_id',
+                timescaledb.compress_orderby = 'timestamp_utc DESC'
+            );
+        END IF;
+    END
+    $$;
+    SELECT add_compression_policy('{TABLE}', INTERVAL '{COMPRESS_AFTER}', if_not_exists => TRUE);
+"""
+
+
+def apply_timescale_layout(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'timescaledb'")
+        if cursor.fetchone() is None:
+            return
+        try:
+            # A savepoint, so a missing privilege leaves the table plain instead of failing migrate
+            with transaction.atomic(using=connection.alias):
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS timescaledb")
+        except Exception:
+            return
+        cursor.execute(DROP_ID_PRIMARY_KEY)
+        cursor.execute(CREATE_HYPERTABLE)
+        cursor.execute(CREATE_STORE_TIME_INDEX)
+        cursor.execute(ENABLE_COMPRESSION)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store_monitor', '0012_storereport_prewarmed'),
+    ]
+
+    operations = [
+        # store_monitor_storestatus is unmanaged, so the layout is applied in SQL (idempotent;
+        # skipped without the timescaledb extension). Reversing leaves the hypertable in place.
+        migrations.RunPython(apply_timescale_layout, migrations.RunPython.noop),
+    ]
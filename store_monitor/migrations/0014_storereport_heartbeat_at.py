@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store_monitor', '0013_storestatus_timescale_layout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storereport',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
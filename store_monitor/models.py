@@ -11,6 +11,7 @@ class Store(models.Model):
 class StoreTimezone(models.Model):
     store = models.OneToOneField(Store, on_delete=models.CASCADE, related_name='timezone')
     timezone_str = models.CharField(max_length=100, default='America/Chicago')
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.store} - Timezone: {self.timezone_str}"
@@ -31,6 +32,7 @@ class StoreBusinessHour(models.Model):
     day_of_week = models.IntegerField(choices=DAYS_OF_WEEK)
     start_time_local = models.TimeField()
     end_time_local = models.TimeField()
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('store', 'day_of_week')
@@ -55,8 +57,9 @@ class StoreStatus(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['store', 'timestamp_utc'], name='store_timestamp_unique')
         ]
+        # Created by migration 0013, which also makes the table a hypertable (see store_monitor/timescale.py)
         indexes = [
-            models.Index(fields=['store']),
+            models.Index(fields=['store', '-timestamp_utc'], include=['status'], name='storestatus_store_time_idx'),
             models.Index(fields=['timestamp_utc']),
         ]
         ordering = ['timestamp_utc']
@@ -70,4 +73,89 @@ class StoreReport(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     timestamp_utc = models.DateTimeField(auto_now_add=True)
     report_file = models.FileField(upload_to='reports/', null=True, blank=True)
-    status = models.CharField(max_length=100, default="pending")
\ No newline at end of file
+    status = models.CharField(max_length=100, default="pending")
+    # Report time requested by the client and the newest poll it covers; both feed cache_key
+    requested_at = models.DateTimeField(null=True, blank=True)
+    data_watermark = models.DateTimeField(null=True, blank=True)
+    cache_key = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    # Progress and per-phase timings (seconds) recorded by the report task
+    stores_total = models.IntegerField(null=True, blank=True)
+    stores_processed = models.IntegerField(default=0)
+    timings = models.JSONField(default=dict, blank=True)
+    # Scheduling class (high, normal or bulk), which picks the Celery queue and priority
+    priority = models.CharField(max_length=10, default='normal')
+    # Generated by the beat pre-warm task; served to trigger_report within REPORT_PREWARM_TOLERANCE
+    prewarmed = models.BooleanField(default=False)
+    # Last sign of life of an in-flight report (queued, waiting for a slot or running);
+    # one silent for longer than REPORT_LOCK_TTL is presumed dead
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['prewarmed', 'requested_at'], name='storereport_prewarm_idx'),
+        ]
+
+
+class StoreStatusHourly(models.Model):
+    """Per-store, per-hour poll counts rolled up from StoreStatus by refresh_hourly_rollup"""
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='hourly_status')
+    hour_utc = models.DateTimeField()
+    count_active = models.IntegerField(default=0)
+    count_inactive = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['store', 'hour_utc'], name='store_hour_unique')
+        ]
+        indexes = [
+            models.Index(fields=['hour_utc']),
+        ]
+
+    def __str__(self):
+        return f"{self.store} - {self.hour_utc}: {self.count_active} active / {self.count_inactive} inactive"
+
+
+class IngestedHour(models.Model):
+    """
+    Ingestion version of one UTC hour of StoreStatus: copy_polls bumps it for every hour a
+    batch touches, so backfilled polls change it even when they are older than the newest poll
+    """
+    hour_utc = models.DateTimeField(unique=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.hour_utc} v{self.version}"
+
+
+class AggregateWatermark(models.Model):
+    """Latest StoreStatus.timestamp_utc already folded into a derived aggregate"""
+    name = models.CharField(max_length=100, unique=True)
+    watermark = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.watermark}"
+
+
+class StoreActivityPrior(models.Model):
+    """
+    Poll counts per store, local day of week and local hour, used as the prior for
+    the last-hour uptime when a store has no recent polls. Maintained incrementally
+    alongside StoreStatusHourly.
+    """
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='activity_priors')
+    day_of_week = models.IntegerField(choices=StoreBusinessHour.DAYS_OF_WEEK)
+    hour = models.IntegerField()
+    count_active = models.IntegerField(default=0)
+    count_inactive = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['store', 'day_of_week', 'hour'], name='store_dow_hour_unique')
+        ]
+
+    def __str__(self):
+        day = dict(StoreBusinessHour.DAYS_OF_WEEK).get(self.day_of_week, "Unknown")
+        return f"{self.store} - {day} {self.hour:02d}h: {self.count_active} active / {self.count_inactive} inactive"
@@ -0,0 +1,294 @@
+"""
+Per-store rolling uptime counters kept in Redis.
+
+Every ingested poll that falls inside the store's business hours bumps two ring
+buffers in one Lua call: a 60-slot minute ring (last hour) and a 168-slot hour ring
+(last day/week). Each slot remembers which minute/hour it holds, so a slot is reset
+when the ring wraps and polls older than the slot's period are ignored.
+
+A re-sent poll (same store and timestamp) is counted once: the timestamps of the last
+week's polls are kept in a sorted set per store. A re-sent poll whose status changed
+keeps its first status in the counters.
+
+The store's calendar (timezone and business hours) is cached in Redis as JSON next
+to the rings, so reading a store's uptime never touches the database. Ingestion
+reloads a calendar from the database once it is older than REALTIME_CALENDAR_TTL.
+
+Only polls flushed from the POST /api/status/batch buffer feed the counters; bulk loads
+through ingest_status (or gen_synthetic_data) do not.
+"""
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+
+from store_monitor.redis_client import get_redis
+from store_monitor.utils import StoreMetadataIndex, floor_bucket, get_timezone
+
+KEY_PREFIX = 'store_monitor:rt:'
+MINUTE_SLOTS = 60
+HOUR_SLOTS = 7 * 24
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+# Rings and calendars outlive the week window by a day
+RING_TTL = int(timedelta(days=8).total_seconds())
+
+# KEYS: minute ring, hour ring, seen timestamps. ARGV: epoch minute, epoch hour,
+# 1 if active else 0, ttl, epoch seconds of the poll, epoch seconds before which seen
+# timestamps are dropped
+BUMP_SCRIPT = """
+if redis.call('ZADD', KEYS[3], 'NX', ARGV[5], ARGV[5]) == 0 then
+    return 0
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', '(' .. ARGV[6])
+redis.call('EXPIRE', KEYS[3], tonumber(ARGV[4]))
+
+local function bump(key, slots, period, active, ttl)
+    local slot = period % slots
+    local current = tonumber(redis.call('HGET', key, slot .. ':t') or '-1')
+    if current > period then
+        return
+    end
+    if current < period then
+        redis.call('HSET', key, slot .. ':t', period, slot .. ':a', 0, slot .. ':i', 0)
+    end
+    redis.call('HINCRBY', key, slot .. (active == 1 and ':a' or ':i'), 1)
+    redis.call('EXPIRE', key, ttl)
+end
+bump(KEYS[1], 60, tonumber(ARGV[1]), tonumber(ARGV[3]), tonumber(ARGV[4]))
+bump(KEYS[2], 168, tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4]))
+return 1
+"""
+
+_bump_script = None
+
+
+def _keys(store_id):
+    base = f"{KEY_PREFIX}{store_id}"
+    return f"{base}:calendar", f"{base}:minutes", f"{base}:hours"
+
+
+def _seen_key(store_id):
+    return f"{KEY_PREFIX}{store_id}:seen"
+
+
+def calendar_intervals(business_hours):
+    """
+    Business hours (7 (start, end) local time slots) as sorted, disjoint minute-of-week
+    intervals within [0, MINUTES_PER_WEEK)
+    """
+    intervals = []
+    for day, (start_local, end_local) in enumerate(business_hours):
+        start = day * MINUTES_PER_DAY + start_local.hour * 60 + start_local.minute
+        end = day * MINUTES_PER_DAY + end_local.hour * 60 + end_local.minute
+        if end <= start:
+            # Overnight shift runs into the next day (Sunday's into Monday)
+            end += MINUTES_PER_DAY
+        if end > MINUTES_PER_WEEK:
+            intervals.append([0, end - MINUTES_PER_WEEK])
+            end = MINUTES_PER_WEEK
+        intervals.append([start, end])
+
+    # An overnight shift can overlap the next day's slot; count those minutes once
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def business_minutes(intervals, local_start, minutes):
+    """Business minutes in [local_start, local_start + minutes), at most a few hours long"""
+    start = local_start.weekday() * MINUTES_PER_DAY + local_start.hour * 60 + local_start.minute
+    end = start + minutes
+    overlap = 0
+    for interval_start, interval_end in intervals:
+        # A range starting late on Sunday continues into next week's Monday
+        for shift in (-MINUTES_PER_WEEK, 0, MINUTES_PER_WEEK):
+            overlap += max(0, min(end, interval_end + shift) - max(start, interval_start + shift))
+    return overlap
+
+
+def load_calendars(client, store_ids):
+    """{store_id: calendar} from Redis, filling and caching misses from the database"""
+    store_ids = [str(store_id) for store_id in store_ids]
+    cached = client.mget([_keys(store_id)[0] for store_id in store_ids])
+    stale_before = time.time() - settings.REALTIME_CALENDAR_TTL
+    calendars = {}
+    missing = []
+    for store_id, raw in zip(store_ids, cached):
+        calendar = json.loads(raw) if raw is not None else None
+        if calendar is None or calendar['loaded_at'] < stale_before:
+            missing.append(store_id)
+        else:
+            calendars[store_id] = calendar
+
+    if missing:
+        metadata = StoreMetadataIndex.load(store_ids=missing)
+        with client.pipeline(transaction=False) as pipe:
+            for store_id in missing:
+                # The index is keyed by the UUIDs the database returns
+                store_uuid = uuid.UUID(store_id)
+                calendar = {
+                    'tz': metadata.timezone(store_uuid).zone,
+                    'intervals': calendar_intervals(metadata.business_hours(store_uuid)),
+                    'loaded_at': time.time(),
+                }
+                calendars[store_id] = calendar
+                pipe.set(_keys(store_id)[0], json.dumps(calendar), ex=RING_TTL)
+            pipe.execute()
+    return calendars
+
+
+def _in_business_hours(calendar, timestamp_utc):
+    local = timestamp_utc.astimezone(get_timezone(calendar['tz']))
+    return business_minutes(calendar['intervals'], local.replace(second=0, microsecond=0), 1) > 0
+
+
+def record_polls(lines):
+    """
+    Update the rolling counters for 'store_id,timestamp_utc,status' lines (bytes or str),
+    skipping polls outside business hours, older than the week window or already counted.
+    Returns the number of polls sent to the counters.
+    """
+    global _bump_script
+    if not settings.REALTIME_COUNTERS_ENABLED or not lines:
+        return 0
+    client = get_redis()
+    if _bump_script is None:
+        _bump_script = client.register_script(BUMP_SCRIPT)
+
+    oldest = datetime.now(timezone.utc) - timedelta(days=7)
+    polls = []
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode()
+        store_id, timestamp_utc, poll_status = line.strip().split(',')
+        timestamp_utc = datetime.fromisoformat(timestamp_utc)
+        if timestamp_utc >= oldest:
+            polls.append((store_id, timestamp_utc, poll_status == 'active'))
+    if not polls:
+        return 0
+
+    calendars = load_calendars(client, {store_id for store_id, _, _ in polls})
+    recorded = 0
+    with client.pipeline(transaction=False) as pipe:
+        for store_id, timestamp_utc, is_active in polls:
+            if not _in_business_hours(calendars[store_id], timestamp_utc):
+                continue
+            epoch_minute = int(timestamp_utc.timestamp()) // 60
+            _, minute_key, hour_key = _keys(store_id)
+            _bump_script(
+                keys=[minute_key, hour_key, _seen_key(store_id)],
+                args=[
+                    epoch_minute, epoch_minute // 60, int(is_active), RING_TTL,
+                    repr(timestamp_utc.timestamp()), int(oldest.timestamp()),
+                ],
+                client=pipe,
+            )
+            recorded += 1
+        pipe.execute()
+    return recorded
+
+
+def _parse_ring(raw):
+    """{period: (active, inactive)} from a ring hash"""
+    slots = {}
+    for field, value in raw.items():
+        slot, kind = field.decode().split(':')
+        slots.setdefault(slot, {})[kind] = int(value)
+    return {
+        slot['t']: (slot.get('a', 0), slot.get('i', 0))
+        for slot in slots.values() if 't' in slot
+    }
+
+
+def window_result(uptime_minutes, possible_minutes):
+    return {
+        "uptime_hours": round(uptime_minutes / 60, 2),
+        "downtime_hours": round((possible_minutes - uptime_minutes) / 60, 2),
+        "uptime_percent": round(uptime_minutes / possible_minutes * 100, 2) if possible_minutes else 0,
+        "total_possible_hours": round(possible_minutes / 60, 2),
+    }
+
+
+def iter_hourly_uptime(intervals, local_tz, hour_counts, start_utc, end_utc):
+    """
+    Yield (hour_utc, segment_start_utc, uptime_minutes, possible_minutes) for each UTC
+    hour overlapping [start_utc, end_utc), from {epoch_hour: (active, inactive)} counts.
+    Like the report's gapfill, an hour without polls carries the last observed active
+    share (0.5 before the first).
+    """
+    share = 0.5
+    hour = floor_bucket(start_utc, timedelta(hours=1))
+    while hour < end_utc:
+        segment_start = max(hour, start_utc)
+        segment_end = min(hour + timedelta(hours=1), end_utc)
+        count_active, count_inactive = hour_counts.get(int(hour.timestamp()) // 3600, (0, 0))
+        if count_active + count_inactive:
+            share = count_active / (count_active + count_inactive)
+        minutes = business_minutes(
+            intervals,
+            segment_start.astimezone(local_tz),
+            int((segment_end - segment_start).total_seconds()) // 60,
+        )
+        yield hour, segment_start, share * minutes, minutes
+        hour += timedelta(hours=1)
+
+
+def _hour_window(calendar, local_tz, hours, start_utc, now_utc):
+    """Uptime and possible minutes over [start_utc, now_utc) from the hour ring"""
+    uptime = possible = 0
+    for _, _, uptime_minutes, possible_minutes in iter_hourly_uptime(
+        calendar['intervals'], local_tz, hours, start_utc, now_utc
+    ):
+        uptime += uptime_minutes
+        possible += possible_minutes
+    return uptime, possible
+
+
+def read_store_uptime(store_id, now_utc=None):
+    """Last hour/day/week uptime from the Redis counters, or None if the store has none"""
+    now_utc = floor_bucket(now_utc or datetime.now(timezone.utc), timedelta(minutes=1))
+    calendar_key, minute_key, hour_key = _keys(store_id)
+    with get_redis().pipeline(transaction=False) as pipe:
+        pipe.get(calendar_key)
+        pipe.hgetall(minute_key)
+        pipe.hgetall(hour_key)
+        raw_calendar, raw_minutes, raw_hours = pipe.execute()
+    if raw_calendar is None:
+        return None
+
+    calendar = json.loads(raw_calendar)
+    local_tz = get_timezone(calendar['tz'])
+    minutes = _parse_ring(raw_minutes)
+    hours = _parse_ring(raw_hours)
+
+    # Last hour: active share of the polls in the minute ring, falling back to the
+    # latest hour that saw polls
+    now_minute = int(now_utc.timestamp()) // 60
+    count_active = count_inactive = 0
+    for minute, (active, inactive) in minutes.items():
+        if now_minute - MINUTE_SLOTS <= minute < now_minute:
+            count_active += active
+            count_inactive += inactive
+    if count_active + count_inactive:
+        share = count_active / (count_active + count_inactive)
+    else:
+        observed = [hour for hour, counts in hours.items() if sum(counts) and hour <= now_minute // 60]
+        active, inactive = hours[max(observed)] if observed else (1, 1)
+        share = active / (active + inactive)
+    hour_minutes = business_minutes(calendar['intervals'], (now_utc - timedelta(hours=1)).astimezone(local_tz), 60)
+
+    return {
+        "store_id": str(store_id),
+        "timestamp_utc": now_utc,
+        "uptime_last_hour": round(share * hour_minutes, 2),
+        "downtime_last_hour": round((1 - share) * hour_minutes, 2),
+        "last_day": window_result(*_hour_window(calendar, local_tz, hours, now_utc - timedelta(days=1), now_utc)),
+        "last_week": window_result(*_hour_window(calendar, local_tz, hours, now_utc - timedelta(days=7), now_utc)),
+    }
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+import redis
+from django.conf import settings
+from django.db import connection as conn
+from django.utils import timezone
+
+from store_monitor.models import StoreReport
+from store_monitor.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+REUSABLE_STATUSES = ("pending", "running", "completed")
+LOCK_PREFIX = 'store_monitor:report_lock:'
+
+# Compare-and-delete, so a job only ever releases its own lock
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Push the expiry of a job's own lock ahead, or take the lock again if it has expired
+REFRESH_LOCK_SCRIPT = """
+local holder = redis.call('get', KEYS[1])
+if holder == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+if not holder then
+    return redis.call('set', KEYS[1], ARGV[1], 'EX', ARGV[2]) and 1 or 0
+end
+return 0
+"""
+
+
+def get_data_watermark(store_id=None):
+    """Timestamp of the newest ingested poll, fleet-wide or for one store"""
+    with conn.cursor() as cursor:
+        if store_id is None:
+            cursor.execute("SELECT MAX(timestamp_utc) FROM store_monitor_storestatus")
+        else:
+            cursor.execute("SELECT MAX(timestamp_utc) FROM store_monitor_storestatus WHERE store_id = %s", [store_id])
+        return cursor.fetchone()[0]
+
+
+def get_ingest_version(end_utc, start_utc=None):
+    """
+    Sum of the ingestion versions of the hours up to end_utc (from the hour holding
+    start_utc, if given). Any ingestion touching those hours changes it, backfills included.
+    """
+    query = "SELECT SUM(version) FROM store_monitor_ingestedhour WHERE hour_utc <= %s"
+    params = [end_utc]
+    if start_utc is not None:
+        query += " AND hour_utc >= date_trunc('hour', %s::timestamptz)"
+        params.append(start_utc)
+    with conn.cursor() as cursor:
+        cursor.execute(query, params)
+        return cursor.fetchone()[0]
+
+
+def report_cache_key(now_utc, watermark, options=None, ingest_version=None):
+    """
+    Key identifying a report's inputs: the normalised report time, the data watermark
+    (capped at the report time, since later polls cannot change the result), the
+    ingestion version of the hours up to the report time (so backfilled polls older than
+    the watermark change the key too) and any options that change the output.
+    """
+    if watermark is not None:
+        watermark = min(watermark, now_utc)
+    payload = json.dumps({
+        'now_utc': now_utc.replace(microsecond=0).isoformat(),
+        'watermark': watermark.isoformat() if watermark else None,
+        'ingest_version': ingest_version,
+        'options': options or {},
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def stale_before():
+    """In-flight reports whose last heartbeat is older than this are presumed dead"""
+    return timezone.now() - timedelta(seconds=settings.REPORT_LOCK_TTL)
+
+
+def is_stale(report):
+    return (report.heartbeat_at or report.timestamp_utc) < stale_before()
+
+
+def find_reusable_report(cache_key):
+    """
+    A completed or live in-flight report with the same inputs, if any. An in-flight report
+    counts as live while it holds the single-flight lock or has sent a heartbeat within
+    REPORT_LOCK_TTL; one whose worker died is skipped, so the next request starts a new run.
+    """
+    candidates = (
+        StoreReport.objects
+        .filter(cache_key=cache_key, status__in=REUSABLE_STATUSES)
+        .order_by('-timestamp_utc')
+    )
+    holder = None
+    for report in candidates:
+        if report.status == "completed":
+            return report
+        if holder is None:
+            holder = get_redis().get(LOCK_PREFIX + cache_key) or b''
+        if holder.decode() == str(report.id):
+            return report
+        if not is_stale(report):
+            return report
+    return None
+
+
+def holds_report_lock(report):
+    holder = get_redis().get(LOCK_PREFIX + report.cache_key) if report.cache_key else None
+    return holder is not None and holder.decode() == str(report.id)
+
+
+def acquire_report_lock(cache_key, report_id):
+    """
+    Single-flight lock: returns None when this caller won and should enqueue report_id,
+    otherwise the id of the report already being generated for cache_key.
+    """
+    client = get_redis()
+    lock_key = LOCK_PREFIX + cache_key
+    if client.set(lock_key, report_id, nx=True, ex=settings.REPORT_LOCK_TTL):
+        return None
+    holder = client.get(lock_key)
+    return holder.decode() if holder else None
+
+
+def release_report_lock(report):
+    """Best effort: a lock that cannot be released expires after REPORT_LOCK_TTL"""
+    if not report.cache_key:
+        return
+    try:
+        get_redis().eval(RELEASE_LOCK_SCRIPT, 1, LOCK_PREFIX + report.cache_key, str(report.id))
+    except redis.RedisError:
+        logger.warning("Could not release the lock of report %s", report.id, exc_info=True)
+
+
+def refresh_report_lock(report_id, cache_key):
+    """Best effort: keep an in-flight report's lock for another REPORT_LOCK_TTL"""
+    if not cache_key:
+        return
+    try:
+        get_redis().eval(REFRESH_LOCK_SCRIPT, 1, LOCK_PREFIX + cache_key, str(report_id), settings.REPORT_LOCK_TTL)
+    except redis.RedisError:
+        logger.warning("Could not refresh the lock of report %s", report_id, exc_info=True)
+
+
+def report_heartbeat(report):
+    """Record that an in-flight report is alive (e.g. while it waits for a slot)"""
+    StoreReport.objects.filter(id=report.id).update(heartbeat_at=timezone.now())
+    refresh_report_lock(report.id, report.cache_key)
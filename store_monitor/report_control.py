@@ -0,0 +1,108 @@
+"""
+Scheduling and cancellation for report jobs.
+
+Every report has a priority class that picks its Celery queue and message priority:
+interactive requests (high, normal) go to the `reports` queue and backfills (bulk) to
+`reports_bulk`, so with separate workers per queue an interactive report never waits
+behind a backfill. Each queue also has a cap on concurrently running reports, kept as
+a Redis semaphore (a sorted set of report ids scored by expiry, so a crashed worker's
+slot frees itself). Progress saves push a running report's expiry ahead.
+
+Cancellation is cooperative: DELETE /api/report/<id> marks a running report as
+`cancelling`, and the worker stops at its next progress save, between store batches.
+"""
+import logging
+import time
+
+import redis
+from django.conf import settings
+
+from store_monitor.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# priority class -> (Celery queue, Celery message priority; 0 is served first on Redis)
+PRIORITIES = {
+    'high': ('reports', 0),
+    'normal': ('reports', 3),
+    'bulk': ('reports_bulk', 9),
+}
+
+SLOTS_PREFIX = 'store_monitor:report_slots:'
+
+# `cancelling`: cancel requested, the worker has not stopped yet
+CANCELLED_STATUSES = ('cancelling', 'cancelled')
+
+# Drop expired holders, then take a slot if one is free and the report has none yet
+ACQUIRE_SLOT_SCRIPT = """
+redis.call('zremrangebyscore', KEYS[1], '-inf', ARGV[1])
+if redis.call('zscore', KEYS[1], ARGV[3]) then
+    redis.call('zadd', KEYS[1], ARGV[2], ARGV[3])
+    return 1
+end
+if redis.call('zcard', KEYS[1]) < tonumber(ARGV[4]) then
+    redis.call('zadd', KEYS[1], ARGV[2], ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+class ReportCancelled(Exception):
+    """Raised inside a report run once the report has been marked `cancelling`"""
+
+
+def report_queue(priority):
+    return PRIORITIES[priority][0]
+
+
+def report_routing(priority):
+    """apply_async options for a report of the given priority class"""
+    queue, message_priority = PRIORITIES[priority]
+    return {'queue': queue, 'priority': message_priority}
+
+
+def _slot_limit(queue):
+    return settings.REPORT_MAX_CONCURRENT_BULK if queue == 'reports_bulk' else settings.REPORT_MAX_CONCURRENT
+
+
+def acquire_report_slot(report):
+    """Take one of the report's queue slots; True when free or when the queue is uncapped"""
+    queue = report_queue(report.priority)
+    limit = _slot_limit(queue)
+    if not limit:
+        return True
+    now = time.time()
+    acquired = get_redis().eval(
+        ACQUIRE_SLOT_SCRIPT, 1, SLOTS_PREFIX + queue,
+        now, now + settings.REPORT_SLOT_TTL, str(report.id), limit,
+    )
+    return bool(acquired)
+
+
+def holds_report_slot(report):
+    """Whether the report holds an unexpired slot of its queue"""
+    expiry = get_redis().zscore(SLOTS_PREFIX + report_queue(report.priority), str(report.id))
+    return expiry is not None and expiry > time.time()
+
+
+def refresh_report_slot(report_id, priority):
+    """
+    Push the expiry of a running report's slot REPORT_SLOT_TTL ahead (called on progress
+    saves), so a long report keeps it. Best effort; a slot that already expired is not retaken.
+    """
+    queue = report_queue(priority)
+    if not _slot_limit(queue):
+        return
+    try:
+        get_redis().zadd(SLOTS_PREFIX + queue, {str(report_id): time.time() + settings.REPORT_SLOT_TTL}, xx=True)
+    except redis.RedisError:
+        logger.warning("Could not refresh the slot of report %s", report_id, exc_info=True)
+
+
+def release_report_slot(report):
+    """Best effort: a slot that cannot be released expires after REPORT_SLOT_TTL"""
+    try:
+        get_redis().zrem(SLOTS_PREFIX + report_queue(report.priority), str(report.id))
+    except redis.RedisError:
+        logger.warning("Could not release the slot of report %s", report.id, exc_info=True)
@@ -0,0 +1,417 @@
+from collections import defaultdict
+from datetime import timedelta, time
+
+from django.conf import settings
+from django.db import connection as conn
+from django.db.models import Q
+
+from store_monitor.models import Store
+from store_monitor.rollup import HOUR
+from store_monitor.utils import (
+    BUCKET_SIZE,
+    DEFAULT_TIMEZONE,
+    UPTIME_WINDOWS,
+    StoreMetadataIndex,
+    activity_prior_slots,
+    calculate_uptime_windows,
+    floor_bucket,
+    gapfill_buckets,
+    load_activity_priors,
+    prior_probability,
+    summarise_buckets,
+)
+
+BUCKET_COUNTS_QUERY = """
+    SELECT
+        store_id,
+        time_bucket('2 hours', timestamp_utc) AS two_hour_bucket,
+        COUNT(*) FILTER (WHERE status = 'active') AS count_active,
+        COUNT(*) FILTER (WHERE status = 'inactive') AS count_inactive
+    FROM store_monitor_storestatus
+    WHERE timestamp_utc BETWEEN %s AND %s{store_filter}
+    GROUP BY store_id, two_hour_bucket
+    ORDER BY store_id, two_hour_bucket;
+"""
+
+# Interior whole hours come from the hourly rollup; the partial hours at either edge of
+# the window are counted from raw polls so the result matches BUCKET_COUNTS_QUERY exactly.
+ROLLUP_BUCKET_COUNTS_QUERY = """
+    SELECT
+        store_id,
+        time_bucket('2 hours', ts) AS two_hour_bucket,
+        SUM(count_active)::int AS count_active,
+        SUM(count_inactive)::int AS count_inactive
+    FROM (
+        SELECT store_id, hour_utc AS ts, count_active, count_inactive
+        FROM store_monitor_storestatushourly
+        WHERE hour_utc >= %s AND hour_utc < %s{store_filter}
+        UNION ALL
+        SELECT
+            store_id,
+            timestamp_utc,
+            (status = 'active')::int,
+            (status = 'inactive')::int
+        FROM store_monitor_storestatus
+        WHERE ((timestamp_utc >= %s AND timestamp_utc < %s) OR (timestamp_utc >= %s AND timestamp_utc <= %s)){store_filter}
+    ) AS counts
+    GROUP BY store_id, two_hour_bucket
+    ORDER BY store_id, two_hour_bucket;
+"""
+
+HOUR_COUNTS_QUERY = """
+    SELECT
+        store_id,
+        COUNT(*) FILTER (WHERE status = 'active') AS count_active,
+        COUNT(*) FILTER (WHERE status = 'inactive') AS count_inactive
+    FROM store_monitor_storestatus
+    WHERE timestamp_utc BETWEEN %s AND %s{store_filter}
+    GROUP BY store_id;
+"""
+
+HISTORICAL_AVG_QUERY = """
+    SELECT r.store_id, r.part, AVG(CASE WHEN s.status = 'active' THEN 1 ELSE 0 END)
+    FROM unnest(%s::uuid[], %s::int[], %s::time[], %s::time[]) AS r(store_id, part, start_time, end_time)
+    JOIN store_monitor_storestatus s ON s.store_id = r.store_id
+    WHERE EXTRACT(DOW FROM s.timestamp_utc AT TIME ZONE 'UTC') = %s
+      AND (s.timestamp_utc AT TIME ZONE 'UTC')::time BETWEEN r.start_time AND r.end_time
+      AND s.timestamp_utc < %s
+    GROUP BY r.store_id, r.part;
+"""
+
+
+# Windows a report can cover, in output order
+REPORT_WINDOWS = ('hour', 'day', 'week')
+
+
+class StoreScope:
+    """
+    What a report run covers: a keyset range over Store.id, optionally narrowed to
+    explicit store ids and/or timezones (stores without a timezone row count as
+    DEFAULT_TIMEZONE), and the windows to compute.
+    Serialisable with as_dict()/from_dict() so it can travel inside Celery task args.
+    """
+
+    def __init__(self, id_gte=None, id_lt=None, store_ids=None, timezones=None, windows=None):
+        self.id_gte = str(id_gte) if id_gte else None
+        self.id_lt = str(id_lt) if id_lt else None
+        self.store_ids = sorted(str(store_id) for store_id in store_ids) if store_ids else None
+        self.timezones = sorted(timezones) if timezones else None
+        self.windows = [window for window in REPORT_WINDOWS if window in windows] if windows else list(REPORT_WINDOWS)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**(data or {}))
+
+    def as_dict(self):
+        return {
+            'id_gte': self.id_gte,
+            'id_lt': self.id_lt,
+            'store_ids': self.store_ids,
+            'timezones': self.timezones,
+            'windows': self.windows,
+        }
+
+    def with_range(self, id_gte, id_lt):
+        """The same filters and windows over another keyset range"""
+        return StoreScope(id_gte, id_lt, self.store_ids, self.timezones, self.windows)
+
+    def wants(self, window):
+        return window in self.windows
+
+    @property
+    def is_full_fleet(self):
+        return not (self.id_gte or self.id_lt or self.store_ids or self.timezones)
+
+    def _timezone_stores(self):
+        in_zones = Q(timezone__timezone_str__in=self.timezones)
+        if DEFAULT_TIMEZONE in self.timezones:
+            in_zones |= Q(timezone__isnull=True)
+        return Store.objects.filter(in_zones).values('id')
+
+    def filter_stores(self, queryset, field='id'):
+        if self.id_gte:
+            queryset = queryset.filter(**{f'{field}__gte': self.id_gte})
+        if self.id_lt:
+            queryset = queryset.filter(**{f'{field}__lt': self.id_lt})
+        if self.store_ids:
+            queryset = queryset.filter(**{f'{field}__in': self.store_ids})
+        if self.timezones:
+            queryset = queryset.filter(**{f'{field}__in': self._timezone_stores()})
+        return queryset
+
+    def sql(self, column='store_id'):
+        """Return an ' AND ...' fragment and its params restricting column to this scope"""
+        fragment = ''
+        params = []
+        if self.id_gte:
+            fragment += f' AND {column} >= %s::uuid'
+            params.append(self.id_gte)
+        if self.id_lt:
+            fragment += f' AND {column} < %s::uuid'
+            params.append(self.id_lt)
+        if self.store_ids:
+            fragment += f' AND {column} = ANY(%s::uuid[])'
+            params.append(self.store_ids)
+        if self.timezones:
+            fragment += (
+                f' AND {column} IN ('
+                'SELECT st.id FROM store_monitor_store st'
+                ' LEFT JOIN store_monitor_storetimezone stz ON stz.store_id = st.id'
+                ' WHERE COALESCE(stz.timezone_str, %s) = ANY(%s))'
+            )
+            params.extend([DEFAULT_TIMEZONE, self.timezones])
+        return fragment, params
+
+
+def iter_keyset_ranges(scope, page_size):
+    """Yield consecutive StoreScopes of page_size stores each, covering scope in Store.id order"""
+    stores = scope.filter_stores(Store.objects.order_by('id').values_list('id', flat=True))
+    lower = scope.id_gte
+    while True:
+        page = stores.filter(id__gte=lower) if lower else stores
+        upper = page[page_size:page_size + 1].first()
+        yield scope.with_range(lower, upper or scope.id_lt)
+        if upper is None:
+            return
+        lower = upper
+
+
+def plan_store_shards(shard_size, max_shards=0, scope=None):
+    """
+    Split the scope (default: the fleet) into keyset ranges of roughly shard_size stores.
+    When max_shards is set the shard size grows so no more than max_shards ranges are produced.
+    """
+    scope = scope or StoreScope()
+    if max_shards:
+        shard_size = max(shard_size, -(-scope.filter_stores(Store.objects).count() // max_shards))
+    return list(iter_keyset_ranges(scope, shard_size))
+
+
+def iter_per_store_metrics(now_utc, scope):
+    """Original engine: one calculate_uptime_windows scan per store"""
+    metadata = StoreMetadataIndex.load(scope)
+    windows = {name: length for name, length in UPTIME_WINDOWS.items() if scope.wants(name)}
+    stores = scope.filter_stores(Store.objects.order_by('id'))
+    for store in stores.iterator(chunk_size=settings.REPORT_STREAM_PAGE_SIZE or 2000):
+        local_tz = metadata.timezone(store.id)
+        uptime = calculate_uptime_windows(
+            store.id, now_utc, local_tz, metadata, windows, include_hour=scope.wants('hour'),
+        )
+        yield store.id, uptime['hour'], uptime.get('day'), uptime.get('week')
+
+
+def _fetch_bucket_counts(start_utc, end_utc, scope, source='raw'):
+    """{store_id: {bucket: (count_active, count_inactive)}}, streamed through a server-side cursor"""
+    counts = defaultdict(dict)
+    for store_id, bucket, count_active, count_inactive in _iter_bucket_count_rows(start_utc, end_utc, scope, source):
+        counts[store_id][bucket] = (count_active, count_inactive)
+    return counts
+
+
+def _iter_bucket_count_rows(start_utc, end_utc, scope, source='raw'):
+    """(store_id, bucket, count_active, count_inactive) rows from a server-side cursor"""
+    store_filter, params = scope.sql()
+    cursor = conn.chunked_cursor()
+    if source == 'rollup':
+        inner_start = floor_bucket(start_utc - timedelta(microseconds=1), HOUR) + HOUR
+        inner_end = max(floor_bucket(end_utc, HOUR), inner_start)
+        cursor.execute(ROLLUP_BUCKET_COUNTS_QUERY.format(store_filter=store_filter), [
+            inner_start, inner_end, *params,
+            start_utc, inner_start, inner_end, end_utc, *params,
+        ])
+    else:
+        cursor.execute(BUCKET_COUNTS_QUERY.format(store_filter=store_filter), [start_utc, end_utc, *params])
+    with cursor:
+        yield from cursor
+
+
+def _fetch_historical_averages(cursor, now_utc, missing):
+    """
+    Bulk version of historical_avg_status for every store without polls in the
+    last hour. missing maps store_id -> list of (start_time, end_time) ranges.
+    """
+    store_ids, parts, starts, ends = [], [], [], []
+    for store_id, ranges in missing.items():
+        for part, (start_range, end_range) in enumerate(ranges):
+            store_ids.append(str(store_id))
+            parts.append(part)
+            starts.append(start_range)
+            ends.append(end_range)
+
+    averages = defaultdict(dict)
+    if not store_ids:
+        return averages
+
+    target_dow = (now_utc.weekday() + 1) % 7
+    cursor.execute(HISTORICAL_AVG_QUERY, [store_ids, parts, starts, ends, target_dow, now_utc])
+    for store_id, part, avg in cursor.fetchall():
+        averages[store_id][part] = avg
+    return averages
+
+
+def _last_hour_probabilities(cursor, now_utc, store_ids, metadata, scope):
+    """
+    Map store_id -> (active share, inactive share) over the last hour, falling back
+    to the activity priors (or the historical average) for stores without polls, in
+    two queries for all stores.
+    """
+    hour_start_utc = now_utc - timedelta(hours=1)
+    store_filter, params = scope.sql()
+    cursor.execute(HOUR_COUNTS_QUERY.format(store_filter=store_filter), [hour_start_utc, now_utc, *params])
+    hour_counts = {store_id: (a, i) for store_id, a, i in cursor.fetchall()}
+
+    missing = {}
+    for store_id in store_ids:
+        if store_id in hour_counts:
+            continue
+        start_time_local = hour_start_utc.astimezone(metadata.timezone(store_id))
+        if settings.REPORT_USE_ACTIVITY_PRIORS:
+            missing[store_id] = activity_prior_slots(start_time_local)
+            continue
+        start_range = (start_time_local - timedelta(hours=1)).time()
+        end_range = (start_time_local + timedelta(hours=1)).time()
+        if start_range < end_range:
+            missing[store_id] = [(start_range, end_range)]
+        else:
+            missing[store_id] = [(start_range, time(23, 59, 59)), (time(0, 0, 0), end_range)]
+
+    if settings.REPORT_USE_ACTIVITY_PRIORS:
+        priors = load_activity_priors(list(missing), cursor)
+    else:
+        historical = _fetch_historical_averages(cursor, now_utc, missing)
+
+    probabilities = {}
+    for store_id in store_ids:
+        if store_id in hour_counts:
+            count_active, count_inactive = hour_counts[store_id]
+            total = count_active + count_inactive
+            probabilities[store_id] = (
+                count_active / total if total else 0,
+                count_inactive / total if total else 0,
+            )
+        elif settings.REPORT_USE_ACTIVITY_PRIORS:
+            prob = prior_probability(priors.get(store_id, {}), missing[store_id])
+            probabilities[store_id] = (prob, 1 - prob)
+        else:
+            averages = historical.get(store_id, {})
+            probs = [
+                float(averages[part]) if averages.get(part) is not None else 0.5
+                for part in range(len(missing[store_id]))
+            ]
+            prob = sum(probs) / len(probs)
+            probabilities[store_id] = (prob, 1 - prob)
+    return probabilities
+
+
+def iter_bulk_metrics(now_utc, scope):
+    """
+    Set-based engine: loads metadata and poll counts for every store with a fixed
+    number of grouped queries, then computes the same metrics as the per-store engine.
+    Day/week counts are read from the hourly rollup when REPORT_BUCKET_SOURCE is 'rollup'.
+    """
+    source = settings.REPORT_BUCKET_SOURCE
+    day_start_utc = now_utc - timedelta(days=1)
+    week_start_utc = now_utc - timedelta(days=7)
+
+    store_ids = list(scope.filter_stores(Store.objects.order_by('id')).values_list('id', flat=True))
+    metadata = StoreMetadataIndex.load(scope)
+
+    probabilities = day_counts = week_counts = None
+    if scope.wants('hour'):
+        with conn.cursor() as cursor:
+            probabilities = _last_hour_probabilities(cursor, now_utc, store_ids, metadata, scope)
+    if scope.wants('day'):
+        day_counts = _fetch_bucket_counts(day_start_utc, now_utc, scope, source)
+    if scope.wants('week'):
+        week_counts = _fetch_bucket_counts(week_start_utc, now_utc, scope, source)
+
+    return _iter_bucket_metrics(now_utc, store_ids, metadata, probabilities, day_counts, week_counts)
+
+
+def _iter_bucket_metrics(now_utc, store_ids, metadata, probabilities, day_counts, week_counts):
+    """
+    Per-store metrics from last-hour shares and {store_id: {bucket: counts}} maps.
+    A window whose input is None was not requested and comes out as None.
+    """
+    hour_start_utc = now_utc - timedelta(hours=1)
+    day_start_utc = now_utc - timedelta(days=1)
+    week_start_utc = now_utc - timedelta(days=7)
+
+    # Calendars cover every whole bucket of the widest window computed
+    if week_counts is not None:
+        calendar_start = floor_bucket(week_start_utc)
+    elif day_counts is not None:
+        calendar_start = floor_bucket(day_start_utc)
+    else:
+        calendar_start = floor_bucket(hour_start_utc)
+    calendar_end = floor_bucket(now_utc) + BUCKET_SIZE
+
+    for store_id in store_ids:
+        calendar = metadata.calendar(store_id, calendar_start, calendar_end)
+
+        uptime_last_hour = uptime_last_day = uptime_last_week = None
+        if probabilities is not None:
+            total_possible_uptime = calendar.overlap_minutes(hour_start_utc, now_utc)
+            prob, not_prob = probabilities[store_id]
+            uptime_last_hour = {
+                "uptime_last_hour": prob * total_possible_uptime,
+                "downtime_last_hour": not_prob * total_possible_uptime,
+            }
+        if day_counts is not None:
+            day_rows = gapfill_buckets(day_counts.get(store_id, {}), day_start_utc, now_utc)
+            uptime_last_day = summarise_buckets(day_rows, calendar)
+        if week_counts is not None:
+            week_rows = gapfill_buckets(week_counts.get(store_id, {}), week_start_utc, now_utc)
+            uptime_last_week = summarise_buckets(week_rows, calendar)
+        yield store_id, uptime_last_hour, uptime_last_day, uptime_last_week
+
+
+def iter_vectorized_metrics(now_utc, scope):
+    # numpy is an optional dependency, only imported when this engine is selected
+    from store_monitor.vectorized import compute_vectorized_metrics
+    return compute_vectorized_metrics(now_utc, scope)
+
+
+def iter_incremental_metrics(now_utc, scope):
+    from store_monitor.incremental import compute_incremental_metrics
+    return compute_incremental_metrics(now_utc, scope)
+
+
+def iter_interval_metrics(now_utc, scope):
+    from store_monitor.state_intervals import compute_interval_metrics
+    return compute_interval_metrics(now_utc, scope)
+
+
+ENGINES = {
+    'per_store': iter_per_store_metrics,
+    'bulk': iter_bulk_metrics,
+    'vectorized': iter_vectorized_metrics,
+    'incremental': iter_incremental_metrics,
+    'intervals': iter_interval_metrics,
+}
+
+# Engines that must see the whole scope in one call (no keyset paging or sharding)
+UNPAGED_ENGINES = {'per_store', 'incremental'}
+
+
+def iter_report_metrics(now_utc, engine, scope=None):
+    """
+    Yield (store_id, last_hour, last_day, last_week) metrics using the named engine;
+    windows the scope does not want are None.
+
+    With REPORT_STREAM_PAGE_SIZE set, the set-based engines run one keyset page of
+    stores at a time, so memory stays flat however many stores the scope covers.
+    """
+    try:
+        engine_fn = ENGINES[engine]
+    except KeyError:
+        raise ValueError(f"Unknown report engine: {engine}")
+    scope = scope or StoreScope()
+    page_size = settings.REPORT_STREAM_PAGE_SIZE
+    if not page_size or engine in UNPAGED_ENGINES:
+        return engine_fn(now_utc, scope)
+    return (
+        metrics
+        for page in iter_keyset_ranges(scope, page_size)
+        for metrics in engine_fn(now_utc, page)
+    )
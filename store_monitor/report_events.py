@@ -0,0 +1,121 @@
+"""
+Report progress and completion events over Redis pub/sub.
+
+The report tasks publish small JSON events on store_monitor:report:<id>. Each ASGI
+process keeps one pattern subscription (ReportEventHub) and fans messages out to the
+asyncio queues of the clients waiting on that report, so a waiting client costs one
+idle coroutine instead of a Redis connection or repeated DB reads.
+"""
+import asyncio
+import json
+import logging
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+from store_monitor.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'store_monitor:report:'
+
+TERMINAL_EVENTS = ('completed', 'failed', 'cancelled')
+
+# Seconds a listener waits for the subscription to come up, and how often waiting
+# clients re-read the report row while it is down
+SUBSCRIBE_TIMEOUT = 2
+POLL_INTERVAL = 2
+
+
+def report_channel(report_id):
+    return f'{CHANNEL_PREFIX}{report_id}'
+
+
+def publish_report_event(report_id, event, **data):
+    """Best effort: a Redis hiccup must not fail the report itself"""
+    try:
+        get_redis().publish(report_channel(report_id), json.dumps({'event': event, **data}, default=str))
+    except redis.RedisError:
+        logger.warning("Could not publish %s event for report %s", event, report_id, exc_info=True)
+
+
+def report_event_name(status):
+    """Event matching a StoreReport.status ('failed: ...' -> 'failed')"""
+    return status.split(':', 1)[0]
+
+
+class ReportEventHub:
+    """One pattern subscription per event loop, dispatching to per-report listener queues"""
+
+    def __init__(self):
+        self._loop = None
+        self._task = None
+        self._ready = None
+        self._listeners = {}
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Queues belong to their loop; ones left from a closed loop are useless
+            self._listeners = {}
+        if self._loop is not loop or self._task.done():
+            self._loop = loop
+            self._ready = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            client = aioredis.Redis.from_url(settings.REDIS_URL)
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe(f'{CHANNEL_PREFIX}*')
+                self._ready.set()
+                async for message in pubsub.listen():
+                    if message['type'] != 'pmessage':
+                        continue
+                    report_id = message['channel'].decode()[len(CHANNEL_PREFIX):]
+                    event = json.loads(message['data'])
+                    for queue in self._listeners.get(report_id, ()):
+                        queue.put_nowait(event)
+            except redis.RedisError:
+                logger.warning("Report event subscription lost, reconnecting", exc_info=True)
+                self._ready.clear()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+                await client.aclose()
+
+    @property
+    def live(self):
+        return self._ready is not None and self._ready.is_set()
+
+    async def listen(self, report_id):
+        """
+        Register a queue for report_id's events and wait (up to SUBSCRIBE_TIMEOUT) until
+        the subscription is live, so the caller can read the current state afterwards
+        without missing an event. If Redis is unreachable the queue is returned anyway;
+        callers re-read the report every POLL_INTERVAL while the hub is not live.
+        """
+        self._ensure_running()
+        queue = asyncio.Queue()
+        self._listeners.setdefault(str(report_id), set()).add(queue)
+        try:
+            await asyncio.wait_for(self._ready.wait(), SUBSCRIBE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Report event subscription not live; report %s falls back to polling", report_id)
+        return queue
+
+    def poll_timeout(self, limit):
+        """How long to wait for an event before re-reading the report, at most limit"""
+        return limit if self.live else min(limit, POLL_INTERVAL)
+
+    def unlisten(self, report_id, queue):
+        listeners = self._listeners.get(str(report_id))
+        if listeners is not None:
+            listeners.discard(queue)
+            if not listeners:
+                del self._listeners[str(report_id)]
+
+
+hub = ReportEventHub()
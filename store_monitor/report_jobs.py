@@ -0,0 +1,197 @@
+import uuid
+
+import pytz
+from django.conf import settings
+from django.utils import timezone
+
+from store_monitor.models import StoreReport
+from store_monitor.report_cache import (
+    acquire_report_lock,
+    find_reusable_report,
+    get_data_watermark,
+    get_ingest_version,
+    holds_report_lock,
+    is_stale,
+    release_report_lock,
+    report_cache_key,
+)
+from store_monitor.report_control import holds_report_slot, report_routing
+from store_monitor.report_engine import REPORT_WINDOWS, StoreScope
+from store_monitor.report_events import publish_report_event
+from store_monitor.report_writer import REPORT_COLUMNS, report_columns
+from store_monitor.rollup import refresh_hourly_rollup
+from store_monitor.tasks import generate_store_report_task
+
+
+def _as_list(value):
+    """A list option given as a JSON list or a comma-separated string"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    return [str(item).strip() for item in value if str(item).strip()] or None
+
+
+def parse_report_options(data):
+    """
+    (StoreScope, columns) from trigger_report's optional store_ids, timezones, windows and
+    columns fields. Without windows, the windows of the requested columns are computed.
+    Raises ValueError for an invalid value.
+    """
+    store_ids = _as_list(data.get('store_ids'))
+    timezones = _as_list(data.get('timezones'))
+    windows = _as_list(data.get('windows'))
+    columns = _as_list(data.get('columns'))
+
+    if store_ids:
+        try:
+            store_ids = [str(uuid.UUID(store_id)) for store_id in store_ids]
+        except ValueError:
+            raise ValueError("store_ids must be store UUIDs")
+    for name in timezones or ():
+        if name not in pytz.all_timezones_set:
+            raise ValueError(f"Unknown timezone: {name}")
+    if windows and not set(windows) <= set(REPORT_WINDOWS):
+        raise ValueError(f"windows must be among {', '.join(REPORT_WINDOWS)}")
+    if columns and not windows:
+        windows = [REPORT_COLUMNS[name][1] for name in columns if name in REPORT_COLUMNS] or None
+
+    scope = StoreScope(store_ids=store_ids, timezones=timezones, windows=windows)
+    if columns:
+        columns = report_columns(scope.windows, columns)
+    return scope, columns
+
+
+def find_prewarmed_report(now_utc, report_format):
+    """The newest completed pre-warmed report within REPORT_PREWARM_TOLERANCE of now_utc, if any"""
+    tolerance = settings.REPORT_PREWARM_TOLERANCE
+    if not tolerance:
+        return None
+    return (
+        StoreReport.objects
+        .filter(
+            prewarmed=True,
+            status="completed",
+            requested_at__range=(now_utc - tolerance, now_utc + tolerance),
+            report_file__endswith=f".{report_format}",
+        )
+        .order_by('-requested_at')
+        .first()
+    )
+
+
+def request_report(now_utc, report_format=None, priority='normal', prewarmed=False, scope=None, columns=None):
+    """
+    Return (report_id, status, created) for a report at now_utc over scope (default: every
+    store and window) with the given columns. A pre-warmed report close enough to now_utc
+    is returned as is for a whole-fleet request; otherwise identical requests reuse the
+    completed report or attach to the one in flight instead of starting a new run.
+    A new report is queued according to its priority class (see report_control).
+    """
+    report_format = report_format or settings.REPORT_FORMAT
+    scope = scope or StoreScope()
+    columns = report_columns(scope.windows, columns)
+    is_default = scope.is_full_fleet and columns == list(REPORT_COLUMNS)
+    if not prewarmed and is_default:
+        latest = find_prewarmed_report(now_utc, report_format)
+        if latest:
+            return str(latest.id), latest.status, False
+
+    options = {'format': report_format}
+    if not is_default:
+        # Default reports keep their key, so earlier ones stay reusable
+        options.update(
+            store_ids=scope.store_ids, timezones=scope.timezones, windows=scope.windows, columns=columns,
+        )
+    watermark = get_data_watermark()
+    cache_key = report_cache_key(now_utc, watermark, options, get_ingest_version(now_utc))
+
+    existing = find_reusable_report(cache_key)
+    if existing:
+        return str(existing.id), existing.status, False
+
+    report_id = str(uuid.uuid4())
+    holder = acquire_report_lock(cache_key, report_id)
+    if holder:
+        # Another request won the race; its row may not be committed yet
+        holder_report = StoreReport.objects.filter(id=holder).first()
+        return holder, holder_report.status if holder_report else "pending", False
+
+    StoreReport.objects.create(
+        id=report_id,
+        status="pending",
+        requested_at=now_utc,
+        data_watermark=watermark,
+        cache_key=cache_key,
+        priority=priority,
+        prewarmed=prewarmed,
+        heartbeat_at=timezone.now(),
+    )
+    # Async background task, on the queue and with the message priority of its class
+    generate_store_report_task.apply_async(
+        kwargs={
+            'report_id': report_id,
+            'now_utc': now_utc,
+            'report_format': report_format,
+            'scope': scope.as_dict(),
+            'columns': columns,
+        },
+        **report_routing(priority),
+    )
+    return report_id, "pending", True
+
+
+def cancel_report(report_id):
+    """
+    Cancel a report. A queued one is cancelled at once; a running one becomes `cancelling`
+    until its worker stops at the next progress save. Returns the report's resulting
+    status, or None if there is no such report.
+    """
+    report = StoreReport.objects.filter(id=report_id).first()
+    if report is None:
+        return None
+    if StoreReport.objects.filter(id=report_id, status="pending").update(status="cancelled"):
+        report.status = "cancelled"
+        publish_report_event(report_id, "cancelled", status=report.status)
+    elif StoreReport.objects.filter(id=report_id, status="running").update(status="cancelling"):
+        report.status = "cancelling"
+    else:
+        return report.status
+    # Identical requests from now on start a new report instead of attaching to this one
+    release_report_lock(report)
+    return report.status
+
+
+def prewarm_latest_report():
+    """
+    Beat pipeline behind the rolling "latest" report: bring the hourly rollup and activity
+    priors up to date, then queue a report at the current time (unless the previous one is
+    still in flight) and drop pre-warmed reports older than REPORT_PREWARM_RETENTION.
+    Returns the queued report's id, or None.
+    """
+    refresh_hourly_rollup()
+    purge_prewarmed_reports()
+    in_flight = StoreReport.objects.filter(prewarmed=True, status__in=("pending", "running"))
+    for report in in_flight:
+        # One whose worker died would otherwise block pre-warming for good. It is dead only
+        # once its heartbeat, its lock and its slot have all expired.
+        if is_stale(report) and not holds_report_lock(report) and not holds_report_slot(report):
+            StoreReport.objects.filter(
+                id=report.id, status=report.status, heartbeat_at=report.heartbeat_at,
+            ).update(status="failed: stale pre-warm run")
+    if in_flight.exists():
+        return None
+    report_id, _, _ = request_report(timezone.now().replace(microsecond=0), prewarmed=True)
+    return report_id
+
+
+def purge_prewarmed_reports():
+    """Delete pre-warmed reports (and their files) past REPORT_PREWARM_RETENTION"""
+    cutoff = timezone.now() - settings.REPORT_PREWARM_RETENTION
+    expired = StoreReport.objects.filter(prewarmed=True, requested_at__lt=cutoff).exclude(
+        status__in=("pending", "running", "cancelling"),
+    )
+    for report in expired:
+        if report.report_file:
+            report.report_file.delete(save=False)
+    return expired.delete()[0]
@@ -0,0 +1,130 @@
+import csv
+import gzip
+import importlib.util
+import os
+import shutil
+from contextlib import contextmanager
+
+from django.conf import settings
+
+WRITE_BUFFER_BYTES = 1024 * 1024
+WRITE_CHUNK_ROWS = 1000
+
+# Values of trigger_report's `format` option; each is also the report file's extension
+REPORT_FORMATS = ('csv', 'csv.gz', 'parquet')
+
+# Formats whose writer needs an optional package (requirements-optional.txt)
+FORMAT_PACKAGES = {'parquet': 'pyarrow'}
+
+# Report columns in output order: name -> (CSV header, window, key in that window's metrics)
+REPORT_COLUMNS = {
+    'store_id': ('store_id', None, None),
+    'uptime_last_hour': ('uptime_last_hour(in minutes)', 'hour', 'uptime_last_hour'),
+    'uptime_last_day': ('uptime_last_day(in hours)', 'day', 'uptime_hours'),
+    'uptime_last_week': ('uptime_last_week(in hours)', 'week', 'uptime_hours'),
+    'downtime_last_hour': ('downtime_last_hour(in minutes)', 'hour', 'downtime_last_hour'),
+    'downtime_last_day': ('downtime_last_day(in hours)', 'day', 'downtime_hours'),
+    'downtime_last_week': ('downtime_last_week(in hours)', 'week', 'downtime_hours'),
+}
+
+
+def report_columns(windows, columns=None):
+    """
+    Validated output columns (in REPORT_COLUMNS order) for a run covering windows:
+    the requested ones, or every column of those windows. store_id always comes first.
+    """
+    if not columns:
+        return [name for name, (_, window, _) in REPORT_COLUMNS.items() if window is None or window in windows]
+    unknown = set(columns) - set(REPORT_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+    for name in columns:
+        window = REPORT_COLUMNS[name][1]
+        if window is not None and window not in windows:
+            raise ValueError(f"Column {name} needs the {window} window")
+    return [name for name in REPORT_COLUMNS if name == 'store_id' or name in columns]
+
+
+def report_header(columns):
+    return [REPORT_COLUMNS[name][0] for name in columns]
+
+
+def report_filename(report_id, report_format='csv'):
+    return f"store_report_{report_id}.{report_format}"
+
+
+def report_format_of(filename):
+    """The REPORT_FORMATS entry a report file was written in"""
+    for report_format in sorted(REPORT_FORMATS, key=len, reverse=True):
+        if filename.endswith(f".{report_format}"):
+            return report_format
+    raise ValueError(f"Unknown report format: {filename}")
+
+
+def validate_report_format(report_format):
+    """
+    The format a report will be written in (the REPORT_FORMAT default when None), rejected
+    up front when it is unknown or its package is not installed, rather than in the worker
+    """
+    report_format = report_format or settings.REPORT_FORMAT
+    if report_format not in REPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(REPORT_FORMATS)}")
+    package = FORMAT_PACKAGES.get(report_format)
+    if package and importlib.util.find_spec(package) is None:
+        raise ValueError(f"format {report_format} needs {package}, which is not installed")
+    return report_format
+
+
+@contextmanager
+def open_report_file(full_path, compress=False):
+    """Text handle for a report file: gzip-compressed on the fly, or a plain file with a large write buffer"""
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    if compress:
+        handle = gzip.open(full_path, 'wt', newline='', compresslevel=settings.REPORT_GZIP_LEVEL)
+    else:
+        handle = open(full_path, 'w', newline='', buffering=WRITE_BUFFER_BYTES)
+    with handle:
+        yield handle
+
+
+def write_rows_chunked(handle, rows):
+    """Write an iterable of CSV rows in chunks, so only WRITE_CHUNK_ROWS are held at a time"""
+    writer = csv.writer(handle)
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= WRITE_CHUNK_ROWS:
+            writer.writerows(chunk)
+            chunk.clear()
+    if chunk:
+        writer.writerows(chunk)
+
+
+def write_report(full_path, report_format, rows, columns, header=True):
+    """Write report rows (values of columns) in report_format; header=False leaves CSV parts headerless"""
+    if report_format == 'parquet':
+        from store_monitor.columnar import write_parquet
+        write_parquet(full_path, rows, columns)
+        return
+    with open_report_file(full_path, report_format == 'csv.gz') as handle:
+        if header:
+            csv.writer(handle).writerow(report_header(columns))
+        write_rows_chunked(handle, rows)
+
+
+def merge_report_parts(full_path, report_format, part_paths, columns):
+    """
+    Join shard outputs (in keyset order) into one report. Headerless CSV parts are
+    concatenated as-is (a sequence of gzip members is a valid gzip file); Parquet
+    parts have their row groups copied.
+    """
+    if report_format == 'parquet':
+        from store_monitor.columnar import merge_parquet
+        merge_parquet(full_path, part_paths, columns)
+        return
+    with open_report_file(full_path, report_format == 'csv.gz') as handle:
+        csv.writer(handle).writerow(report_header(columns))
+    with open(full_path, 'ab') as report_file:
+        for part_path in part_paths:
+            with open(part_path, 'rb') as part:
+                shutil.copyfileobj(part, report_file)
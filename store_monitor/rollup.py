@@ -0,0 +1,145 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection as conn, transaction
+
+from store_monitor.models import AggregateWatermark
+from store_monitor.utils import DEFAULT_TIMEZONE, floor_bucket
+
+HOUR = timedelta(hours=1)
+ROLLUP_WATERMARK = 'storestatus_hourly'
+# Serialises refreshes so the prior deltas below are never applied twice
+ROLLUP_LOCK_ID = 0x5354524C
+
+# Recomputes the selected hours from raw polls, upserts the ones that changed into the
+# hourly rollup and applies the same change (new minus old counts) to the activity priors.
+ROLLUP_REFRESH_QUERY = """
+    WITH fresh AS (
+        SELECT
+            s.store_id,
+            time_bucket('1 hour', s.timestamp_utc) AS hour_utc,
+            COUNT(*) FILTER (WHERE s.status = 'active') AS count_active,
+            COUNT(*) FILTER (WHERE s.status = 'inactive') AS count_inactive
+        FROM store_monitor_storestatus s
+        {hours_join}
+        WHERE s.store_id IN (SELECT id FROM store_monitor_store){since_filter}
+        GROUP BY s.store_id, hour_utc
+    ),
+    changed AS (
+        SELECT
+            f.store_id,
+            f.hour_utc,
+            f.count_active,
+            f.count_inactive,
+            f.count_active - COALESCE(r.count_active, 0) AS delta_active,
+            f.count_inactive - COALESCE(r.count_inactive, 0) AS delta_inactive
+        FROM fresh f
+        LEFT JOIN store_monitor_storestatushourly r
+          ON r.store_id = f.store_id AND r.hour_utc = f.hour_utc
+        WHERE r.id IS NULL
+           OR (r.count_active, r.count_inactive) IS DISTINCT FROM (f.count_active, f.count_inactive)
+    ),
+    upserted AS (
+        INSERT INTO store_monitor_storestatushourly (store_id, hour_utc, count_active, count_inactive, updated_at)
+        SELECT store_id, hour_utc, count_active, count_inactive, NOW()
+        FROM changed
+        ON CONFLICT (store_id, hour_utc) DO UPDATE
+        SET count_active = EXCLUDED.count_active,
+            count_inactive = EXCLUDED.count_inactive,
+            updated_at = EXCLUDED.updated_at
+        RETURNING 1
+    ),
+    priors AS (
+        INSERT INTO store_monitor_storeactivityprior (store_id, day_of_week, hour, count_active, count_inactive)
+        SELECT
+            c.store_id,
+            EXTRACT(ISODOW FROM c.hour_utc AT TIME ZONE COALESCE(tz.timezone_str, %s))::int - 1 AS day_of_week,
+            EXTRACT(HOUR FROM c.hour_utc AT TIME ZONE COALESCE(tz.timezone_str, %s))::int AS local_hour,
+            SUM(c.delta_active),
+            SUM(c.delta_inactive)
+        FROM changed c
+        LEFT JOIN store_monitor_storetimezone tz ON tz.store_id = c.store_id
+        GROUP BY c.store_id, day_of_week, local_hour
+        ON CONFLICT (store_id, day_of_week, hour) DO UPDATE
+        SET count_active = store_monitor_storeactivityprior.count_active + EXCLUDED.count_active,
+            count_inactive = store_monitor_storeactivityprior.count_inactive + EXCLUDED.count_inactive
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM upserted), (SELECT COUNT(*) FROM priors);
+"""
+
+HOURS_JOIN = """
+    JOIN unnest(%s::timestamptz[]) AS dirty(hour_utc)
+      ON s.timestamp_utc >= dirty.hour_utc AND s.timestamp_utc < dirty.hour_utc + interval '1 hour'
+"""
+
+REBUILD_PRIORS_QUERY = """
+    INSERT INTO store_monitor_storeactivityprior (store_id, day_of_week, hour, count_active, count_inactive)
+    SELECT
+        r.store_id,
+        EXTRACT(ISODOW FROM r.hour_utc AT TIME ZONE COALESCE(tz.timezone_str, %s))::int - 1 AS day_of_week,
+        EXTRACT(HOUR FROM r.hour_utc AT TIME ZONE COALESCE(tz.timezone_str, %s))::int AS local_hour,
+        SUM(r.count_active),
+        SUM(r.count_inactive)
+    FROM store_monitor_storestatushourly r
+    LEFT JOIN store_monitor_storetimezone tz ON tz.store_id = r.store_id
+    GROUP BY r.store_id, day_of_week, local_hour;
+"""
+
+
+def _run_refresh(cursor, hours_join, since_filter, params):
+    cursor.execute(
+        ROLLUP_REFRESH_QUERY.format(hours_join=hours_join, since_filter=since_filter),
+        [*params, DEFAULT_TIMEZONE, DEFAULT_TIMEZONE],
+    )
+    return cursor.fetchone()[0]
+
+
+def refresh_hourly_rollup(hours=None):
+    """
+    Bring store_monitor_storestatushourly (and the activity priors derived from it)
+    up to date and return the number of hourly rows written.
+
+    With hours (UTC datetimes, e.g. from an ingestion batch) only those hours are
+    recomputed. Otherwise every hour at or after the stored watermark, minus
+    ROLLUP_LATE_DATA_WINDOW to pick up late polls, is recomputed and the watermark
+    advances to the newest poll seen.
+    """
+    if hours is not None:
+        dirty_hours = sorted({floor_bucket(hour, HOUR) for hour in hours})
+        if not dirty_hours:
+            return 0
+
+    with transaction.atomic(), conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [ROLLUP_LOCK_ID])
+        if hours is not None:
+            return _run_refresh(cursor, HOURS_JOIN, '', [dirty_hours])
+
+        state, _ = AggregateWatermark.objects.select_for_update().get_or_create(name=ROLLUP_WATERMARK)
+        since_filter, params = '', []
+        since = None
+        if state.watermark:
+            since = floor_bucket(state.watermark - settings.ROLLUP_LATE_DATA_WINDOW, HOUR)
+            since_filter, params = ' AND s.timestamp_utc >= %s', [since]
+
+        written = _run_refresh(cursor, '', since_filter, params)
+        cursor.execute(
+            "SELECT MAX(timestamp_utc) FROM store_monitor_storestatus"
+            + (" WHERE timestamp_utc >= %s" if since else ""),
+            [since] if since else [],
+        )
+        newest = cursor.fetchone()[0]
+
+        if newest and (state.watermark is None or newest > state.watermark):
+            state.watermark = newest
+            state.save()
+    return written
+
+
+def rebuild_activity_priors():
+    """Recompute all activity priors from the hourly rollup (e.g. after timezones change)"""
+    with transaction.atomic(), conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [ROLLUP_LOCK_ID])
+        cursor.execute("DELETE FROM store_monitor_storeactivityprior")
+        cursor.execute(REBUILD_PRIORS_QUERY, [DEFAULT_TIMEZONE, DEFAULT_TIMEZONE])
+        return cursor.rowcount
@@ -0,0 +1,207 @@
+"""
+Time-weighted state-duration engine (REPORT_ENGINE=intervals).
+
+Instead of counting polls per 2-hour bucket, every poll is taken to hold its status
+until the next poll (at most REPORT_INTERVAL_MAX_GAP later). LAG() collapses consecutive
+polls with the same status into runs and LEAD() gives each poll's end, producing a few
+state intervals per store. Business hours are built in SQL as a multirange of UTC open
+intervals per store, and the active/inactive durations inside each window are summed
+in the database, so one row per store comes back.
+
+Business time that no poll covers counts as half up, like the 0.5 interpolation of the
+bucket engines (for the last hour the store's activity prior is used when enabled).
+Requires PostgreSQL 14+ for multiranges.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection as conn
+
+from store_monitor.utils import (
+    DEFAULT_TIMEZONE,
+    StoreMetadataIndex,
+    activity_prior_slots,
+    load_activity_priors,
+    prior_probability,
+)
+
+# Seconds covered by a tstzmultirange
+DURATION = "(SELECT COALESCE(SUM(EXTRACT(EPOCH FROM upper(r) - lower(r))), 0) FROM unnest({multirange}) AS r)"
+
+WINDOWS = ('hour', 'day', 'week')
+
+
+STATE_DURATIONS_QUERY = """
+    WITH stores AS (
+        SELECT s.id AS store_id, COALESCE(tz.timezone_str, %s) AS tz
+        FROM store_monitor_store s
+        LEFT JOIN store_monitor_storetimezone tz ON tz.store_id = s.id
+        WHERE TRUE{stores_filter}
+    ),
+    business AS (
+        -- One local slot per store and local date (missing days default to open all day,
+        -- like StoreMetadataIndex), localised on its own date and merged into a multirange
+        SELECT
+            st.store_id,
+            range_agg(tstzrange(
+                (d.day + COALESCE(bh.start_time_local, '00:00'::time)) AT TIME ZONE st.tz,
+                (d.day
+                    + CASE WHEN COALESCE(bh.end_time_local, '23:59'::time) <= COALESCE(bh.start_time_local, '00:00'::time)
+                           THEN interval '1 day' ELSE interval '0' END
+                    + COALESCE(bh.end_time_local, '23:59'::time)) AT TIME ZONE st.tz
+            )) AS open_hours
+        FROM stores st
+        CROSS JOIN generate_series(%s::timestamp, %s::timestamp, interval '1 day') AS d(day)
+        LEFT JOIN store_monitor_storebusinesshour bh
+          ON bh.store_id = st.store_id AND bh.day_of_week = EXTRACT(ISODOW FROM d.day)::int - 1
+        GROUP BY st.store_id
+    ),
+    windows AS (
+        SELECT
+            store_id,
+            open_hours * tstzmultirange(tstzrange(%s, %s)) AS hour_open,
+            open_hours * tstzmultirange(tstzrange(%s, %s)) AS day_open,
+            open_hours * tstzmultirange(tstzrange(%s, %s)) AS week_open
+        FROM business
+    ),
+    polls AS (
+        SELECT
+            store_id,
+            timestamp_utc,
+            status,
+            LEAD(timestamp_utc) OVER w AS next_ts,
+            CASE
+                WHEN status IS DISTINCT FROM LAG(status) OVER w
+                  OR timestamp_utc - LAG(timestamp_utc) OVER w > %s THEN 1
+                ELSE 0
+            END AS new_run
+        FROM store_monitor_storestatus
+        WHERE timestamp_utc >= %s AND timestamp_utc <= %s{polls_filter}
+        WINDOW w AS (PARTITION BY store_id ORDER BY timestamp_utc)
+    ),
+    runs AS (
+        SELECT
+            store_id,
+            status,
+            timestamp_utc,
+            LEAST(COALESCE(next_ts, %s), timestamp_utc + %s, %s) AS valid_until,
+            SUM(new_run) OVER (PARTITION BY store_id ORDER BY timestamp_utc) AS run_id
+        FROM polls
+    ),
+    states AS (
+        SELECT store_id, status, tstzmultirange(tstzrange(MIN(timestamp_utc), MAX(valid_until))) AS span
+        FROM runs
+        GROUP BY store_id, run_id, status
+    ),
+    durations AS (
+        SELECT
+            s.store_id,
+            SUM({hour_state}) FILTER (WHERE s.status = 'active') AS hour_active,
+            SUM({hour_state}) FILTER (WHERE s.status = 'inactive') AS hour_inactive,
+            SUM({day_state}) FILTER (WHERE s.status = 'active') AS day_active,
+            SUM({day_state}) FILTER (WHERE s.status = 'inactive') AS day_inactive,
+            SUM({week_state}) FILTER (WHERE s.status = 'active') AS week_active,
+            SUM({week_state}) FILTER (WHERE s.status = 'inactive') AS week_inactive
+        FROM states s
+        JOIN windows w ON w.store_id = s.store_id
+        GROUP BY s.store_id
+    )
+    SELECT
+        w.store_id,
+        {hour_open}, COALESCE(d.hour_active, 0), COALESCE(d.hour_inactive, 0),
+        {day_open}, COALESCE(d.day_active, 0), COALESCE(d.day_inactive, 0),
+        {week_open}, COALESCE(d.week_active, 0), COALESCE(d.week_inactive, 0)
+    FROM windows w
+    LEFT JOIN durations d ON d.store_id = w.store_id
+    ORDER BY w.store_id;
+"""
+
+
+def _build_query(scope):
+    stores_filter, stores_params = scope.sql('s.id')
+    polls_filter, polls_params = scope.sql('store_id')
+    query = STATE_DURATIONS_QUERY.format(
+        stores_filter=stores_filter,
+        polls_filter=polls_filter,
+        **{
+            f'{name}_state': DURATION.format(multirange=f'w.{name}_open * s.span')
+            for name in WINDOWS
+        },
+        **{
+            f'{name}_open': DURATION.format(multirange=f'w.{name}_open')
+            for name in WINDOWS
+        },
+    )
+    return query, stores_params, polls_params
+
+
+def _uptime_minutes(active, inactive, possible, uncovered_share=0.5):
+    """(uptime, possible) minutes from seconds; business time no poll covers counts as uncovered_share up"""
+    active, inactive, possible = float(active), float(inactive), float(possible)
+    uncovered = max(possible - active - inactive, 0)
+    return (active + uncovered_share * uncovered) / 60, possible / 60
+
+
+def _summary(uptime_minutes, possible_minutes):
+    return {
+        "uptime_hours": uptime_minutes // 60,
+        "downtime_hours": (possible_minutes - uptime_minutes) // 60,
+        "uptime_percent": uptime_minutes / possible_minutes * 100 if possible_minutes else 0,
+        "total_possible_hours": possible_minutes // 60,
+    }
+
+
+def compute_interval_metrics(now_utc, scope):
+    # Windows the scope does not want get an empty range, so they cost nothing to sum
+    starts = {
+        name: now_utc - length if scope.wants(name) else now_utc
+        for name, length in (('hour', timedelta(hours=1)), ('day', timedelta(days=1)), ('week', timedelta(days=7)))
+    }
+    hour_start_utc = starts['hour']
+    earliest_start = min(starts.values())
+    max_gap = settings.REPORT_INTERVAL_MAX_GAP
+    lookback_utc = earliest_start - max_gap
+
+    query, stores_params, polls_params = _build_query(scope)
+    params = [
+        DEFAULT_TIMEZONE, *stores_params,
+        # Local dates that can hold business hours overlapping the widest window (any UTC offset)
+        (earliest_start - timedelta(days=2)).date(), (now_utc + timedelta(days=1)).date(),
+        starts['hour'], now_utc,
+        starts['day'], now_utc,
+        starts['week'], now_utc,
+        max_gap, lookback_utc, now_utc, *polls_params,
+        now_utc, max_gap, now_utc,
+    ]
+    with conn.cursor() as cursor:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+
+        # The last hour's uncovered time falls back to the store's activity prior
+        priors = {}
+        uncovered_hour = [row[0] for row in rows if row[1] > row[2] + row[3]]
+        if settings.REPORT_USE_ACTIVITY_PRIORS and uncovered_hour:
+            metadata = StoreMetadataIndex.load(scope)
+            store_priors = load_activity_priors(uncovered_hour, cursor)
+            for store_id in uncovered_hour:
+                slots = activity_prior_slots(hour_start_utc.astimezone(metadata.timezone(store_id)))
+                priors[store_id] = prior_probability(store_priors.get(store_id, {}), slots)
+
+    for (store_id,
+         hour_open, hour_active, hour_inactive,
+         day_open, day_active, day_inactive,
+         week_open, week_active, week_inactive) in rows:
+        last_hour = last_day = last_week = None
+        if scope.wants('hour'):
+            hour_uptime, hour_possible = _uptime_minutes(
+                hour_active, hour_inactive, hour_open, priors.get(store_id, 0.5),
+            )
+            last_hour = {
+                "uptime_last_hour": hour_uptime,
+                "downtime_last_hour": hour_possible - hour_uptime,
+            }
+        if scope.wants('day'):
+            last_day = _summary(*_uptime_minutes(day_active, day_inactive, day_open))
+        if scope.wants('week'):
+            last_week = _summary(*_uptime_minutes(week_active, week_inactive, week_open))
+        yield store_id, last_hour, last_day, last_week
@@ -1,64 +1,223 @@
 # tasks.py
 import os
-import csv
-from celery import shared_task
+import shutil
+import time
+from celery import chord, shared_task
 from django.conf import settings
 from django.utils import timezone
-from .models import StoreReport, Store , StoreTimezone
-import pytz
-from .utils import calculate_uptime_last_hour, calculate_uptime_last_day, calculate_uptime_last_week
+from .buffer import flush_status_buffer
+from .instrumentation import ReportInstrumentation, merge_timings, record_report_metrics
+from .models import Store, StoreReport
+from .report_cache import release_report_lock, report_heartbeat
+from .report_control import (
+    CANCELLED_STATUSES,
+    ReportCancelled,
+    acquire_report_slot,
+    release_report_slot,
+    report_routing,
+)
+from .report_events import publish_report_event, report_event_name
+from .report_engine import REPORT_WINDOWS, StoreScope, iter_report_metrics, plan_store_shards
+from .report_writer import REPORT_COLUMNS, merge_report_parts, report_columns, report_filename, write_report
+from .rollup import rebuild_activity_priors, refresh_hourly_rollup
+from .utils import ensure_utc
 
-@shared_task
-def generate_store_report_task(report_id, now_utc):
+def iter_report_rows(now_utc, engine, scope=None, columns=None):
+    """Report rows holding columns (default: every column of the scope's windows)"""
+    scope = scope or StoreScope()
+    columns = columns or report_columns(scope.windows)
+    getters = [REPORT_COLUMNS[name][1:] for name in columns[1:]]
+    for store_id, *windows in iter_report_metrics(now_utc, engine, scope):
+        metrics = dict(zip(REPORT_WINDOWS, windows))
+        yield [store_id, *(metrics[window][key] for window, key in getters)]
+
+
+def report_parts_dir(report_id):
+    return os.path.join(settings.MEDIA_ROOT, 'reports', 'parts', str(report_id))
+
+
+def _finish_report(report, status, **fields):
+    """Save a report's final status (and fields), free its lock and slot, count it and notify waiters"""
+    report.status = status
+    for name, value in fields.items():
+        setattr(report, name, value)
+    # Only the named fields: stores_processed is incremented in the DB while the report runs
+    report.save(update_fields=['status', *fields])
+    release_report_lock(report)
+    release_report_slot(report)
+    outcome = report_event_name(status)
+    record_report_metrics(report.timings, outcome)
+    publish_report_event(report.id, outcome, status=status)
+
+
+@shared_task(bind=True, max_retries=None)
+def generate_store_report_task(self, report_id, now_utc, engine=None, report_format=None, scope=None, columns=None):
+    now_utc = ensure_utc(now_utc)
+    engine = engine or settings.REPORT_ENGINE
+    report_format = report_format or settings.REPORT_FORMAT
+    scope = StoreScope.from_dict(scope)
+    columns = report_columns(scope.windows, columns)
     report = StoreReport.objects.get(id=report_id)
+    if report.status == "cancelled":
+        # Cancelled while queued
+        return
+    if not acquire_report_slot(report):
+        # The report's queue is at REPORT_MAX_CONCURRENT(_BULK); try again shortly, still
+        # counting as in flight for identical requests
+        report_heartbeat(report)
+        raise self.retry(countdown=settings.REPORT_SLOT_RETRY_SECONDS)
+
+    stores_total = scope.filter_stores(Store.objects).count()
+    started = StoreReport.objects.filter(id=report_id, status__in=("pending", "running")).update(
+        status="running", stores_total=stores_total, stores_processed=0, heartbeat_at=timezone.now(),
+    )
+    if not started:
+        release_report_slot(report)
+        return
     report.status = "running"
-    report.save()
+    report.stores_total = stores_total
+    publish_report_event(report_id, "running", stores_processed=0, stores_total=stores_total)
+
+    routing = report_routing(report.priority)
+    instrumentation = ReportInstrumentation(report_id)
+    shards = None
+    full_path = None
+    try:
+        with instrumentation:
+            # The incremental engine detects late polls for the buckets it reuses through
+            # the rollup, so it needs it current whatever the bucket source
+            if settings.REPORT_BUCKET_SOURCE == 'rollup' or engine == 'incremental':
+                with instrumentation.phase('rollup_refresh'):
+                    refresh_hourly_rollup()
+
+            # The incremental engine keeps fleet-wide state, so it always runs as one task
+            if settings.REPORT_SHARD_SIZE and engine != 'incremental':
+                shard_scopes = plan_store_shards(
+                    settings.REPORT_SHARD_SIZE, settings.REPORT_SHARD_CONCURRENCY, scope,
+                )
+                if len(shard_scopes) > 1:
+                    shards = [
+                        generate_report_shard_task.s(
+                            report_id, now_utc, engine, index, shard_scope.as_dict(), report_format, columns,
+                        ).set(**routing)
+                        for index, shard_scope in enumerate(shard_scopes)
+                    ]
+
+            if shards is None:
+                filename = report_filename(report_id, report_format)
+                full_path = os.path.join(settings.MEDIA_ROOT, 'reports', filename)
+                rows = instrumentation.iter_rows(iter_report_rows(now_utc, engine, scope, columns))
+                write_report(full_path, report_format, rows, columns)
+
+        report.timings = instrumentation.as_dict()
+        if shards is not None:
+            # Each shard writes a partial report; the chord callback stitches them together
+            # and adds the shards' timings to the ones recorded here. The report keeps its
+            # slot until the callback (or the error callback) finishes it.
+            report.save(update_fields=['timings'])
+            callback = (
+                merge_report_shards_task.s(report_id, report_format, columns).set(**routing)
+                .on_error(report_shards_failed_task.s(report_id).set(**routing))
+            )
+            chord(shards)(callback)
+            return
+
+    except ReportCancelled:
+        if full_path and os.path.exists(full_path):
+            os.remove(full_path)
+        _finish_report(report, "cancelled", timings=instrumentation.as_dict())
+        return
+
+    except Exception as e:
+        _finish_report(report, f"failed: {str(e)}", timings=instrumentation.as_dict())
+        raise
+
+    # Outside the try: the report is done, nothing after its save may turn it into a failure
+    _finish_report(report, "completed", timings=report.timings, report_file=f'reports/{filename}')
+
+
+@shared_task
+def generate_report_shard_task(report_id, now_utc, engine, index, scope, report_format='csv', columns=None):
+    """
+    Compute one keyset range of stores and write it as a partial report (headerless for CSV).
+    Returns the part's path and the shard's timings.
+    """
+    if StoreReport.objects.filter(id=report_id, status__in=CANCELLED_STATUSES).exists():
+        raise ReportCancelled(report_id)
+    now_utc = ensure_utc(now_utc)
+    part_path = os.path.join(report_parts_dir(report_id), f"{index:05d}.{report_format}")
+
+    with ReportInstrumentation(report_id) as instrumentation:
+        scope = StoreScope.from_dict(scope)
+        columns = columns or report_columns(scope.windows)
+        rows = iter_report_rows(now_utc, engine, scope, columns)
+        write_report(part_path, report_format, instrumentation.iter_rows(rows), columns, header=False)
+    return part_path, instrumentation.as_dict()
+
+
+@shared_task
+def merge_report_shards_task(shard_results, report_id, report_format='csv', columns=None):
+    """Chord callback: join the shard outputs (in keyset order) into the final report"""
+    report = StoreReport.objects.get(id=report_id)
+    if report.status in CANCELLED_STATUSES:
+        shutil.rmtree(report_parts_dir(report_id), ignore_errors=True)
+        _finish_report(report, "cancelled")
+        return
+
+    filename = report_filename(report_id, report_format)
+    full_path = os.path.join(settings.MEDIA_ROOT, 'reports', filename)
+    part_paths = sorted(part_path for part_path, _ in shard_results)
 
     try:
-        filename = f"store_report_{report_id}.csv"
-        full_path = os.path.join(settings.MEDIA_ROOT, 'reports', filename)
-
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
-        with open(full_path, 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow([
-                'store_id',
-                'uptime_last_hour(in minutes)',
-                'uptime_last_day(in hours)',
-                'uptime_last_week(in hours)',
-                'downtime_last_hour(in minutes)',
-                'downtime_last_day(in hours)',
-                'downtime_last_week(in hours)',
-            ])
-
-            for store in Store.objects.all():
-
-                tz_obj = StoreTimezone.objects.filter(store_id=store.id).first()
-                tz_str = tz_obj.timezone_str if tz_obj else 'America/Chicago'
-                local_tz = pytz.timezone(tz_str)
-                uptime_last_hour = calculate_uptime_last_hour(store.id, now_utc, local_tz)
-                uptime_last_day = calculate_uptime_last_day(store.id, now_utc, local_tz)
-                uptime_last_week = calculate_uptime_last_week(store.id, now_utc, local_tz)
-
-                writer.writerow([
-                    store.id,
-                    uptime_last_hour['uptime_last_hour'],
-                    uptime_last_day['uptime_hours'],
-                    uptime_last_week['uptime_hours'],
-                    uptime_last_hour['downtime_last_hour'],
-                    uptime_last_day['downtime_hours'],
-                    uptime_last_week['downtime_hours'],
-                ])
-
-        report.report_file.name = f'reports/{filename}'
-        report.status = "completed"
-        report.save()
+        started = time.perf_counter()
+        merge_report_parts(full_path, report_format, part_paths, columns or list(REPORT_COLUMNS))
+        shutil.rmtree(report_parts_dir(report_id), ignore_errors=True)
 
+        # Shard timings are summed, so phases report total worker seconds
+        timings = merge_timings([
+            report.timings,
+            *(timings for _, timings in shard_results),
+            {'merge': time.perf_counter() - started},
+        ])
     except Exception as e:
-        report.status = f"failed: {str(e)}"
-        report.save()
+        _finish_report(report, f"failed: {str(e)}")
         raise
+    _finish_report(report, "completed", timings=timings, report_file=f'reports/{filename}')
+
+
+@shared_task
+def report_shards_failed_task(request, exc, traceback, report_id):
+    shutil.rmtree(report_parts_dir(report_id), ignore_errors=True)
+    report = StoreReport.objects.get(id=report_id)
+    # A shard that noticed the cancellation raised ReportCancelled
+    _finish_report(report, "cancelled" if report.status in CANCELLED_STATUSES else f"failed: {exc}")
+
+
+@shared_task
+def refresh_status_rollup_task():
+    """Periodic (beat) incremental refresh of the hourly StoreStatus rollup"""
+    return refresh_hourly_rollup()
+
+
+@shared_task
+def prewarm_latest_report_task():
+    """Periodic (beat) refresh of the aggregates and the pre-warmed "latest" report"""
+    from .report_jobs import prewarm_latest_report
+    return prewarm_latest_report()
+
+
+@shared_task
+def rebuild_activity_priors_task():
+    """Full recompute of StoreActivityPrior, e.g. after store timezones were changed"""
+    return rebuild_activity_priors()
+
+
+@shared_task
+def flush_status_buffer_task():
+    """Periodic (beat) drain of polls buffered in Redis by the batch ingest API"""
+    return flush_status_buffer()
+
 
 @shared_task
 def add(a,b):
-    return a + b
\ No newline at end of file
+    return a + b
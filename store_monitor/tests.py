@@ -1,3 +1,887 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import shutil
+import tempfile
+import time as time_module
+import uuid
+from datetime import datetime, time, timedelta, timezone
+from unittest import mock
 
-# Create your tests here.
+import pytz
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone as django_timezone
+
+from store_monitor.business_calendar import BusinessCalendar
+from store_monitor.models import Store, StoreBusinessHour, StoreReport, StoreStatus, StoreTimezone
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ALL_DAY = [(time(0, 0), time(23, 59))] * 7
+NINE_TO_FIVE = [(time(9, 0), time(17, 0))] * 7
+OVERNIGHT = [(time(22, 0), time(6, 0))] * 7
+
+CHICAGO = pytz.timezone('America/Chicago')
+KOLKATA = pytz.timezone('Asia/Kolkata')
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def baseline_is_within_business_hours(start_local, end_local, business_hours):
+    """is_within_business_hours as it was before BusinessCalendar replaced it"""
+    for bh_start, bh_end in business_hours:
+        bh_start_dt = datetime.combine(start_local.date(), bh_start, tzinfo=start_local.tzinfo)
+        bh_end_dt = datetime.combine(start_local.date(), bh_end, tzinfo=start_local.tzinfo)
+        if bh_end <= bh_start:
+            bh_end_dt += timedelta(days=1)
+        overlap_start = max(start_local, bh_start_dt)
+        overlap_end = min(end_local, bh_end_dt)
+        if overlap_start < overlap_end:
+            return True, round((overlap_end - overlap_start).total_seconds() / 60)
+    return False, 0
+
+
+class BusinessCalendarTests(SimpleTestCase):
+
+    def test_plain_day(self):
+        # Kolkata has no DST: 09:00-17:00 IST is 03:30-11:30 UTC
+        calendar = BusinessCalendar.compile(NINE_TO_FIVE, KOLKATA, utc(2023, 1, 23), utc(2023, 1, 24))
+        self.assertEqual(calendar.intervals(), [(utc(2023, 1, 23, 3, 30), utc(2023, 1, 23, 11, 30))])
+        self.assertEqual(calendar.overlap_minutes(utc(2023, 1, 23), utc(2023, 1, 24)), 8 * 60)
+        self.assertEqual(calendar.overlap_minutes(utc(2023, 1, 23, 11), utc(2023, 1, 23, 13)), 30)
+        self.assertEqual(calendar.overlap_minutes(utc(2023, 1, 23, 12), utc(2023, 1, 23, 14)), 0)
+
+    def test_overnight_slot_closes_next_day(self):
+        calendar = BusinessCalendar.compile(OVERNIGHT, pytz.utc, utc(2023, 1, 23), utc(2023, 1, 25))
+        # The slot opened on the 22nd runs into the range, then one per evening
+        self.assertEqual(calendar.intervals(), [
+            (utc(2023, 1, 23), utc(2023, 1, 23, 6)),
+            (utc(2023, 1, 23, 22), utc(2023, 1, 24, 6)),
+            (utc(2023, 1, 24, 22), utc(2023, 1, 25)),
+        ])
+        self.assertEqual(calendar.overlap_minutes(utc(2023, 1, 23), utc(2023, 1, 25)), 16 * 60)
+
+    def test_open_all_day_merges_adjacent_days(self):
+        full_day = [(time(0, 0), time(0, 0))] * 7
+        calendar = BusinessCalendar.compile(full_day, pytz.utc, utc(2023, 1, 23), utc(2023, 1, 26))
+        self.assertEqual(calendar.intervals(), [(utc(2023, 1, 23), utc(2023, 1, 26))])
+
+    def test_default_hours_leave_a_minute_per_day(self):
+        # Days without StoreBusinessHour rows default to 00:00-23:59
+        calendar = BusinessCalendar.compile(ALL_DAY, pytz.utc, utc(2023, 1, 23), utc(2023, 1, 24))
+        self.assertEqual(calendar.overlap_minutes(utc(2023, 1, 23), utc(2023, 1, 24)), 24 * 60 - 1)
+
+    def test_dst_spring_forward(self):
+        # 2023-03-12 02:00 CST -> 03:00 CDT: the local day is 23 hours long
+        calendar = BusinessCalendar.compile(
+            [(time(0, 0), time(0, 0))] * 7, CHICAGO, utc(2023, 3, 12, 6), utc(2023, 3, 13, 5),
+        )
+        self.assertEqual(calendar.overlap_minutes(utc(2023, 3, 12, 6), utc(2023, 3, 13, 5)), 23 * 60)
+        nine_to_five = BusinessCalendar.compile(NINE_TO_FIVE, CHICAGO, utc(2023, 3, 10), utc(2023, 3, 14))
+        # Opens at 15:00 UTC before the change and at 14:00 UTC after it
+        self.assertIn((utc(2023, 3, 11, 15), utc(2023, 3, 11, 23)), nine_to_five.intervals())
+        self.assertIn((utc(2023, 3, 13, 14), utc(2023, 3, 13, 22)), nine_to_five.intervals())
+
+    def test_dst_fall_back(self):
+        # 2023-11-05 02:00 CDT -> 01:00 CST: the local day is 25 hours long
+        calendar = BusinessCalendar.compile(
+            [(time(0, 0), time(0, 0))] * 7, CHICAGO, utc(2023, 11, 5, 5), utc(2023, 11, 6, 6),
+        )
+        self.assertEqual(calendar.overlap_minutes(utc(2023, 11, 5, 5), utc(2023, 11, 6, 6)), 25 * 60)
+        nine_to_five = BusinessCalendar.compile(NINE_TO_FIVE, CHICAGO, utc(2023, 11, 3), utc(2023, 11, 7))
+        self.assertIn((utc(2023, 11, 4, 14), utc(2023, 11, 4, 22)), nine_to_five.intervals())
+        self.assertIn((utc(2023, 11, 6, 15), utc(2023, 11, 6, 23)), nine_to_five.intervals())
+
+    def test_concat_matches_single_compile(self):
+        start = utc(2023, 1, 16)
+        weeks = [
+            BusinessCalendar.compile(OVERNIGHT, CHICAGO, start + timedelta(days=7 * n), start + timedelta(days=7 * (n + 1)))
+            for n in range(2)
+        ]
+        joined = BusinessCalendar.concat(weeks)
+        whole = BusinessCalendar.compile(OVERNIGHT, CHICAGO, start, start + timedelta(days=14))
+        for hours in range(0, 14 * 24, 5):
+            window_start = start + timedelta(hours=hours)
+            window_end = window_start + timedelta(hours=7)
+            self.assertEqual(
+                joined.overlap_minutes(window_start, window_end),
+                whole.overlap_minutes(window_start, window_end),
+            )
+
+    def test_matches_baseline_business_hours_check(self):
+        # The baseline checked each 2-hour bucket against the slot on the bucket's local
+        # start date; with the same hours every day the calendar must agree with it
+        for hours in (NINE_TO_FIVE, ALL_DAY, [(time(8, 30), time(20, 15))] * 7):
+            for local_tz in (KOLKATA, CHICAGO):
+                calendar = BusinessCalendar.compile(hours, local_tz, utc(2023, 1, 16), utc(2023, 1, 23))
+                bucket = utc(2023, 1, 16)
+                while bucket < utc(2023, 1, 23):
+                    end = bucket + timedelta(hours=2)
+                    start_local = bucket.astimezone(local_tz)
+                    end_local = (end - timedelta(seconds=1)).astimezone(local_tz)
+                    if start_local.date() == end_local.date():
+                        _, expected = baseline_is_within_business_hours(start_local, end_local, hours)
+                        self.assertAlmostEqual(calendar.overlap_minutes(bucket, end), expected, delta=1)
+                    bucket = end
+
+
+class VectorizedHelperTests(SimpleTestCase):
+
+    def setUp(self):
+        if np is None:
+            self.skipTest("numpy is not installed")
+
+    def test_business_week_mask(self):
+        from store_monitor.vectorized import MINUTES_PER_DAY, business_week_mask
+
+        mask = business_week_mask(NINE_TO_FIVE)
+        self.assertEqual(mask.sum(), 7 * 8 * 60)
+        self.assertTrue(mask[9 * 60])
+        self.assertFalse(mask[17 * 60])
+        self.assertTrue(mask[6 * MINUTES_PER_DAY + 16 * 60 + 59])
+
+    def test_business_week_mask_overnight_wraps_to_monday(self):
+        from store_monitor.vectorized import MINUTES_PER_DAY, business_week_mask
+
+        hours = [(time(0, 0), time(0, 1))] * 6 + [(time(22, 0), time(2, 0))]
+        mask = business_week_mask(hours)
+        # Sunday 22:00 to Monday 02:00, plus one minute at the start of Monday to Saturday
+        self.assertTrue(mask[6 * MINUTES_PER_DAY + 22 * 60])
+        self.assertTrue(mask[60])
+        self.assertFalse(mask[2 * 60])
+        self.assertEqual(mask.sum(), 4 * 60 + 5)
+
+    def test_locf_nonzero(self):
+        from store_monitor.vectorized import _locf_nonzero
+
+        values = np.array([
+            [0, 3, 0, 0, 2, 0],
+            [0, 0, 0, 0, 0, 0],
+            [5, 0, 1, 0, 0, 0],
+        ])
+        np.testing.assert_array_equal(_locf_nonzero(values), np.array([
+            [0, 3, 3, 3, 2, 2],
+            [0, 0, 0, 0, 0, 0],
+            [5, 5, 1, 1, 1, 1],
+        ]))
+
+
+@override_settings(
+    REPORT_BUCKET_SOURCE='raw',
+    REPORT_USE_ACTIVITY_PRIORS=False,
+    REPORT_STREAM_PAGE_SIZE=0,
+    DB_PREPARED_STATEMENTS=False,
+)
+class ReportEngineAgreementTests(TestCase):
+    """The set-based engines must reproduce the per-store engine within rounding"""
+
+    NOW = utc(2023, 1, 25, 18, 13, 22)
+
+    @classmethod
+    def setUpTestData(cls):
+        fixtures = [
+            (None, None),
+            ('America/New_York', NINE_TO_FIVE),
+            ('Asia/Kolkata', OVERNIGHT),
+            ('America/Los_Angeles', [(time(8, 30), time(20, 15))] * 5 + [(time(10, 0), time(14, 0))] * 2),
+        ]
+        polls = []
+        for index, (timezone_str, hours) in enumerate(fixtures):
+            store = Store.objects.create()
+            if timezone_str:
+                StoreTimezone.objects.create(store=store, timezone_str=timezone_str)
+            for day, (start, end) in enumerate(hours or ()):
+                StoreBusinessHour.objects.create(store=store, day_of_week=day, start_time_local=start, end_time_local=end)
+            # Irregular polls over eight days, with a status pattern that differs per store
+            poll = cls.NOW - timedelta(days=8)
+            step = 0
+            while poll <= cls.NOW:
+                status = 'inactive' if (step * (index + 3)) % 7 < 2 else 'active'
+                polls.append(StoreStatus(store=store, timestamp_utc=poll, status=status))
+                poll += timedelta(minutes=47 + 11 * index)
+                step += 1
+        StoreStatus.objects.bulk_create(polls)
+
+    def _rows(self, engine):
+        from store_monitor.tasks import iter_report_rows
+        return {row[0]: row[1:] for row in iter_report_rows(self.NOW, engine)}
+
+    def _assert_agree(self, engine):
+        expected = self._rows('per_store')
+        actual = self._rows(engine)
+        self.assertEqual(set(actual), set(expected))
+        for store_id, values in expected.items():
+            uptime_hour, uptime_day, uptime_week, downtime_hour, downtime_day, downtime_week = values
+            got = actual[store_id]
+            with self.subTest(engine=engine, store_id=store_id):
+                # Last hour in minutes; day/week in whole hours after floor division
+                self.assertAlmostEqual(got[0], uptime_hour, delta=1)
+                self.assertAlmostEqual(got[3], downtime_hour, delta=1)
+                for got_hours, expected_hours in zip(
+                    (got[1], got[2], got[4], got[5]), (uptime_day, uptime_week, downtime_day, downtime_week),
+                ):
+                    self.assertAlmostEqual(got_hours, expected_hours, delta=1)
+
+    def test_bulk_matches_per_store(self):
+        self._assert_agree('bulk')
+
+    def test_vectorized_matches_per_store(self):
+        if np is None:
+            self.skipTest("numpy is not installed")
+        self._assert_agree('vectorized')
+
+
+@override_settings(
+    REPORT_BUCKET_SOURCE='raw',
+    REPORT_USE_ACTIVITY_PRIORS=False,
+    REPORT_SHARD_SIZE=0,
+    REPORT_MAX_CONCURRENT=0,
+    DB_PREPARED_STATEMENTS=False,
+)
+class ReportTaskTests(TestCase):
+
+    NOW = utc(2023, 1, 25, 18, 0)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        store = Store.objects.create()
+        StoreStatus.objects.bulk_create([
+            StoreStatus(store=store, timestamp_utc=self.NOW - timedelta(hours=hours), status='active')
+            for hours in range(0, 48, 3)
+        ])
+
+    def test_unsharded_report_saves_its_timings(self):
+        from store_monitor.tasks import generate_store_report_task
+
+        report = StoreReport.objects.create(status="pending", requested_at=self.NOW)
+        generate_store_report_task(report_id=str(report.id), now_utc=self.NOW, engine='bulk', report_format='csv')
+
+        report.refresh_from_db()
+        self.assertEqual(report.status, "completed")
+        self.assertTrue(report.report_file)
+        self.assertEqual(report.timings['stores'], 1)
+        self.assertIn('total', report.timings)
+
+
+class ReportReuseTests(TestCase):
+
+    def setUp(self):
+        # No one holds the single-flight lock
+        patcher = mock.patch('store_monitor.report_cache.get_redis')
+        patcher.start().return_value.get.return_value = None
+        self.addCleanup(patcher.stop)
+
+    def test_in_flight_report_is_reused_while_it_heartbeats(self):
+        from store_monitor.report_cache import find_reusable_report
+
+        report = StoreReport.objects.create(status="running", cache_key='a' * 64)
+        # Created long ago, but still sending heartbeats
+        StoreReport.objects.filter(id=report.id).update(
+            timestamp_utc=django_timezone.now() - timedelta(hours=2), heartbeat_at=django_timezone.now(),
+        )
+        self.assertEqual(find_reusable_report('a' * 64), report)
+
+    @override_settings(REPORT_LOCK_TTL=600)
+    def test_silent_report_is_not_reused(self):
+        from store_monitor.report_cache import find_reusable_report
+
+        report = StoreReport.objects.create(status="pending", cache_key='b' * 64)
+        StoreReport.objects.filter(id=report.id).update(heartbeat_at=django_timezone.now() - timedelta(minutes=11))
+        self.assertIsNone(find_reusable_report('b' * 64))
+
+    def test_backfilled_poll_changes_cache_key(self):
+        from store_monitor.ingest import copy_polls
+        from store_monitor.report_cache import get_data_watermark, get_ingest_version, report_cache_key
+
+        store = Store.objects.create()
+        now_utc = utc(2023, 1, 25, 18)
+
+        def ingest_and_key(timestamp_utc):
+            with transaction.atomic():
+                copy_polls(io.BytesIO(f"{store.id},{timestamp_utc.isoformat()},active\n".encode()))
+            return report_cache_key(now_utc, get_data_watermark(), None, get_ingest_version(now_utc))
+
+        before = ingest_and_key(utc(2023, 1, 25, 17))
+        # Older than the newest poll, so the watermark alone would not move
+        self.assertNotEqual(ingest_and_key(utc(2023, 1, 22, 3)), before)
+
+
+@mock.patch('store_monitor.report_jobs.holds_report_slot', return_value=False)
+@mock.patch('store_monitor.report_jobs.holds_report_lock', return_value=False)
+@mock.patch('store_monitor.report_jobs.request_report', return_value=('new', 'pending', True))
+@mock.patch('store_monitor.report_jobs.refresh_hourly_rollup')
+@override_settings(REPORT_LOCK_TTL=600)
+class PrewarmTests(TestCase):
+
+    def _in_flight(self, heartbeat_age):
+        report = StoreReport.objects.create(status="running", prewarmed=True, requested_at=django_timezone.now())
+        StoreReport.objects.filter(id=report.id).update(
+            timestamp_utc=django_timezone.now() - timedelta(hours=1),
+            heartbeat_at=django_timezone.now() - heartbeat_age,
+        )
+        return report
+
+    def test_old_but_live_run_is_kept(self, refresh, request_report, holds_lock, holds_slot):
+        from store_monitor.report_jobs import prewarm_latest_report
+
+        report = self._in_flight(timedelta(seconds=30))
+        self.assertIsNone(prewarm_latest_report())
+        report.refresh_from_db()
+        self.assertEqual(report.status, "running")
+        request_report.assert_not_called()
+
+    def test_run_holding_its_slot_is_kept(self, refresh, request_report, holds_lock, holds_slot):
+        from store_monitor.report_jobs import prewarm_latest_report
+
+        holds_slot.return_value = True
+        report = self._in_flight(timedelta(minutes=30))
+        self.assertIsNone(prewarm_latest_report())
+        report.refresh_from_db()
+        self.assertEqual(report.status, "running")
+
+    def test_dead_run_is_replaced(self, refresh, request_report, holds_lock, holds_slot):
+        from store_monitor.report_jobs import prewarm_latest_report
+
+        report = self._in_flight(timedelta(minutes=30))
+        self.assertEqual(prewarm_latest_report(), 'new')
+        report.refresh_from_db()
+        self.assertEqual(report.status, "failed: stale pre-warm run")
+
+
+class UptimeETagTests(TestCase):
+
+    def setUp(self):
+        self.store = Store.objects.create()
+        self.url = reverse('store_uptime', args=[self.store.id])
+        self.params = {'start': '2023-01-20T00:00:00Z', 'end': '2023-01-25T00:00:00Z'}
+        self._ingest(utc(2023, 1, 24, 12), 'active')
+
+    def _ingest(self, timestamp_utc, poll_status):
+        from store_monitor.ingest import copy_polls
+
+        with transaction.atomic():
+            copy_polls(io.BytesIO(f"{self.store.id},{timestamp_utc.isoformat()},{poll_status}\n".encode()))
+
+    def _etag(self):
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_unchanged_data_is_not_modified(self):
+        etag = self._etag()
+        response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_backfilled_poll_changes_etag(self):
+        etag = self._etag()
+        # Older than the store's newest poll, inside the window
+        self._ingest(utc(2023, 1, 21, 9), 'inactive')
+        self.assertNotEqual(self._etag(), etag)
+
+    def test_business_hours_edit_changes_etag(self):
+        etag = self._etag()
+        StoreBusinessHour.objects.create(
+            store=self.store, day_of_week=0, start_time_local=time(9, 0), end_time_local=time(17, 0),
+        )
+        self.assertNotEqual(self._etag(), etag)
+
+
+class ReportFormatTests(SimpleTestCase):
+
+    @override_settings(REPORT_FORMAT='csv.gz')
+    def test_defaults_to_the_report_format_setting(self):
+        from store_monitor.report_writer import validate_report_format
+        self.assertEqual(validate_report_format(None), 'csv.gz')
+
+    def test_rejects_unknown_formats(self):
+        from store_monitor.report_writer import validate_report_format
+        with self.assertRaisesMessage(ValueError, "format must be one of"):
+            validate_report_format('xlsx')
+
+    def test_rejects_parquet_without_pyarrow(self):
+        from store_monitor.report_writer import validate_report_format
+        with mock.patch('importlib.util.find_spec', return_value=None):
+            with self.assertRaisesMessage(ValueError, "needs pyarrow"):
+                validate_report_format('parquet')
+        with override_settings(REPORT_FORMAT='parquet'), mock.patch('importlib.util.find_spec', return_value=None):
+            with self.assertRaisesMessage(ValueError, "needs pyarrow"):
+                validate_report_format(None)
+
+
+class BucketGridTests(SimpleTestCase):
+
+    STORES = ['00000000-0000-0000-0000-000000000001', '00000000-0000-0000-0000-000000000002']
+    NOW = utc(2023, 1, 25, 18, 13)
+
+    def _grid(self, now_utc, store_ids=STORES):
+        from store_monitor.incremental import BucketGrid
+        return BucketGrid.spanning(now_utc - timedelta(days=7), now_utc, store_ids)
+
+    def test_copy_shifts_buckets_to_the_new_grid(self):
+        from store_monitor.utils import BUCKET_SIZE
+
+        previous = self._grid(self.NOW)
+        bucket = previous.grid_start + 5 * BUCKET_SIZE
+        previous.fill([(self.STORES[0], bucket, 4, 1), (self.STORES[1], previous.grid_start, 2, 2)])
+
+        # Three buckets later, for a fleet that lost store 2 and gained store 3
+        later = self.NOW + 3 * BUCKET_SIZE
+        current = self._grid(later, [self.STORES[0], '00000000-0000-0000-0000-000000000003'])
+        current.copy_from(previous, current.grid_start + BUCKET_SIZE, previous.grid_end)
+        self.assertEqual(current.grid_start, previous.grid_start + 3 * BUCKET_SIZE)
+        self.assertEqual(current.buckets(self.STORES[0]), {bucket: (4, 1)})
+        self.assertEqual(current.buckets('00000000-0000-0000-0000-000000000003'), {})
+        # Buckets that slid out of the week are dropped
+        self.assertEqual(current.buckets(self.STORES[1]), {})
+
+    def test_fill_skips_unknown_stores_and_buckets_outside_the_grid(self):
+        grid = self._grid(self.NOW)
+        grid.fill([
+            ('00000000-0000-0000-0000-000000000009', grid.grid_start, 1, 0),
+            (self.STORES[0], grid.grid_end, 1, 0),
+            (self.STORES[0], grid.grid_start - timedelta(hours=2), 1, 0),
+        ])
+        self.assertEqual(grid.buckets(self.STORES[0]), {})
+        self.assertEqual(sum(grid.active), 0)
+
+    def test_window_counts_use_the_head_for_the_first_bucket(self):
+        from store_monitor.incremental import WindowCounts
+        from store_monitor.utils import BUCKET_SIZE, floor_bucket
+
+        grid = self._grid(self.NOW)
+        day_start = self.NOW - timedelta(days=1)
+        first = floor_bucket(day_start)
+        grid.fill([(self.STORES[0], first, 9, 9), (self.STORES[0], first + BUCKET_SIZE, 3, 0)])
+        window = WindowCounts(grid, {self.STORES[0]: {first: (1, 1)}}, day_start)
+        self.assertEqual(window.get(self.STORES[0], {}), {first: (1, 1), first + BUCKET_SIZE: (3, 0)})
+
+    def test_state_round_trip(self):
+        from store_monitor.incremental import load_state, save_state
+
+        grid = self._grid(self.NOW)
+        grid.fill([(self.STORES[0], grid.grid_start, 7, 1), (self.STORES[1], grid.grid_end - timedelta(hours=2), 0, 5)])
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media_root):
+            save_state(self.NOW, self.NOW, grid)
+            state = load_state()
+        self.assertEqual(state['now_utc'], self.NOW)
+        self.assertEqual(state['grid'].grid_start, grid.grid_start)
+        self.assertEqual(state['grid'].store_ids, grid.store_ids)
+        self.assertEqual(state['grid'].active, grid.active)
+        self.assertEqual(state['grid'].inactive, grid.inactive)
+
+
+@override_settings(
+    REPORT_BUCKET_SOURCE='raw',
+    REPORT_USE_ACTIVITY_PRIORS=False,
+    REPORT_STREAM_PAGE_SIZE=0,
+    REPORT_INCREMENTAL_MAX_DELTA=timedelta(hours=24),
+    DB_PREPARED_STATEMENTS=False,
+)
+class IncrementalEngineTests(TransactionTestCase):
+    """Consecutive incremental runs must match the bulk engine; real commits, so the rollup's NOW() moves"""
+
+    NOW = utc(2023, 1, 25, 18, 13, 22)
+    LATER = NOW + timedelta(hours=5, minutes=21)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.stores = []
+        for index, (timezone_str, hours) in enumerate([('America/New_York', NINE_TO_FIVE), ('Asia/Kolkata', OVERNIGHT)]):
+            store = Store.objects.create()
+            StoreTimezone.objects.create(store=store, timezone_str=timezone_str)
+            for day, (start, end) in enumerate(hours):
+                StoreBusinessHour.objects.create(store=store, day_of_week=day, start_time_local=start, end_time_local=end)
+            self.stores.append(store)
+        self._add_polls(self.NOW - timedelta(days=8), self.NOW)
+
+    def _add_polls(self, start_utc, end_utc):
+        from store_monitor.rollup import refresh_hourly_rollup
+
+        polls = []
+        for index, store in enumerate(self.stores):
+            poll, step = start_utc, 0
+            while poll <= end_utc:
+                status = 'inactive' if (step * (index + 3)) % 7 < 2 else 'active'
+                polls.append(StoreStatus(store=store, timestamp_utc=poll, status=status))
+                poll += timedelta(minutes=53 + 7 * index)
+                step += 1
+        StoreStatus.objects.bulk_create(polls, ignore_conflicts=True)
+        refresh_hourly_rollup()
+
+    def _assert_matches_bulk(self, now_utc):
+        from store_monitor.tasks import iter_report_rows
+
+        expected = {row[0]: row[1:] for row in iter_report_rows(now_utc, 'bulk')}
+        actual = {row[0]: row[1:] for row in iter_report_rows(now_utc, 'incremental')}
+        self.assertEqual(set(actual), set(expected))
+        for store_id, values in expected.items():
+            for got, want in zip(actual[store_id], values):
+                self.assertAlmostEqual(got, want, places=2)
+
+    def test_second_run_reuses_state_and_matches_bulk(self):
+        from store_monitor.incremental import load_state
+
+        with self.assertLogs('store_monitor.incremental', 'INFO') as logs:
+            self._assert_matches_bulk(self.NOW)
+        self.assertIn('no previous state', logs.output[0])
+        self.assertEqual(load_state()['now_utc'], self.NOW)
+
+        self._add_polls(self.NOW + timedelta(minutes=1), self.LATER)
+        with self.assertNoLogs('store_monitor.incremental', 'INFO'):
+            self._assert_matches_bulk(self.LATER)
+
+    def test_late_poll_in_a_reused_bucket_forces_a_full_run(self):
+        from store_monitor.ingest import copy_polls
+        from store_monitor.rollup import refresh_hourly_rollup
+
+        self._assert_matches_bulk(self.NOW)
+        # Through the ingestion path, which refreshes the rollup for the hours it touches
+        late_poll = self.NOW - timedelta(days=2, minutes=7)
+        with transaction.atomic():
+            _, dirty_hours = copy_polls(io.BytesIO(f"{self.stores[0].id},{late_poll.isoformat()},inactive\n".encode()))
+        refresh_hourly_rollup(hours=dirty_hours)
+        self._add_polls(self.NOW + timedelta(minutes=1), self.LATER)
+        with self.assertLogs('store_monitor.incremental', 'INFO') as logs:
+            self._assert_matches_bulk(self.LATER)
+        self.assertIn('late data', logs.output[0])
+
+
+@override_settings(
+    REPORT_USE_ACTIVITY_PRIORS=False,
+    REPORT_INTERVAL_MAX_GAP=timedelta(minutes=120),
+)
+class StateIntervalsTests(TestCase):
+    """Exact durations from the intervals engine for a store open 22:00-06:00 UTC"""
+
+    NOW = utc(2023, 1, 25, 3)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.store = Store.objects.create()
+        StoreTimezone.objects.create(store=cls.store, timezone_str='UTC')
+        for day in range(7):
+            StoreBusinessHour.objects.create(
+                store=cls.store, day_of_week=day, start_time_local=time(22, 0), end_time_local=time(6, 0),
+            )
+        StoreStatus.objects.bulk_create([
+            StoreStatus(store=cls.store, timestamp_utc=timestamp_utc, status=poll_status)
+            for timestamp_utc, poll_status in [
+                # Before the week window, but its status holds into it until 04:00
+                (utc(2023, 1, 18, 2), 'inactive'),
+                (utc(2023, 1, 24, 22), 'active'),
+                (utc(2023, 1, 24, 23), 'inactive'),
+                # Holds only until 02:00: the next poll is more than REPORT_INTERVAL_MAX_GAP later
+                (utc(2023, 1, 25, 0), 'active'),
+                (utc(2023, 1, 25, 2, 30), 'active'),
+            ]
+        ])
+
+    def _metrics(self):
+        from store_monitor.report_engine import StoreScope
+        from store_monitor.state_intervals import compute_interval_metrics
+
+        rows = list(compute_interval_metrics(self.NOW, StoreScope()))
+        self.assertEqual(len(rows), 1)
+        store_id, last_hour, last_day, last_week = rows[0]
+        self.assertEqual(str(store_id), str(self.store.id))
+        return last_hour, last_day, last_week
+
+    def test_last_hour(self):
+        last_hour, _, _ = self._metrics()
+        # 30 active minutes, and the uncovered 02:00-02:30 counts as half up
+        self.assertAlmostEqual(last_hour['uptime_last_hour'], 45)
+        self.assertAlmostEqual(last_hour['downtime_last_hour'], 15)
+
+    def test_last_day_spans_the_overnight_slot(self):
+        _, last_day, _ = self._metrics()
+        # Open 03:00-06:00 and 22:00-03:00: 210 active, 60 inactive and 210 uncovered minutes
+        self.assertEqual(last_day['total_possible_hours'], 8)
+        self.assertEqual(last_day['uptime_hours'], 5)
+        self.assertEqual(last_day['downtime_hours'], 2)
+        self.assertAlmostEqual(last_day['uptime_percent'], 315 / 480 * 100)
+
+    def test_last_week(self):
+        _, _, last_week = self._metrics()
+        # 56 open hours; 210 active and 120 inactive minutes (60 of them from the poll before the window)
+        self.assertEqual(last_week['total_possible_hours'], 56)
+        self.assertEqual(last_week['uptime_hours'], 28)
+        self.assertEqual(last_week['downtime_hours'], 27)
+        self.assertAlmostEqual(last_week['uptime_percent'], 1725 / 3360 * 100)
+
+
+class IngestStatusCommandTests(TestCase):
+
+    STORES = 20
+    ROWS = 40000  # a little over 2 MB, so --batch-mb 1 makes three batches
+    DUPLICATED = 100
+
+    def setUp(self):
+        self.stores = [str(uuid.uuid4()) for _ in range(self.STORES)]
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.csv_path = os.path.join(directory, 'store_status.csv')
+        lines = ['store_id,timestamp_utc,status']
+        for index in range(self.ROWS):
+            lines.append(self._line(index, 'active'))
+            if index < self.DUPLICATED:
+                # Duplicate within the batch
+                lines.append(self._line(index, 'active'))
+        # Re-sent in a later batch with a new status, which replaces the stored one
+        lines.extend(self._line(index, 'inactive') for index in range(self.DUPLICATED))
+        with open(self.csv_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def _line(self, index, poll_status):
+        timestamp_utc = utc(2023, 1, 1) + timedelta(minutes=index // self.STORES)
+        return f"{self.stores[index % self.STORES]},{timestamp_utc.isoformat()},{poll_status}"
+
+    def _saved_offset(self):
+        with open(f"{self.csv_path}.offset") as f:
+            return int(f.read())
+
+    def _ingest(self):
+        call_command('ingest_status', self.csv_path, '--batch-mb', '1', '--skip-rollup', stdout=io.StringIO())
+
+    def test_interrupted_load_resumes_from_the_saved_offset(self):
+        from store_monitor.ingest import copy_polls
+
+        calls = []
+
+        def fail_second_batch(csv_file):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError("worker killed")
+            return copy_polls(csv_file)
+
+        with mock.patch('store_monitor.management.commands.ingest_status.copy_polls', fail_second_batch):
+            with self.assertRaises(RuntimeError):
+                self._ingest()
+        first_batch = StoreStatus.objects.count()
+        self.assertTrue(0 < first_batch < self.ROWS)
+        self.assertGreater(self._saved_offset(), 0)
+
+        self._ingest()
+        self.assertEqual(StoreStatus.objects.count(), self.ROWS)
+        self.assertEqual(Store.objects.count(), self.STORES)
+        self.assertEqual(StoreStatus.objects.filter(status='inactive').count(), self.DUPLICATED)
+        self.assertEqual(self._saved_offset(), os.path.getsize(self.csv_path))
+
+
+class StatusBufferTests(TestCase):
+    """Against the configured Redis, under a key of its own"""
+
+    def setUp(self):
+        from store_monitor.redis_client import get_redis
+
+        self.redis = get_redis()
+        suffix = uuid.uuid4().hex
+        for name in ('STATUS_BUFFER_KEY', 'FLUSH_LOCK_KEY'):
+            patcher = mock.patch(f'store_monitor.buffer.{name}', f'test:{name}:{suffix}')
+            self.addCleanup(self.redis.delete, patcher.start())
+            self.addCleanup(patcher.stop)
+        # The realtime counters are covered on their own
+        patcher = mock.patch('store_monitor.buffer.record_polls')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.store = Store.objects.create()
+
+    def _buffered(self):
+        from store_monitor import buffer
+        return self.redis.lrange(buffer.STATUS_BUFFER_KEY, 0, -1)
+
+    def test_view_accepts_ndjson_and_reports_rejected_polls(self):
+        body = "\n".join([
+            json.dumps({"store_id": str(self.store.id), "timestamp_utc": "2023-01-25 10:00:00 UTC", "status": "Active"}),
+            json.dumps({"store_id": str(self.store.id), "timestamp_utc": "2023-01-25T10:05:00", "status": "sleeping"}),
+            json.dumps({"store_id": str(self.store.id), "status": "inactive"}),
+        ])
+        response = self.client.post(
+            reverse('status_batch'), body, content_type='application/x-ndjson; charset=utf-8',
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['accepted'], 1)
+        self.assertEqual([error['index'] for error in response.json()['rejected']], [1, 2])
+        self.assertEqual(self._buffered(), [f"{self.store.id},2023-01-25T10:00:00+00:00,active".encode()])
+
+    def test_view_rejects_a_body_that_is_not_an_array(self):
+        response = self.client.post(reverse('status_batch'), {"store_id": "x"}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_flush_writes_batches_and_empties_the_buffer(self):
+        from store_monitor.buffer import buffer_polls, flush_status_buffer
+
+        buffer_polls([f"{self.store.id},2023-01-25T10:{minute:02d}:00+00:00,active" for minute in range(5)])
+        with mock.patch('store_monitor.buffer.refresh_hourly_rollup'):
+            self.assertEqual(flush_status_buffer(batch_size=2, max_batches=10), 5)
+        self.assertEqual(StoreStatus.objects.filter(store=self.store).count(), 5)
+        self.assertEqual(self._buffered(), [])
+
+    def test_failed_batch_stays_in_the_buffer(self):
+        from store_monitor.buffer import buffer_polls, flush_status_buffer
+
+        lines = [f"{self.store.id},2023-01-25T11:{minute:02d}:00+00:00,inactive" for minute in range(3)]
+        buffer_polls(lines)
+        # Dies after the COPY, before the commit
+        with mock.patch('store_monitor.buffer.refresh_hourly_rollup', side_effect=RuntimeError("worker killed")):
+            with self.assertRaises(RuntimeError):
+                flush_status_buffer()
+        self.assertEqual(self._buffered(), [line.encode() for line in lines])
+
+        with mock.patch('store_monitor.buffer.refresh_hourly_rollup'):
+            self.assertEqual(flush_status_buffer(), 3)
+        self.assertEqual(StoreStatus.objects.filter(store=self.store).count(), 3)
+
+
+class RealtimeCalendarTests(SimpleTestCase):
+
+    def test_overnight_sunday_slot_wraps_to_monday(self):
+        from store_monitor.realtime import MINUTES_PER_DAY, MINUTES_PER_WEEK, calendar_intervals
+
+        intervals = calendar_intervals([(time(9, 0), time(17, 0))] * 6 + [(time(22, 0), time(2, 0))])
+        self.assertEqual(intervals[0], [0, 120])
+        self.assertEqual(intervals[-1], [6 * MINUTES_PER_DAY + 22 * 60, MINUTES_PER_WEEK])
+
+    def test_business_minutes_across_the_week_boundary(self):
+        from store_monitor.realtime import business_minutes, calendar_intervals
+
+        intervals = calendar_intervals([(time(0, 0), time(1, 0))] * 7)
+        # Sunday 23:30 for 90 minutes reaches Monday 00:00-01:00
+        self.assertEqual(business_minutes(intervals, datetime(2023, 1, 29, 23, 30), 90), 60)
+
+    def test_hourly_uptime_carries_the_last_share(self):
+        from store_monitor.realtime import iter_hourly_uptime
+
+        start = utc(2023, 1, 23)
+        epoch_hour = int(start.timestamp()) // 3600
+        rows = list(iter_hourly_uptime([[0, 7 * 24 * 60]], pytz.utc, {epoch_hour + 1: (3, 1)}, start, start + timedelta(hours=3)))
+        # 0.5 before the first observed hour, then 3/4 carried into the empty third hour
+        self.assertEqual([uptime for _, _, uptime, _ in rows], [30, 45, 45])
+
+
+class RealtimeCountersTests(TestCase):
+    """Against the configured Redis, under a key prefix of its own"""
+
+    NOW = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+
+    def setUp(self):
+        from store_monitor import realtime
+        from store_monitor.redis_client import get_redis
+
+        self.redis = get_redis()
+        prefix = f'test:rt:{uuid.uuid4().hex}:'
+        patcher = mock.patch.object(realtime, 'KEY_PREFIX', prefix)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(lambda: self.redis.delete(*(self.redis.keys(f'{prefix}*') or ['-'])))
+        # Open all day, in UTC
+        self.store = Store.objects.create()
+        StoreTimezone.objects.create(store=self.store, timezone_str='UTC')
+        for day in range(7):
+            StoreBusinessHour.objects.create(
+                store=self.store, day_of_week=day, start_time_local=time(0, 0), end_time_local=time(0, 0),
+            )
+
+    def _line(self, timestamp_utc, poll_status):
+        return f"{self.store.id},{timestamp_utc.isoformat()},{poll_status}"
+
+    def test_resent_poll_is_counted_once(self):
+        from store_monitor.realtime import read_store_uptime, record_polls
+
+        polls = [self._line(self.NOW - timedelta(minutes=10), 'active'), self._line(self.NOW - timedelta(minutes=5), 'inactive')]
+        record_polls(polls)
+        record_polls(polls[:1])
+        uptime = read_store_uptime(self.store.id, self.NOW)
+        self.assertEqual(uptime['uptime_last_hour'], 30)
+        self.assertEqual(uptime['downtime_last_hour'], 30)
+
+    def test_ring_slot_is_reset_when_the_ring_wraps(self):
+        from store_monitor.realtime import MINUTE_SLOTS, _keys, _parse_ring, record_polls
+
+        poll = self.NOW - timedelta(hours=2)
+        record_polls([self._line(poll, 'inactive')])
+        # Same minute slot one ring later
+        record_polls([self._line(poll + timedelta(minutes=MINUTE_SLOTS), 'active')])
+        # An older period for a slot that has moved on is ignored
+        record_polls([self._line(poll - timedelta(minutes=MINUTE_SLOTS), 'inactive')])
+        minutes = _parse_ring(self.redis.hgetall(_keys(self.store.id)[1]))
+        self.assertEqual(minutes, {int(poll.timestamp()) // 60 + MINUTE_SLOTS: (1, 0)})
+
+    def test_rings_expire_after_the_week(self):
+        from store_monitor.realtime import RING_TTL, _keys, _seen_key, record_polls
+
+        record_polls([self._line(self.NOW - timedelta(minutes=1), 'active')])
+        _, minute_key, hour_key = _keys(self.store.id)
+        for key in (minute_key, hour_key, _seen_key(self.store.id)):
+            self.assertGreater(self.redis.ttl(key), RING_TTL - 60)
+
+    def test_polls_older_than_the_week_are_skipped(self):
+        from store_monitor.realtime import record_polls
+
+        self.assertEqual(record_polls([self._line(self.NOW - timedelta(days=8), 'active')]), 0)
+
+
+class ReportWaitTests(TestCase):
+
+    def _url(self, name, report):
+        return reverse(name, args=[report.id])
+
+    def test_wsgi_long_poll_reads_the_row_without_the_hub(self):
+        report = StoreReport.objects.create(status="running")
+        with mock.patch('store_monitor.views.report_async_view.hub') as hub:
+            response = self.client.get(self._url('get_report_async', report), {'wait': '0.2'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], "running")
+        hub.listen.assert_not_called()
+
+    def test_unknown_report_is_not_found(self):
+        response = self.client.get(reverse('get_report_async', args=[uuid.uuid4()]), {'wait': '0.2'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_wsgi_events_are_refused(self):
+        report = StoreReport.objects.create(status="running")
+        self.assertEqual(self.client.get(self._url('report_events', report)).status_code, 501)
+
+    async def test_asgi_long_poll_returns_once_the_report_completes(self):
+        from store_monitor.report_events import publish_report_event
+
+        report = await StoreReport.objects.acreate(status="running")
+
+        async def complete():
+            await asyncio.sleep(0.3)
+            await StoreReport.objects.filter(id=report.id).aupdate(status="completed", report_file='reports/x.csv')
+            await sync_to_async(publish_report_event)(report.id, "completed", status="completed")
+
+        completing = asyncio.create_task(complete())
+        started = time_module.monotonic()
+        response = await self.async_client.get(self._url('get_report_async', report), {'wait': '10'})
+        await completing
+        self.assertEqual(response.json()['status'], "completed")
+        self.assertLess(time_module.monotonic() - started, 5)
+
+    async def test_asgi_events_end_with_the_completed_report(self):
+        report = await StoreReport.objects.acreate(status="completed", report_file='reports/x.csv')
+        response = await self.async_client.get(self._url('report_events', report))
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertTrue(body.startswith("event: completed\n"))
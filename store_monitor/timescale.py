@@ -0,0 +1,155 @@
+"""
+TimescaleDB storage layout for store_monitor_storestatus.
+
+The poll table becomes a hypertable chunked by timestamp_utc (TIMESCALE_CHUNK_INTERVAL).
+A (store_id, timestamp_utc DESC) index that also carries status lets the per-store
+range scans of the report and uptime queries run index-only. Chunks older than
+TIMESCALE_COMPRESS_AFTER are compressed natively, segmented by store_id and ordered by
+time, so one store's polls in a compressed chunk are read as a few column batches.
+
+Every step is idempotent. Migration 0013 applies a frozen copy with the default settings;
+`python manage.py setup_timescale` applies this version with the current ones. Databases
+without the timescaledb extension are left unchanged.
+"""
+import logging
+
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'store_monitor_storestatus'
+STORE_TIME_INDEX = 'storestatus_store_time_idx'
+# Model index on store_id alone; the leading column of STORE_TIME_INDEX serves its queries
+REDUNDANT_STORE_INDEX = 'store_monit_store_i_68b46f_idx'
+
+# Unique indexes of a hypertable must include the time column, so the serial id primary
+# key is dropped (the column stays). (store_id, timestamp_utc) remains unique.
+DROP_ID_PRIMARY_KEY = f"""
+    DO $$
+    DECLARE
+        pk_name text;
+    BEGIN
+        SELECT c.conname INTO pk_name
+        FROM pg_constraint c
+        WHERE c.conrelid = '{TABLE}'::regclass
+          AND c.contype = 'p'
+          AND NOT EXISTS (
+              SELECT 1 FROM pg_attribute a
+              WHERE a.attrelid = c.conrelid AND a.attnum = ANY(c.conkey) AND a.attname = 'timestamp_utc'
+          );
+        IF pk_name IS NOT NULL THEN
+            EXECUTE format('ALTER TABLE {TABLE} DROP CONSTRAINT %I', pk_name);
+        END IF;
+    END
+    $$;
+"""
+
+CREATE_STORE_TIME_INDEX = f"""
+    CREATE INDEX IF NOT EXISTS {STORE_TIME_INDEX}
+    ON {TABLE} (store_id, timestamp_utc DESC) INCLUDE (status);
+"""
+
+
+def timescale_available(cursor):
+    cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'timescaledb'")
+    return cursor.fetchone() is not None
+
+
+def is_hypertable(cursor):
+    cursor.execute(
+        "SELECT 1 FROM timescaledb_information.hypertables WHERE hypertable_name = %s", [TABLE],
+    )
+    return cursor.fetchone() is not None
+
+
+def compression_enabled(cursor):
+    cursor.execute(
+        "SELECT compression_enabled FROM timescaledb_information.hypertables WHERE hypertable_name = %s",
+        [TABLE],
+    )
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def setup_timescale(connection, chunk_interval, compress_after=None):
+    """
+    Apply the storage layout through connection. compress_after=None leaves compression
+    off (and removes an existing policy; already compressed chunks stay compressed).
+    Returns the steps applied, or None when timescaledb is not available.
+    """
+    steps = []
+    with connection.cursor() as cursor:
+        if not timescale_available(cursor):
+            logger.warning("timescaledb extension not available; %s left as a plain table", TABLE)
+            return None
+        try:
+            # A savepoint, so a missing privilege does not abort the surrounding transaction
+            with transaction.atomic(using=connection.alias):
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS timescaledb")
+        except Exception:
+            logger.warning("Could not create the timescaledb extension; %s left as a plain table", TABLE,
+                           exc_info=True)
+            return None
+
+        if is_hypertable(cursor):
+            # Only chunks created from now on get the new interval
+            cursor.execute("SELECT set_chunk_time_interval(%s, %s)", [TABLE, chunk_interval])
+            steps.append('chunk_interval')
+        else:
+            cursor.execute(DROP_ID_PRIMARY_KEY)
+            # The model already indexes timestamp_utc, so the default time index is not created
+            cursor.execute(
+                "SELECT create_hypertable(%s, 'timestamp_utc', chunk_time_interval => %s, "
+                "migrate_data => TRUE, create_default_indexes => FALSE, if_not_exists => TRUE)",
+                [TABLE, chunk_interval],
+            )
+            steps.append('hypertable')
+
+        cursor.execute(CREATE_STORE_TIME_INDEX)
+        cursor.execute(f"DROP INDEX IF EXISTS {REDUNDANT_STORE_INDEX}")
+        steps.append('store_time_index')
+
+        cursor.execute("SELECT remove_compression_policy(%s, if_exists => TRUE)", [TABLE])
+        if compress_after:
+            if not compression_enabled(cursor):
+                cursor.execute(
+                    f"ALTER TABLE {TABLE} SET ("
+                    "timescaledb.compress, "
+                    "timescaledb.compress_segmentby = 'store_id', "
+                    "timescaledb.compress_orderby = 'timestamp_utc DESC')"
+                )
+                steps.append('compression')
+            cursor.execute("SELECT add_compression_policy(%s, %s)", [TABLE, compress_after])
+            steps.append('compression_policy')
+    return steps
+
+
+def compress_old_chunks(connection, compress_after):
+    """Compress the chunks the policy would, now instead of on its next run; returns how many"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT compress_chunk(c, if_not_compressed => TRUE) FROM show_chunks(%s, older_than => %s) c",
+            [TABLE, compress_after],
+        )
+        return len(cursor.fetchall())
+
+
+def storage_stats(connection):
+    """{'chunks', 'compressed_chunks', 'total_bytes', 'before_compression_bytes', 'after_compression_bytes'}"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT hypertable_size(%s)", [TABLE])
+        total_bytes = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT total_chunks, number_compressed_chunks, "
+            "before_compression_total_bytes, after_compression_total_bytes "
+            "FROM hypertable_compression_stats(%s)",
+            [TABLE],
+        )
+        chunks, compressed, before, after = cursor.fetchone() or (None, None, None, None)
+    return {
+        'chunks': chunks,
+        'compressed_chunks': compressed,
+        'total_bytes': total_bytes,
+        'before_compression_bytes': before,
+        'after_compression_bytes': after,
+    }
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import (test_view, report_view)
+from .views import (test_view, report_view, report_async_view, ingest_view, uptime_view, metrics_view)
 
 urlpatterns = [
     #TEST ROUTE
@@ -7,4 +7,16 @@ urlpatterns = [
     # STORE MONITOR REPORTS
     path('trigger_report', report_view.trigger_report, name='trigger_report'),
     path('get_report/<uuid:report_id>', report_view.get_report, name='get_report'),
+    path('get_report/<uuid:report_id>/arrow', report_view.get_report_arrow, name='get_report_arrow'),
+    path('report/<uuid:report_id>', report_view.cancel_report, name='cancel_report'),
+    # ASYNC REPORTS (long-poll and Server-Sent Events, served by an ASGI server)
+    path('async/trigger_report', report_async_view.trigger_report, name='trigger_report_async'),
+    path('async/get_report/<uuid:report_id>', report_async_view.get_report, name='get_report_async'),
+    path('get_report/<uuid:report_id>/events', report_async_view.report_events, name='report_events'),
+    # STATUS INGESTION
+    path('status/batch', ingest_view.status_batch, name='status_batch'),
+    # REALTIME STORE UPTIME
+    path('stores/<uuid:store_id>/uptime', uptime_view.store_uptime, name='store_uptime'),
+    # PROMETHEUS METRICS
+    path('metrics', metrics_view.metrics, name='metrics'),
 ]
\ No newline at end of file
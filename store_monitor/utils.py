@@ -1,16 +1,71 @@
-import os
-import django
 from datetime import datetime, timedelta, time, timezone
 import pytz
-import psycopg2
 from collections import defaultdict
+from django.conf import settings
 from django.db import connection as conn
 
+from store_monitor.business_calendar import WEEK, BusinessCalendar
+from store_monitor.db import execute_prepared
+from store_monitor.instrumentation import timed_phase
 from store_monitor.models import StoreTimezone, StoreBusinessHour , Store
 
 reference_monday = datetime(2000, 1, 3).date()
 
-reference_monday = datetime(2000, 1, 3).date()
+BUCKET_SIZE = timedelta(hours=2)
+DEFAULT_TIMEZONE = 'America/Chicago'
+
+def ensure_utc(value):
+    """Normalise a datetime (or ISO string, as Celery may deliver it) to an aware UTC datetime"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def floor_bucket(ts, size=BUCKET_SIZE):
+    """Start of the bucket containing ts, aligned like TimescaleDB's time_bucket"""
+    seconds = int(size.total_seconds())
+    epoch = int(ts.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % seconds, tz=timezone.utc)
+
+def gapfill_buckets(counts, start_utc, end_utc, size=BUCKET_SIZE):
+    """
+    Python equivalent of time_bucket_gapfill + locf(NULLIF(count, 0)) used by the
+    day/week queries. counts maps bucket start -> (count_active, count_inactive).
+    """
+    last_active = 0
+    last_inactive = 0
+    bucket = floor_bucket(start_utc, size)
+    while bucket < end_utc:
+        count_active, count_inactive = counts.get(bucket, (0, 0))
+        if count_active:
+            last_active = count_active
+        if count_inactive:
+            last_inactive = count_inactive
+        yield bucket, last_active, last_inactive
+        bucket += size
+
+def summarise_buckets(rows, calendar):
+    """Turn (bucket, count_active, count_inactive) rows into uptime/downtime hours against a BusinessCalendar"""
+    total_uptime_minutes = 0
+    total_possible_minutes = 0
+
+    for two_hour_bucket, count_active, count_inactive in rows:
+        overlap_minutes = round(calendar.overlap_minutes(two_hour_bucket, two_hour_bucket + BUCKET_SIZE))
+        if overlap_minutes:
+            total_possible_minutes += overlap_minutes
+            if(count_active + count_inactive) > 0:
+                total_uptime_minutes += (count_active)/(count_active + count_inactive) * overlap_minutes
+            else:
+                total_uptime_minutes += 0.5 * overlap_minutes # HERE INTERPOLATION BETTER LOGIC NEEDS TO BE ADDED
+
+    uptime_percent = (total_uptime_minutes / total_possible_minutes) * 100 if total_possible_minutes else 0
+    return {
+        "uptime_hours": total_uptime_minutes // 60,
+        "downtime_hours": (total_possible_minutes - total_uptime_minutes) // 60,
+        "uptime_percent": uptime_percent,
+        "total_possible_hours": total_possible_minutes // 60,
+    }
 
 def get_business_hours(store_id):
     business_hours = [(time(0, 0), time(23, 59)) for _ in range(7)]
@@ -20,25 +75,88 @@ def get_business_hours(store_id):
     
     return business_hours
 
-def is_within_business_hours(start_local, end_local, business_hours):
-    day = start_local.weekday()
+_timezones = {}
 
-    for bh_start, bh_end in business_hours:
-        bh_start_dt = datetime.combine(start_local.date(), bh_start, tzinfo=start_local.tzinfo)
-        bh_end_dt = datetime.combine(start_local.date(), bh_end, tzinfo=start_local.tzinfo)
+def get_timezone(tz_str):
+    """Interned pytz timezone, so every store in the same zone shares one object"""
+    local_tz = _timezones.get(tz_str)
+    if local_tz is None:
+        local_tz = _timezones[tz_str] = pytz.timezone(tz_str)
+    return local_tz
 
-        # Handle overnight shift (e.g. 22:00 to 06:00 next day)
-        if bh_end <= bh_start:
-            bh_end_dt += timedelta(days=1)
 
-        overlap_start = max(start_local, bh_start_dt)
-        overlap_end = min(end_local, bh_end_dt)
+class StoreMetadataIndex:
+    """
+    Business hours and timezones for a whole report run, loaded with two bulk
+    queries instead of one query per store per calculate_uptime_* call.
 
-        if overlap_start < overlap_end:
-            overlap_minutes = (overlap_end - overlap_start).total_seconds() / 60
-            return True, overlap_start.astimezone(pytz.utc), overlap_end.astimezone(pytz.utc), round(overlap_minutes)
+    Business hours are kept as 7-slot lists indexed by day_of_week; stores without
+    rows share a single default (always open) list.
+    """
+
+    DEFAULT_BUSINESS_HOURS = tuple((time(0, 0), time(23, 59)) for _ in range(7))
+
+    def __init__(self, business_hours, timezones):
+        self._business_hours = business_hours
+        self._timezones = timezones
+        self._calendars = {}
+
+    @classmethod
+    def load(cls, scope=None, store_ids=None):
+        """Load metadata for every store, or only the stores in a report StoreScope / id list"""
+        with timed_phase('metadata_load'):
+            return cls._load(scope, store_ids)
+
+    @classmethod
+    def _load(cls, scope, store_ids):
+        hours_qs = StoreBusinessHour.objects.all()
+        tz_qs = StoreTimezone.objects.all()
+        if scope is not None:
+            hours_qs = scope.filter_stores(hours_qs, 'store_id')
+            tz_qs = scope.filter_stores(tz_qs, 'store_id')
+        if store_ids is not None:
+            hours_qs = hours_qs.filter(store_id__in=store_ids)
+            tz_qs = tz_qs.filter(store_id__in=store_ids)
+
+        business_hours = {}
+        for store_id, day_of_week, start_local, end_local in hours_qs.values_list(
+            'store_id', 'day_of_week', 'start_time_local', 'end_time_local'
+        ).iterator():
+            slots = business_hours.get(store_id)
+            if slots is None:
+                slots = business_hours[store_id] = list(cls.DEFAULT_BUSINESS_HOURS)
+            slots[day_of_week] = (start_local, end_local)
+
+        timezones = {
+            store_id: get_timezone(tz_str)
+            for store_id, tz_str in tz_qs.values_list('store_id', 'timezone_str').iterator()
+        }
+        return cls(business_hours, timezones)
+
+    def business_hours(self, store_id):
+        return self._business_hours.get(store_id, self.DEFAULT_BUSINESS_HOURS)
+
+    def timezone(self, store_id):
+        return self._timezones.get(store_id) or get_timezone(DEFAULT_TIMEZONE)
+
+    def calendar(self, store_id, start_utc, end_utc):
+        """
+        BusinessCalendar covering [start_utc, end_utc), assembled from per-week calendars
+        compiled on first use. Stores with the same hours and timezone share them.
+        """
+        hours = tuple(self.business_hours(store_id))
+        local_tz = self.timezone(store_id)
+        weeks = []
+        week = floor_bucket(start_utc, WEEK)
+        while week < end_utc:
+            key = (hours, local_tz.zone, week)
+            calendar = self._calendars.get(key)
+            if calendar is None:
+                calendar = self._calendars[key] = BusinessCalendar.compile(hours, local_tz, week, week + WEEK)
+            weeks.append(calendar)
+            week += WEEK
+        return weeks[0] if len(weeks) == 1 else BusinessCalendar.concat(weeks)
 
-    return False, None, None, 0
 
 def historical_avg_status(store_id, local_dt, start_time, end_time, cursor):
     """
@@ -48,7 +166,7 @@ def historical_avg_status(store_id, local_dt, start_time, end_time, cursor):
     target_dow = (local_dt.weekday() + 1) % 7 
     local_dt_utc = local_dt.astimezone(timezone.utc)
 
-    cursor.execute("""
+    execute_prepared(cursor, """
         SELECT AVG(CASE WHEN status = 'active' THEN 1 ELSE 0 END)
         FROM store_monitor_storestatus
         WHERE store_id = %s
@@ -69,237 +187,176 @@ def historical_avg_status(store_id, local_dt, start_time, end_time, cursor):
     result = cursor.fetchone()
     return float(result[0]) if result and result[0] is not None else 0.5
 
-def get_max_possible_uptime(start_utc, end_utc, business_hours, local_tz):
+def activity_prior_slots(start_time_local):
+    """(day_of_week, hour) slots covering start_time_local +/- 1 hour, in local time"""
+    return [
+        (slot.weekday(), slot.hour)
+        for slot in (start_time_local + timedelta(hours=offset) for offset in (-1, 0, 1))
+    ]
+
+def prior_probability(priors, slots):
+    """Share of active polls over the given slots of a {(dow, hour): (active, inactive)} map"""
+    count_active = 0
+    count_total = 0
+    for slot in slots:
+        active, inactive = priors.get(slot, (0, 0))
+        count_active += active
+        count_total += active + inactive
+    return count_active / count_total if count_total else 0.5
+
+def lookup_activity_prior(store_id, start_time_local, cursor):
     """
-    Calculate maximum uptime in minutes between start_utc and end_utc
-    considering the business hours in the local time zone.
+    Indexed replacement for historical_avg_status: read the precomputed
+    StoreActivityPrior rows around start_time_local. Returns 0.5 without history.
     """
-    # Convert to local time
-    start_local = start_utc.astimezone(local_tz)
-    end_local = end_utc.astimezone(local_tz)
-
-    # Get business hours for that day
-    weekday = start_local.weekday()
-    business_start, business_end = business_hours[weekday]
-
-    # Construct datetime objects for business start and end on same day
-    business_start_dt = start_local.replace(hour=business_start.hour, minute=business_start.minute, second=0, microsecond=0)
-    business_end_dt = start_local.replace(hour=business_end.hour, minute=business_end.minute, second=0, microsecond=0)
-
-    if business_end <= business_start:
-        if start_local.time() < business_end:
-            business_start_dt -= timedelta(days=1)
-        business_end_dt += timedelta(days=1)
-
-    overlap_start = max(start_local, business_start_dt)
-    overlap_end = min(end_local, business_end_dt)
-    
-    if overlap_start < overlap_end:
-        delta = (overlap_end - overlap_start).total_seconds() / 60
-        return delta
-    return 0
-
-
-def calculate_uptime_last_hour(store_id, now_utc,local_tz):
-    cursor = conn.cursor()
-    
-    business_hours = get_business_hours(store_id)
+    slots = activity_prior_slots(start_time_local)
+    execute_prepared(cursor, """
+        SELECT day_of_week, hour, count_active, count_inactive
+        FROM store_monitor_storeactivityprior
+        WHERE store_id = %s
+          AND (day_of_week, hour) IN ((%s, %s), (%s, %s), (%s, %s));
+    """, [store_id, *(value for slot in slots for value in slot)])
+    priors = {(dow, hour): (active, inactive) for dow, hour, active, inactive in cursor.fetchall()}
+    return prior_probability(priors, slots)
+
+def load_activity_priors(store_ids, cursor):
+    """All StoreActivityPrior rows for store_ids in one query, as {store_id: {(dow, hour): counts}}"""
+    priors = defaultdict(dict)
+    if not store_ids:
+        return priors
+    cursor.execute("""
+        SELECT store_id, day_of_week, hour, count_active, count_inactive
+        FROM store_monitor_storeactivityprior
+        WHERE store_id = ANY(%s::uuid[]);
+    """, [[str(store_id) for store_id in store_ids]])
+    for store_id, dow, hour, active, inactive in cursor.fetchall():
+        priors[store_id][(dow, hour)] = (active, inactive)
+    return priors
+
+UPTIME_WINDOWS = {
+    'day': timedelta(days=1),
+    'week': timedelta(days=7),
+}
+
+def _window_count_columns(window_starts):
+    """Active/inactive COUNT FILTER columns counting only polls at or after each window start"""
+    columns = []
+    params = []
+    for window_start in window_starts:
+        columns.append(
+            "COUNT(*) FILTER (WHERE status = 'active' AND timestamp_utc >= %s),"
+            " COUNT(*) FILTER (WHERE status = 'inactive' AND timestamp_utc >= %s)"
+        )
+        params.extend([window_start, window_start])
+    return ",\n            ".join(columns), params
+
+def _last_hour_result(store_id, now_utc, local_tz, calendar, count_active, count_inactive, cursor):
     end_time_local = now_utc.astimezone(local_tz)
     start_time_local = end_time_local - timedelta(hours=1)
-    
     start_time_utc = start_time_local.astimezone(timezone.utc)
     end_time_utc = now_utc.astimezone(timezone.utc)
 
-    cursor.execute("""
-        SELECT *
-        FROM store_monitor_storestatus
-        WHERE store_id = %s
-        AND timestamp_utc BETWEEN %s AND %s
-        ORDER BY timestamp_utc;
-    """, [store_id, start_time_utc, end_time_utc])
-
-    rows = cursor.fetchall()
-    total_possible_uptime = get_max_possible_uptime(start_time_utc,end_time_utc,business_hours,local_tz)
-    if(len(rows) == 0):
+    total_possible_uptime = calendar.overlap_minutes(start_time_utc, end_time_utc)
+    if count_active + count_inactive == 0:
         start_range = (start_time_local - timedelta(hours=1)).time()
         end_range = (start_time_local + timedelta(hours=1)).time()
-        if start_range < end_range:
+        if settings.REPORT_USE_ACTIVITY_PRIORS:
+            prob = lookup_activity_prior(store_id, start_time_local, cursor)
+        elif start_range < end_range:
             prob = historical_avg_status(store_id, end_time_utc, start_range, end_range, cursor)
         else:
             # midnight: split into two queries and average
             prob1 = historical_avg_status(store_id, end_time_utc, start_range, time(23, 59, 59), cursor)
             prob2 = historical_avg_status(store_id, end_time_utc, time(0, 0, 0), end_range, cursor)
             prob = (prob1 + prob2) / 2
-        uptime = prob * total_possible_uptime
-        downtime = (1 - prob) * total_possible_uptime
-        cursor.close()
-        return {
-            "uptime_last_hour": uptime,
-            "downtime_last_hour": downtime,
-            "query_period_utc": f"{start_time_utc} to {end_time_utc}",
-            "query_period_local": f"{start_time_local} to {end_time_local}"
-        }
-    
-    active_duration = 0
-    inactive_duration = 0
-    for row in rows:
-        curr_datetime = row[0]
-        curr_status =row[1]
-        if(is_within_business_hours(curr_datetime.astimezone(local_tz),curr_datetime.astimezone(local_tz), business_hours)):
-            if(curr_status == 'active' ):
-                active_duration += 1
-            elif curr_status == 'inactive' :
-                inactive_duration += 1
-    
-    total_up_time = active_duration / (active_duration + inactive_duration) * total_possible_uptime if (active_duration + inactive_duration) > 0 else 0
-    total_down_time = inactive_duration / (active_duration + inactive_duration) * total_possible_uptime if (active_duration + inactive_duration) > 0 else 0
-    cursor.close()
+        total_up_time = prob * total_possible_uptime
+        total_down_time = (1 - prob) * total_possible_uptime
+    else:
+        total_up_time = count_active / (count_active + count_inactive) * total_possible_uptime
+        total_down_time = count_inactive / (count_active + count_inactive) * total_possible_uptime
+
     return {
         "uptime_last_hour": total_up_time,
         "downtime_last_hour": total_down_time,
         "query_period_utc": f"{start_time_utc} to {end_time_utc}",
         "query_period_local": f"{start_time_local} to {end_time_local}"
     }
-    
 
-def get_store_timezone_info(store_id):
+def calculate_uptime_windows(store_id, now_utc, local_tz, metadata=None, windows=None, include_hour=True):
+    """
+    Uptime of one store over the last hour and every window in windows
+    ({name: timedelta}, default UPTIME_WINDOWS) from a single scan of the widest window.
+    include_hour=False skips the last-hour result (and its historical fallback queries).
+
+    Polls are grouped into 2-hour buckets with one pair of count columns per window, so
+    each window's first bucket only counts polls from the window start on, exactly like
+    a separate gapfilled query per window. Returns {'hour': ..., <window name>: ...},
+    with 'hour' None when include_hour is False.
+    """
+    if windows is None:
+        windows = UPTIME_WINDOWS
+    window_starts = {name: now_utc - length for name, length in windows.items()}
+    scan_start = min([now_utc - timedelta(hours=1), *window_starts.values()])
+    # Whole buckets are summarised, so the calendar spans from the first bucket to the end of the last
+    calendar_start = floor_bucket(scan_start)
+    calendar_end = floor_bucket(now_utc) + BUCKET_SIZE
+    if metadata:
+        calendar = metadata.calendar(store_id, calendar_start, calendar_end)
+    else:
+        calendar = BusinessCalendar.compile(get_business_hours(store_id), local_tz, calendar_start, calendar_end)
+    columns, column_params = _window_count_columns([now_utc - timedelta(hours=1), *window_starts.values()])
+
+    with conn.cursor() as cursor:
+        # The SQL text only depends on the number of windows, so it is prepared once per connection
+        execute_prepared(cursor, f"""
+            SELECT
+                time_bucket('2 hours', timestamp_utc) AS two_hour_bucket,
+                {columns}
+            FROM store_monitor_storestatus
+            WHERE store_id = %s
+              AND timestamp_utc BETWEEN %s AND %s
+            GROUP BY two_hour_bucket
+            ORDER BY two_hour_bucket;
+        """, [*column_params, store_id, scan_start, now_utc])
+
+        hour_active = hour_inactive = 0
+        window_counts = {name: {} for name in windows}
+        for bucket, hour_a, hour_i, *counts in cursor.fetchall():
+            hour_active += hour_a
+            hour_inactive += hour_i
+            for index, name in enumerate(windows):
+                count_active, count_inactive = counts[2 * index], counts[2 * index + 1]
+                if count_active or count_inactive:
+                    window_counts[name][bucket] = (count_active, count_inactive)
+
+        results = {'hour': None}
+        if include_hour:
+            results['hour'] = _last_hour_result(
+                store_id, now_utc, local_tz, calendar, hour_active, hour_inactive, cursor,
+            )
+
+    for name, window_start in window_starts.items():
+        rows = gapfill_buckets(window_counts[name], window_start, now_utc)
+        results[name] = summarise_buckets(rows, calendar)
+    return results
+
+def calculate_uptime_last_hour(store_id, now_utc, local_tz, metadata=None):
+    return calculate_uptime_windows(store_id, now_utc, local_tz, metadata, windows={})['hour']
+
+
+def get_store_timezone_info(store_id, metadata=None):
     """Helper function to get timezone information for a store"""
+    if metadata:
+        local_tz = metadata.timezone(store_id)
+        return local_tz.zone, local_tz
     tz_obj = StoreTimezone.objects.filter(store_id=store_id).first()
-    tz_str = tz_obj.timezone_str if tz_obj else 'America/Chicago'
-    local_tz = pytz.timezone(tz_str)
+    tz_str = tz_obj.timezone_str if tz_obj else DEFAULT_TIMEZONE
+    local_tz = get_timezone(tz_str)
     return tz_str, local_tz
 
-def calculate_uptime_last_day(store_id, now_utc,local_tz):
-    start_time_utc = now_utc - timedelta(days=1)
-    end_time_utc = now_utc
-    cursor = conn.cursor()
-    
-    business_hours = get_business_hours(store_id)
-    # Convert UTC to local timezone
-    end_time_local = end_time_utc.astimezone(local_tz)
-    start_time_local = end_time_local - timedelta(days=7)
-
-    total_uptime_minutes = 0
-    total_possible_minutes = 0
-    
-    query = """
-    WITH raw AS (
-    SELECT
-        time_bucket_gapfill(
-        '2 hours', 
-        timestamp_utc,
-        start => %s,
-        finish => %s
-        ) AS two_hour_bucket,
-        COUNT(CASE WHEN status = 'active' THEN 1 END) AS count_active,
-        COUNT(CASE WHEN status = 'inactive' THEN 1 END) AS count_inactive
-    FROM store_monitor_storestatus
-    WHERE store_id = %s
-        AND timestamp_utc BETWEEN %s AND %s
-    GROUP BY two_hour_bucket
-    )
-    SELECT
-    two_hour_bucket,
-    COALESCE(locf(NULLIF(count_active, 0)), 0) AS count_active,
-    COALESCE(locf(NULLIF(count_inactive, 0)), 0) AS count_inactive
-    FROM raw
-    ORDER BY two_hour_bucket;
-    """
-
-    cursor.execute(query, [start_time_utc, end_time_utc, store_id, start_time_utc, end_time_utc])
-    current_interval_rows = cursor.fetchall()
-
-    for row in current_interval_rows:
-        two_hour_bucket, count_active, count_inactive = row
-        hour_start_utc = two_hour_bucket
-        hour_end_utc = two_hour_bucket + timedelta(hours=2) - timedelta(seconds=1)
-            
-        hour_start_local = hour_start_utc.astimezone(local_tz)
-        hour_end_local = hour_end_utc.astimezone(local_tz)
-
-        flag , start_bucket_utc, end_bucket_utc, overlap_minutes = is_within_business_hours(hour_start_local, hour_end_local, business_hours)
-        if flag:
-            # print(f"[DEBUG] Within business hours: {start_bucket_utc} to {end_bucket_utc}, overlap_minutes: {overlap_minutes}")
-            total_possible_minutes += overlap_minutes
-            if(count_active + count_inactive) > 0:
-                total_uptime_minutes += (count_active)/(count_active + count_inactive) * overlap_minutes
-            else:
-                total_uptime_minutes += 0.5 * overlap_minutes # HERE INTERPOLATION BETTER LOGIC NEEDS TO BE ADDED
-            
-    cursor.close()
-    uptime_percent = (total_uptime_minutes / total_possible_minutes) * 100 if total_possible_minutes else 0
-    return {
-        "uptime_hours": total_uptime_minutes // 60,
-        "downtime_hours": (total_possible_minutes - total_uptime_minutes) // 60,
-        "uptime_percent": uptime_percent,
-        "total_possible_hours": total_possible_minutes // 60,
-    }
-
-
-
-def calculate_uptime_last_week(store_id, now_utc, local_tz):
-    start_time_utc = now_utc - timedelta(days=7)
-    end_time_utc = now_utc
-    cursor = conn.cursor()
-
-    business_hours = get_business_hours(store_id)
-
-    # Convert UTC to local timezone
-    end_time_local = now_utc.astimezone(local_tz)
-    start_time_local = end_time_local - timedelta(days=7)
-
-    total_uptime_minutes = 0
-    total_possible_minutes = 0
-    
-    query = """
-    WITH raw AS (
-    SELECT
-        time_bucket_gapfill(
-        '2 hours', 
-        timestamp_utc,
-        start => %s,
-        finish => %s
-        ) AS two_hour_bucket,
-        COUNT(CASE WHEN status = 'active' THEN 1 END) AS count_active,
-        COUNT(CASE WHEN status = 'inactive' THEN 1 END) AS count_inactive
-    FROM store_monitor_storestatus
-    WHERE store_id = %s
-        AND timestamp_utc BETWEEN %s AND %s
-    GROUP BY two_hour_bucket
-    )
-    SELECT
-    two_hour_bucket,
-    COALESCE(locf(NULLIF(count_active, 0)), 0) AS count_active,
-    COALESCE(locf(NULLIF(count_inactive, 0)), 0) AS count_inactive
-    FROM raw
-    ORDER BY two_hour_bucket;
-    """
-
-    cursor.execute(query, [start_time_utc, end_time_utc, store_id, start_time_utc, end_time_utc])
-    current_interval_rows = cursor.fetchall()
+def calculate_uptime_last_day(store_id, now_utc, local_tz, metadata=None):
+    return calculate_uptime_windows(store_id, now_utc, local_tz, metadata, windows={'day': UPTIME_WINDOWS['day']})['day']
 
-    for row in current_interval_rows:
-        two_hour_bucket, count_active, count_inactive = row
-        hour_start_utc = two_hour_bucket
-        hour_end_utc = two_hour_bucket + timedelta(hours=2) - timedelta(seconds=1)
-            
-        hour_start_local = hour_start_utc.astimezone(local_tz)
-        hour_end_local = hour_end_utc.astimezone(local_tz)
 
-        flag , start_bucket_utc, end_bucket_utc, overlap_minutes = is_within_business_hours(hour_start_local, hour_end_local, business_hours)
-        if flag:
-            # print(f"[DEBUG] Within business hours: {start_bucket_utc} to {end_bucket_utc}, overlap_minutes: {overlap_minutes}")
-            total_possible_minutes += overlap_minutes
-            if(count_active + count_inactive) > 0:
-                total_uptime_minutes += (count_active)/(count_active + count_inactive) * overlap_minutes
-            else:
-                total_uptime_minutes += 0.5 * overlap_minutes # HERE INTERPOLATION BETTER LOGIC NEEDS TO BE ADDED
-            
-    cursor.close()
-    uptime_percent = (total_uptime_minutes / total_possible_minutes) * 100 if total_possible_minutes else 0
-    return {
-        "uptime_hours": total_uptime_minutes // 60,
-        "downtime_hours": (total_possible_minutes - total_uptime_minutes) // 60,
-        "uptime_percent": uptime_percent,
-        "total_possible_hours": total_possible_minutes // 60,
-    }
\ No newline at end of file
+def calculate_uptime_last_week(store_id, now_utc, local_tz, metadata=None):
+    return calculate_uptime_windows(store_id, now_utc, local_tz, metadata, windows={'week': UPTIME_WINDOWS['week']})['week']
@@ -0,0 +1,68 @@
+import json
+import uuid
+from datetime import datetime, timezone
+
+from rest_framework import status
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+
+from ..buffer import buffer_polls
+
+STATUSES = {'active', 'inactive'}
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+MAX_REPORTED_ERRORS = 100
+
+
+def parse_poll(poll):
+    """
+    Validate one poll dict without a serializer and return it as a
+    'store_id,timestamp_utc,status' CSV line. Raises ValueError when invalid.
+    """
+    try:
+        store_id = uuid.UUID(str(poll['store_id']))
+        timestamp_utc = datetime.fromisoformat(str(poll['timestamp_utc']).replace(' UTC', '+00:00'))
+        poll_status = str(poll['status']).lower()
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"missing field {e}")
+    if poll_status not in STATUSES:
+        raise ValueError(f"invalid status {poll_status!r}")
+    if timestamp_utc.tzinfo is None:
+        timestamp_utc = timestamp_utc.replace(tzinfo=timezone.utc)
+    return f"{store_id},{timestamp_utc.isoformat()},{poll_status}"
+
+
+def _iter_polls(request):
+    body = request.body
+    # DRF's content_type is the raw header, parameters (e.g. "; charset=utf-8") included
+    media_type = request.content_type.split(';')[0].strip().lower()
+    if media_type in NDJSON_TYPES:
+        for line in body.splitlines():
+            if line.strip():
+                yield json.loads(line)
+        return
+    polls = json.loads(body)
+    if not isinstance(polls, list):
+        raise ValueError("expected a JSON array of polls")
+    yield from polls
+
+
+@api_view(['POST'])
+def status_batch(request):
+    """Accept NDJSON or a JSON array of polls and append the valid ones to the Redis buffer"""
+    lines = []
+    errors = []
+    try:
+        for index, poll in enumerate(_iter_polls(request)):
+            try:
+                lines.append(parse_poll(poll))
+            except ValueError as e:
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"index": index, "error": str(e)})
+    except ValueError as e:
+        return Response({"error": f"Malformed body: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    buffer_polls(lines)
+    return Response({
+        "accepted": len(lines),
+        "rejected": errors,
+    }, status=status.HTTP_202_ACCEPTED)
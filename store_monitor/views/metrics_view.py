@@ -0,0 +1,10 @@
+from django.http import HttpResponse
+from rest_framework.decorators import api_view
+
+from ..instrumentation import render_prometheus_metrics
+
+
+@api_view(['GET'])
+def metrics(request):
+    """Report timing counters in the Prometheus text exposition format"""
+    return HttpResponse(render_prometheus_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,185 @@
+import asyncio
+import json
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from ..models import StoreReport
+from ..report_control import PRIORITIES
+from ..report_events import POLL_INTERVAL, TERMINAL_EVENTS, hub, report_event_name
+from ..report_jobs import parse_report_options, request_report
+from ..report_writer import validate_report_format
+from ..utils import ensure_utc
+from .report_view import report_payload
+
+
+def _is_finished(report):
+    return report_event_name(report.status) in TERMINAL_EVENTS
+
+
+async def _listen(request, report_id):
+    """
+    A queue of report_id's events. The hub's subscription is shared by the requests of
+    one event loop, which only an ASGI server has; under WSGI every request runs in a
+    loop of its own, so it gets a queue nothing feeds and waits poll the row instead.
+    """
+    if isinstance(request, ASGIRequest):
+        return await hub.listen(report_id)
+    return asyncio.Queue()
+
+
+def _poll_timeout(request, limit):
+    """How long to wait for an event before re-reading the report, at most limit"""
+    if isinstance(request, ASGIRequest):
+        return hub.poll_timeout(limit)
+    return min(limit, POLL_INTERVAL)
+
+
+async def _wait_finished(request, queue, report_id, timeout):
+    """
+    The report once it has finished, or after timeout seconds. The row is re-read on a
+    terminal event and whenever none arrives in time, so a report still finishes the
+    wait while the event subscription is down.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while (remaining := deadline - loop.time()) > 0:
+        try:
+            if (await asyncio.wait_for(queue.get(), _poll_timeout(request, remaining)))['event'] not in TERMINAL_EVENTS:
+                continue
+        except asyncio.TimeoutError:
+            pass
+        report = await StoreReport.objects.aget(id=report_id)
+        if _is_finished(report):
+            return report
+    return await StoreReport.objects.aget(id=report_id)
+
+
+@csrf_exempt
+@require_POST
+async def trigger_report(request):
+    """Async POST /api/async/trigger_report, same body and response as trigger_report"""
+    try:
+        data = json.loads(request.body or b'{}') if request.content_type == 'application/json' else request.POST
+        timestamp_utc = ensure_utc(datetime.strptime(data.get('timestamp_utc', ''), "%Y-%m-%d %H:%M:%S"))
+    except (ValueError, AttributeError) as e:
+        return JsonResponse({"error": f"Invalid timestamp_utc: {e}"}, status=400)
+    try:
+        report_format = validate_report_format(data.get('format'))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    priority = data.get('priority', 'normal')
+    if priority not in PRIORITIES:
+        return JsonResponse({"error": f"priority must be one of {', '.join(PRIORITIES)}"}, status=400)
+
+    try:
+        scope, columns = parse_report_options(data)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    report_id, report_status, created = await sync_to_async(request_report)(
+        timestamp_utc, report_format, priority, scope=scope, columns=columns,
+    )
+    return JsonResponse({
+        "report_id": report_id,
+        "status": "Report generation initiated" if created else f"Existing report ({report_status})"
+    })
+
+
+@require_GET
+async def get_report(request, report_id):
+    """
+    Async GET /api/async/get_report/<id>. With ?wait=<seconds> (long-poll) an unfinished
+    report is held open until it completes or fails, or the wait (capped at
+    REPORT_EVENTS_TIMEOUT) runs out, and the state at that point is returned.
+    """
+    try:
+        wait = min(float(request.GET.get('wait', 0)), settings.REPORT_EVENTS_TIMEOUT)
+    except ValueError:
+        return JsonResponse({"error": "wait must be a number of seconds"}, status=400)
+
+    queue = await _listen(request, report_id) if wait > 0 else None
+    try:
+        try:
+            report = await StoreReport.objects.aget(id=report_id)
+        except StoreReport.DoesNotExist:
+            return JsonResponse({"error": "Report not found"}, status=404)
+
+        if queue is not None and not _is_finished(report):
+            report = await _wait_finished(request, queue, report_id, wait)
+    finally:
+        if queue is not None:
+            hub.unlisten(report_id, queue)
+
+    return JsonResponse(report_payload(report, request.build_absolute_uri))
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+@require_GET
+async def report_events(request, report_id):
+    """
+    Server-Sent Events for one report: a `status` event with the current state, then
+    `running`/`progress` events from the worker, and a final `completed`, `failed` or
+    `cancelled` event carrying the full get_report body. Comment lines keep idle proxies from
+    closing the stream, and the row is re-read at each one (more often while the event
+    subscription is down); after REPORT_EVENTS_TIMEOUT a `timeout` event ends it.
+    """
+    if not isinstance(request, ASGIRequest):
+        # A WSGI server buffers an async stream until it ends
+        return JsonResponse(
+            {"error": "Server-Sent Events need an ASGI server; use /api/async/get_report/<id>?wait= instead"},
+            status=501,
+        )
+    # Subscribe before reading the row so no event between the two is lost
+    queue = await _listen(request, report_id)
+    try:
+        report = await StoreReport.objects.aget(id=report_id)
+    except StoreReport.DoesNotExist:
+        hub.unlisten(report_id, queue)
+        return JsonResponse({"error": "Report not found"}, status=404)
+
+    async def stream():
+        try:
+            if _is_finished(report):
+                yield _sse(report_event_name(report.status), report_payload(report, request.build_absolute_uri))
+                return
+            yield _sse('status', report_payload(report, request.build_absolute_uri))
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + settings.REPORT_EVENTS_TIMEOUT
+            while (remaining := deadline - loop.time()) > 0:
+                try:
+                    event = await asyncio.wait_for(
+                        queue.get(), _poll_timeout(request, min(settings.REPORT_EVENTS_KEEPALIVE, remaining)),
+                    )
+                except asyncio.TimeoutError:
+                    # Events may be lost while the subscription is down, so check the row
+                    finished = await StoreReport.objects.aget(id=report_id)
+                    if _is_finished(finished):
+                        yield _sse(report_event_name(finished.status), report_payload(finished, request.build_absolute_uri))
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                if event['event'] in TERMINAL_EVENTS:
+                    finished = await StoreReport.objects.aget(id=report_id)
+                    yield _sse(event['event'], report_payload(finished, request.build_absolute_uri))
+                    return
+                yield _sse(event.pop('event'), event)
+            yield _sse('timeout', {})
+        finally:
+            hub.unlisten(report_id, queue)
+
+    return StreamingHttpResponse(
+        stream(),
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
@@ -1,23 +1,57 @@
 # views.py
+import importlib.util
+
+from django.http import StreamingHttpResponse
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
 from datetime import datetime
 from ..models import StoreReport
-from ..tasks import generate_store_report_task
+from ..report_control import PRIORITIES
+from ..report_jobs import cancel_report as cancel_report_job, parse_report_options, request_report
+from ..report_writer import report_format_of, validate_report_format
+from ..utils import ensure_utc
 
 @api_view(['POST'])
 def trigger_report(request):
     timestamp_string = request.data.get('timestamp_utc')
-    timestamp_utc = datetime.strptime(timestamp_string, "%Y-%m-%d %H:%M:%S")
-    report = StoreReport.objects.create(status="pending", timestamp_utc=timestamp_utc)
-    generate_store_report_task.delay(report_id = str(report.id), now_utc=timestamp_utc)  # Async background task
+    timestamp_utc = ensure_utc(datetime.strptime(timestamp_string, "%Y-%m-%d %H:%M:%S"))
+    try:
+        report_format = validate_report_format(request.data.get('format'))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    priority = request.data.get('priority', 'normal')
+    if priority not in PRIORITIES:
+        return Response({"error": f"priority must be one of {', '.join(PRIORITIES)}"}, status=400)
+    try:
+        scope, columns = parse_report_options(request.data)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    report_id, report_status, created = request_report(
+        timestamp_utc, report_format, priority, scope=scope, columns=columns,
+    )
     return Response({
-        "report_id": str(report.id),
-        "status": "Report generation initiated"
+        "report_id": report_id,
+        "status": "Report generation initiated" if created else f"Existing report ({report_status})"
     })
     
     
+def report_payload(report, build_absolute_uri):
+    """GET /api/get_report body for a StoreReport (shared with the async views)"""
+    payload = {
+        "status": report.status,
+        "timestamp_utc": report.timestamp_utc,
+    }
+    if report.status == "completed":
+        payload["report_file_url"] = build_absolute_uri(report.report_file.url)
+    payload.update({
+        "stores_processed": report.stores_processed,
+        "stores_total": report.stores_total,
+        "timings": report.timings,
+    })
+    return payload
+
+
 @api_view(['GET'])
 def get_report(request, report_id):
     try:
@@ -25,14 +59,36 @@ def get_report(request, report_id):
     except StoreReport.DoesNotExist:
         return Response({"error": "Report not found"}, status=404)
 
+    return Response(report_payload(report, request.build_absolute_uri))
+
+
+@api_view(['DELETE'])
+def cancel_report(request, report_id):
+    """Cancel a queued or running report; finished reports are left as they are"""
+    report_status = cancel_report_job(report_id)
+    if report_status is None:
+        return Response({"error": "Report not found"}, status=404)
+    if report_status not in ("cancelling", "cancelled"):
+        return Response({"error": f"Report already {report_status}", "status": report_status}, status=409)
+    return Response({"report_id": str(report_id), "status": report_status}, status=202)
+
+
+@api_view(['GET'])
+def get_report_arrow(request, report_id):
+    """A completed report (in any format) as an Arrow IPC stream of typed record batches"""
+    try:
+        report = StoreReport.objects.get(id=report_id)
+    except StoreReport.DoesNotExist:
+        return Response({"error": "Report not found"}, status=404)
     if report.status != "completed":
-        return Response({
-            "status": report.status,
-            "timestamp_utc": report.timestamp_utc
-        })
+        return Response({"error": f"Report is {report.status}"}, status=409)
+    if importlib.util.find_spec('pyarrow') is None:
+        return Response({"error": "Arrow streaming needs pyarrow, which is not installed"}, status=501)
 
-    return Response({
-        "status": report.status,
-        "timestamp_utc": report.timestamp_utc,
-        "report_file_url": request.build_absolute_uri(report.report_file.url)
-    })
+    from ..columnar import iter_arrow_stream
+    response = StreamingHttpResponse(
+        iter_arrow_stream(report.report_file.path, report_format_of(report.report_file.name)),
+        content_type='application/vnd.apache.arrow.stream',
+    )
+    response['Content-Disposition'] = f'attachment; filename="store_report_{report.id}.arrows"'
+    return response
@@ -0,0 +1,82 @@
+import hashlib
+import re
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+
+from ..models import Store, StoreBusinessHour, StoreTimezone
+from ..realtime import read_store_uptime
+from ..report_cache import get_ingest_version
+from ..utils import ensure_utc
+from ..window_uptime import GRANULARITIES, compute_store_window
+
+
+# An unencoded `+` in a query string decodes as a space, e.g. 2024-07-01T00:00:00 05:30
+DECODED_PLUS_OFFSET = re.compile(r'(:\d\d(?:\.\d+)?) (\d\d(?::?\d\d)?)$')
+
+
+def _parse_timestamp(value):
+    value = DECODED_PLUS_OFFSET.sub(r'\1+\2', value.replace('Z', '+00:00'))
+    return ensure_utc(datetime.fromisoformat(value))
+
+
+def _metadata_version(store_id):
+    """Changes whenever the store's business hours or timezone are edited, added or removed"""
+    hours = StoreBusinessHour.objects.filter(store_id=store_id).aggregate(rows=Count('id'), updated=Max('updated_at'))
+    timezone_updated = StoreTimezone.objects.filter(store_id=store_id).values_list('updated_at', flat=True).first()
+    return f"{hours['rows']}|{hours['updated']}|{timezone_updated}"
+
+
+@api_view(['GET'])
+def store_uptime(request, store_id):
+    """
+    Without query parameters: current last hour/day/week uptime, served from the Redis
+    counters only. With start/end (ISO 8601) and optional granularity (hour, day, week):
+    uptime over that window from the hourly rollup, with a per-bucket breakdown.
+    """
+    params = request.query_params
+    if 'start' not in params and 'end' not in params:
+        uptime = read_store_uptime(store_id)
+        if uptime is None:
+            return Response({"error": "No realtime data for this store"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(uptime)
+
+    try:
+        end_utc = _parse_timestamp(params['end']) if 'end' in params else timezone.now()
+        start_utc = _parse_timestamp(params['start']) if 'start' in params else end_utc - settings.UPTIME_WINDOW_DEFAULT
+    except ValueError as e:
+        return Response(
+            {"error": f"Invalid timestamp: {e} (ISO 8601; percent-encode a + offset as %2B)"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    granularity = params.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return Response({"error": f"granularity must be one of {', '.join(GRANULARITIES)}"}, status=status.HTTP_400_BAD_REQUEST)
+    if not start_utc < end_utc:
+        return Response({"error": "start must be before end"}, status=status.HTTP_400_BAD_REQUEST)
+    if end_utc - start_utc > settings.UPTIME_WINDOW_MAX:
+        return Response({"error": f"Window longer than {settings.UPTIME_WINDOW_MAX.days} days"}, status=status.HTTP_400_BAD_REQUEST)
+    if not Store.objects.filter(id=store_id).exists():
+        return Response({"error": "Store not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    # The ingestion version of the window's hours changes with new and backfilled polls
+    # alike; the metadata version with edits to the store's hours and timezone
+    ingest_version = get_ingest_version(end_utc, start_utc)
+    etag_source = (
+        f"{store_id}|{start_utc.isoformat()}|{end_utc.isoformat()}|{granularity}"
+        f"|{ingest_version}|{_metadata_version(store_id)}"
+    )
+    etag = f'"{hashlib.sha256(etag_source.encode()).hexdigest()[:32]}"'
+    headers = {
+        'ETag': etag,
+        'Cache-Control': f"private, max-age={settings.UPTIME_CACHE_MAX_AGE}",
+    }
+    if etag in request.headers.get('If-None-Match', ''):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(compute_store_window(store_id, start_utc, end_utc, granularity), headers=headers)
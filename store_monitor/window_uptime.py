@@ -0,0 +1,103 @@
+"""
+Uptime of one store over an arbitrary window, broken down per hour, day or week.
+
+Whole hours already covered by the hourly rollup are read from
+store_monitor_storestatushourly; only the partial hours at the window edges (and any
+hours the rollup has not reached yet) are counted from raw polls.
+"""
+from datetime import timedelta
+
+from django.db import connection as conn
+
+from store_monitor.models import AggregateWatermark
+from store_monitor.realtime import calendar_intervals, iter_hourly_uptime, window_result
+from store_monitor.rollup import HOUR, ROLLUP_WATERMARK
+from store_monitor.utils import StoreMetadataIndex, floor_bucket
+
+GRANULARITIES = ('hour', 'day', 'week')
+
+STORE_HOUR_COUNTS_QUERY = """
+    SELECT hour_utc, SUM(count_active)::int, SUM(count_inactive)::int
+    FROM (
+        SELECT hour_utc, count_active, count_inactive
+        FROM store_monitor_storestatushourly
+        WHERE store_id = %s AND hour_utc >= %s AND hour_utc < %s
+        UNION ALL
+        SELECT
+            time_bucket('1 hour', timestamp_utc),
+            (status = 'active')::int,
+            (status = 'inactive')::int
+        FROM store_monitor_storestatus
+        WHERE store_id = %s
+          AND ((timestamp_utc >= %s AND timestamp_utc < %s) OR (timestamp_utc >= %s AND timestamp_utc < %s))
+    ) AS counts
+    GROUP BY hour_utc;
+"""
+
+
+def _rollup_hours(start_utc, end_utc):
+    """[inner_start, inner_end): the whole hours of the window the rollup already covers"""
+    inner_start = floor_bucket(start_utc - timedelta(microseconds=1), HOUR) + HOUR
+    inner_end = floor_bucket(end_utc, HOUR)
+    state = AggregateWatermark.objects.filter(name=ROLLUP_WATERMARK).first()
+    if state is None or state.watermark is None:
+        return inner_start, inner_start
+    # The watermark's own hour may still receive polls
+    inner_end = min(inner_end, floor_bucket(state.watermark, HOUR))
+    return inner_start, max(inner_end, inner_start)
+
+
+def fetch_store_hour_counts(store_id, start_utc, end_utc):
+    """{epoch_hour: (count_active, count_inactive)} for polls in [start_utc, end_utc)"""
+    inner_start, inner_end = _rollup_hours(start_utc, end_utc)
+    with conn.cursor() as cursor:
+        cursor.execute(STORE_HOUR_COUNTS_QUERY, [
+            store_id, inner_start, inner_end,
+            store_id, start_utc, inner_start, inner_end, end_utc,
+        ])
+        return {
+            int(hour_utc.timestamp()) // 3600: (count_active, count_inactive)
+            for hour_utc, count_active, count_inactive in cursor.fetchall()
+        }
+
+
+def _bucket_start(segment_start_utc, granularity, local_tz):
+    if granularity == 'hour':
+        return floor_bucket(segment_start_utc, HOUR)
+    # Day and week buckets follow the store's local calendar (weeks start on Monday)
+    local = segment_start_utc.astimezone(local_tz)
+    day = local.date()
+    if granularity == 'week':
+        day -= timedelta(days=day.weekday())
+    return day
+
+
+def compute_store_window(store_id, start_utc, end_utc, granularity='day'):
+    """Totals and per-bucket uptime/downtime for one store over [start_utc, end_utc)"""
+    metadata = StoreMetadataIndex.load(store_ids=[store_id])
+    local_tz = metadata.timezone(store_id)
+    intervals = calendar_intervals(metadata.business_hours(store_id))
+    hour_counts = fetch_store_hour_counts(store_id, start_utc, end_utc)
+
+    buckets = {}
+    total_uptime = total_possible = 0
+    for _, segment_start, uptime_minutes, possible_minutes in iter_hourly_uptime(
+        intervals, local_tz, hour_counts, start_utc, end_utc
+    ):
+        key = _bucket_start(segment_start, granularity, local_tz)
+        uptime, possible = buckets.get(key, (0, 0))
+        buckets[key] = (uptime + uptime_minutes, possible + possible_minutes)
+        total_uptime += uptime_minutes
+        total_possible += possible_minutes
+
+    return {
+        "store_id": str(store_id),
+        "start": start_utc,
+        "end": end_utc,
+        "granularity": granularity,
+        **window_result(total_uptime, total_possible),
+        "buckets": [
+            {"start": key, **window_result(uptime, possible)}
+            for key, (uptime, possible) in buckets.items()
+        ],
+    }